@@ -0,0 +1,132 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import List, Tuple
+
+import numpy as np
+
+from app.metrics import cache_lookup, span
+from app.singleflight import SingleFlight
+from app.store import Series
+
+METHODS = ("lttb", "minmax")
+MAX_SERIES_POINTS = int(os.getenv("MAX_SERIES_POINTS", "10000"))
+# Each pyramid level keeps the min and max of every PYRAMID_BUCKET points of
+# the level below, so it is PYRAMID_BUCKET / 2 times smaller.
+PYRAMID_BUCKET = 8
+PYRAMID_MIN_POINTS = 2048
+# Downsample from a level holding at least this many times max_points.
+OVERSAMPLE = 4
+PYRAMID_CACHE_SIZE = int(os.getenv("PYRAMID_CACHE_SIZE", "16"))
+
+
+def _bucket_edges(count: int, buckets: int) -> np.ndarray:
+    return np.linspace(0, count, buckets + 1).astype(np.int64)
+
+
+def minmax_indices(values: np.ndarray, buckets: int) -> np.ndarray:
+    # Positions of the min and max of each of `buckets` equal-count buckets,
+    # in time order; extremes are kept exactly.
+    count = len(values)
+    if count <= 2 * buckets:
+        return np.arange(count)
+    size = -(-count // buckets)
+    padded = np.full(size * buckets, np.nan)
+    padded[:count] = values
+    grid = padded.reshape(buckets, size)
+    valid = ~np.isnan(grid).all(axis=1)
+    offsets = np.arange(buckets)[valid] * size
+    lows = np.nanargmin(grid[valid], axis=1) + offsets
+    highs = np.nanargmax(grid[valid], axis=1) + offsets
+    return np.unique(np.concatenate((lows, highs)))
+
+
+def lttb_indices(timestamps: np.ndarray, values: np.ndarray, max_points: int) -> np.ndarray:
+    # Largest-Triangle-Three-Buckets: keeps the first and last points and,
+    # per bucket, the point forming the largest triangle with the previous
+    # pick and the next bucket's centroid. Each bucket is a vector operation.
+    count = len(values)
+    if count <= max_points:
+        return np.arange(count)
+    x = timestamps.astype(np.float64)
+    y = np.asarray(values, dtype=np.float64)
+    edges = _bucket_edges(count - 2, max_points - 2) + 1
+    picks = np.empty(max_points, dtype=np.int64)
+    picks[0], picks[-1] = 0, count - 1
+    previous = 0
+    for bucket in range(max_points - 2):
+        lo, hi = edges[bucket], edges[bucket + 1]
+        # The last bucket looks ahead to the final point.
+        next_lo, next_hi = hi, edges[bucket + 2] if bucket + 2 < len(edges) else count
+        centroid_x, centroid_y = x[next_lo:next_hi].mean(), y[next_lo:next_hi].mean()
+        ax, ay = x[previous], y[previous]
+        areas = np.abs((ax - centroid_x) * (y[lo:hi] - ay) - (ax - x[lo:hi]) * (centroid_y - ay))
+        previous = lo + int(np.argmax(areas))
+        picks[bucket + 1] = previous
+    return picks
+
+
+class Pyramid:
+    # Successively coarser min/max levels over one series version. Level 0
+    # is the series itself; min of mins and max of maxes are exact, so any
+    # level still shows every peak and trough.
+    def __init__(self, timestamps: np.ndarray, values: np.ndarray):
+        self.levels: List[Tuple[np.ndarray, np.ndarray]] = [(timestamps, values)]
+        while len(self.levels[-1][1]) > PYRAMID_MIN_POINTS:
+            level_timestamps, level_values = self.levels[-1]
+            keep = minmax_indices(np.asarray(level_values), -(-len(level_values) // PYRAMID_BUCKET))
+            self.levels.append((np.asarray(level_timestamps)[keep], np.asarray(level_values)[keep]))
+
+    def select(self, start: int, end: int, max_points: int) -> Tuple[int, np.ndarray, np.ndarray]:
+        # The coarsest level that still has OVERSAMPLE * max_points points in
+        # [start, end), so work per request is bounded by max_points.
+        for level in range(len(self.levels) - 1, -1, -1):
+            timestamps, values = self.levels[level]
+            lo = int(np.searchsorted(timestamps, start, side='left'))
+            hi = int(np.searchsorted(timestamps, end, side='left'))
+            if hi - lo >= OVERSAMPLE * max_points or level == 0:
+                return level, timestamps[lo:hi], values[lo:hi]
+
+
+class PyramidCache:
+    def __init__(self, maxsize: int = PYRAMID_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._pyramids = OrderedDict()
+        self._lock = threading.Lock()
+        self._builds = SingleFlight()
+
+    def get(self, series: Series) -> Pyramid:
+        key = (series.ts_id, series.version)
+        with self._lock:
+            pyramid = self._pyramids.get(key)
+            cache_lookup("pyramid", pyramid is not None)
+            if pyramid is not None:
+                self._pyramids.move_to_end(key)
+                return pyramid
+        return self._builds.do(key, self._build, key, series)
+
+    def _build(self, key: tuple, series: Series) -> Pyramid:
+        with span("pyramid_build"):
+            pyramid = Pyramid(np.asarray(series.timestamps), np.asarray(series.values))
+        with self._lock:
+            self._pyramids[key] = pyramid
+            while len(self._pyramids) > self.maxsize:
+                self._pyramids.popitem(last=False)
+        return pyramid
+
+
+pyramid_cache = PyramidCache()
+
+
+def downsample(series: Series, start: int, end: int, max_points: int, method: str = "lttb"):
+    if method not in METHODS:
+        raise ValueError(f"Unknown method: {method}. Use any of {', '.join(METHODS)}.")
+    if not 3 <= max_points <= MAX_SERIES_POINTS:
+        raise ValueError(f"max_points must be between 3 and {MAX_SERIES_POINTS}")
+
+    level, timestamps, values = pyramid_cache.get(series).select(start, end, max_points)
+    if method == "minmax":
+        keep = minmax_indices(np.asarray(values), max_points // 2)
+    else:
+        keep = lttb_indices(timestamps, values, max_points)
+    return level, np.asarray(timestamps)[keep], np.asarray(values)[keep]
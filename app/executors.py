@@ -0,0 +1,99 @@
+import asyncio
+import multiprocessing
+import os
+import weakref
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Dict, Optional
+
+from app.metrics import metrics, span
+
+# Process pools (model training and the order search) start their workers
+# from a fork server rather than forking this process: it runs several
+# threads, and a forked child could inherit a lock one of them held (a
+# metrics counter, say) and block on it forever.
+PROCESS_CONTEXT = multiprocessing.get_context("forkserver")
+
+IO_THREADS = int(os.getenv("IO_THREADS", "16"))
+
+# Upper bound on in-flight requests per endpoint, so a burst of slow
+# forecasts or prompts queues behind its own limit instead of taking every
+# pool slot away from the cheap statistics endpoints.
+ENDPOINT_LIMITS = {
+    "predict_advanced_least_carbon": 2,
+    "process_prompt": 4,
+    "batch_stats": 8,
+    "multi_stats": 4,
+    "best_window": 8,
+    "series": 8,
+    "rollup": 8,
+    "export": 4,
+    "ingest": 4,
+    "preferences": 8,
+}
+
+_thread_pool: Optional[ThreadPoolExecutor] = None
+_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Semaphore]]" = weakref.WeakKeyDictionary()
+_in_flight = Counter()
+
+
+def thread_pool() -> ThreadPoolExecutor:
+    global _thread_pool
+    if _thread_pool is None:
+        _thread_pool = ThreadPoolExecutor(max_workers=IO_THREADS, thread_name_prefix="io")
+    return _thread_pool
+
+
+def _semaphore(endpoint: str) -> Optional[asyncio.Semaphore]:
+    limit = ENDPOINT_LIMITS.get(endpoint)
+    if limit is None:
+        return None
+    semaphores = _semaphores.setdefault(asyncio.get_running_loop(), {})
+    if endpoint not in semaphores:
+        semaphores[endpoint] = asyncio.Semaphore(limit)
+    return semaphores[endpoint]
+
+
+async def _run(executor, pool: str, endpoint: str, fn: Callable, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    semaphore = _semaphore(endpoint)
+    _in_flight[endpoint, "waiting"] += 1
+    try:
+        if semaphore is not None:
+            await semaphore.acquire()
+    finally:
+        _in_flight[endpoint, "waiting"] -= 1
+    _in_flight[endpoint, "running"] += 1
+    try:
+        with span(f"{pool}:{endpoint}"):
+            return await loop.run_in_executor(executor, partial(fn, *args, **kwargs))
+    finally:
+        _in_flight[endpoint, "running"] -= 1
+        if semaphore is not None:
+            semaphore.release()
+
+
+async def run_in_thread(endpoint: str, fn: Callable, *args, **kwargs):
+    return await _run(thread_pool(), "thread", endpoint, fn, *args, **kwargs)
+
+
+def shutdown() -> None:
+    global _thread_pool
+    if _thread_pool is not None:
+        _thread_pool.shutdown(wait=False)
+        _thread_pool = None
+    _semaphores.clear()
+
+
+def _queue_depths() -> Dict[tuple, float]:
+    depths = {}
+    if _thread_pool is not None:
+        depths["thread",] = _thread_pool._work_queue.qsize()
+    return depths
+
+
+metrics.gauge("prediction_pool_queue_depth", "Tasks submitted to a pool and not yet picked up by a worker.",
+              ("pool",), _queue_depths)
+metrics.gauge("prediction_endpoint_in_flight", "Offloaded calls per endpoint, waiting for a slot or running.",
+              ("endpoint", "state"), lambda: dict(_in_flight))
@@ -0,0 +1,34 @@
+import json
+import os
+from typing import Iterator
+
+import numpy as np
+
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "65536"))
+
+
+def _format_values(values: np.ndarray) -> list:
+    return [str(int(value)) if value.is_integer() else repr(value) for value in values.tolist()]
+
+
+def export_chunks(timestamps: np.ndarray, values: np.ndarray, fmt: str,
+                  chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[bytes]:
+    # Yields one encoded block per `chunk_size` points, so memory stays
+    # O(chunk) however long the range. The caller passes views of the range
+    # taken when it was resolved, and appends never write inside a published
+    # series, so a long download streams exactly that snapshot.
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown format: {fmt}. Use any of {', '.join(EXPORT_FORMATS)}.")
+    if fmt == "csv":
+        yield b"datetime,carbon_intensity\n"
+    for start in range(0, len(timestamps), chunk_size):
+        end = start + chunk_size
+        dates = np.datetime_as_string(np.asarray(timestamps[start:end]).astype("datetime64[s]")).tolist()
+        numbers = _format_values(np.asarray(values[start:end]))
+        if fmt == "csv":
+            lines = [f"{date}.000Z,{number}\n" for date, number in zip(dates, numbers)]
+        else:
+            lines = [f'{{"datetime": {json.dumps(date + ".000Z")}, "carbon_intensity": {number}}}\n'
+                     for date, number in zip(dates, numbers)]
+        yield "".join(lines).encode()
@@ -0,0 +1,242 @@
+import glob
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, List, Optional, Tuple
+
+import numpy as np
+
+from app.metrics import cache_lookup, span
+from app.store import DATA_DIR, Series
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# pandas and statsmodels take most of a second to import, so they are only
+# imported by the functions that model; workers that serve statistics never
+# load them.
+MODELING_MODULES = ("pandas", "statsmodels.api")
+
+SARIMA_ORDER = (1, 1, 1)
+SARIMA_SEASONAL_ORDER = (1, 1, 1, 12)
+MODEL_CACHE_DIR = os.getenv("MODEL_CACHE_DIR", os.path.join(DATA_DIR, ".models"))
+MODEL_CACHE_SIZE = int(os.getenv("MODEL_CACHE_SIZE", "8"))
+
+
+def aggregate_monthly(series: Series) -> "pd.DataFrame":
+    import pandas as pd
+
+    # Month-end indexed means, with NaN for empty months, read from the
+    # monthly rollup instead of resampling every raw point.
+    monthly = series.rollups["month"]
+    if not len(monthly):
+        raise ValueError("No data available for the given series")
+    buckets = monthly["bucket"]
+    first = int(buckets[0])
+    means = np.full(int(buckets[-1]) - first + 1, np.nan)
+    means[buckets - first] = monthly.means()
+    start = pd.Timestamp(np.datetime64(first, 'M').astype('datetime64[s]').astype(np.int64), unit='s', tz='UTC')
+    index = pd.date_range(start=start + pd.offsets.MonthEnd(0), periods=len(means), freq='M', name='datetime')
+    return pd.DataFrame({'carbon_intensity': means}, index=index)
+
+
+def build_sarima(monthly_data: "pd.DataFrame", order: Tuple[int, ...], seasonal_order: Tuple[int, ...]):
+    import statsmodels.api as sm
+
+    return sm.tsa.SARIMAX(monthly_data,
+                          order=order,
+                          seasonal_order=seasonal_order)
+
+
+def fit_sarima_model(monthly_data: "pd.DataFrame", order: Tuple[int, ...] = SARIMA_ORDER,
+                     seasonal_order: Tuple[int, ...] = SARIMA_SEASONAL_ORDER,
+                     start_params: Optional[np.ndarray] = None):
+    model = build_sarima(monthly_data, order, seasonal_order)
+    results = model.fit(start_params=start_params, disp=False)
+    return results
+
+
+def params_suffix(order: Tuple[int, ...], seasonal_order: Tuple[int, ...]) -> str:
+    return "-".join(str(part) for part in tuple(order) + tuple(seasonal_order)) + ".npy"
+
+
+def model_key(series: Series, order: Tuple[int, ...], seasonal_order: Tuple[int, ...]) -> tuple:
+    return series.ts_id, series.version, tuple(order), tuple(seasonal_order)
+
+
+class ModelCache:
+    # Fitted SARIMAX results depend only on the series contents and the model
+    # orders, so they are reused until the series version changes. Fitted
+    # parameters are also written to disk; after a restart the model is
+    # rebuilt by running the Kalman filter at those parameters, skipping the
+    # optimizer entirely.
+    def __init__(self, maxsize: int = MODEL_CACHE_SIZE, cache_dir: Optional[str] = MODEL_CACHE_DIR):
+        self.maxsize = maxsize
+        self.cache_dir = cache_dir
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _params_path(self, key: tuple) -> Optional[str]:
+        if not self.cache_dir:
+            return None
+        ts_id, version, order, seasonal_order = key
+        return os.path.join(self.cache_dir, f"{ts_id}@{version}@{params_suffix(order, seasonal_order)}")
+
+    def _params_paths(self, ts_id: str, order: Tuple[int, ...], seasonal_order: Tuple[int, ...]) -> List[str]:
+        pattern = f"{glob.escape(ts_id)}@*@{params_suffix(order, seasonal_order)}"
+        return glob.glob(os.path.join(glob.escape(self.cache_dir), pattern))
+
+    def _prune(self, key: tuple, keep: str) -> None:
+        # Only the newest parameters per series and order set are needed to
+        # restore or warm-start a fit; older versions would pile up with
+        # every ingest.
+        ts_id, _, order, seasonal_order = key
+        for path in self._params_paths(ts_id, order, seasonal_order):
+            if path != keep:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def lookup(self, key: tuple):
+        with self._lock:
+            results = self._results.get(key)
+            if results is not None:
+                self._results.move_to_end(key)
+            return results
+
+    def store(self, key: tuple, results) -> None:
+        with self._lock:
+            self._results[key] = results
+            self._results.move_to_end(key)
+            while len(self._results) > self.maxsize:
+                self._results.popitem(last=False)
+
+    def load_params(self, key: tuple) -> Optional[np.ndarray]:
+        path = self._params_path(key)
+        if path is None or not os.path.exists(path):
+            return None
+        try:
+            return np.load(path)
+        except (OSError, ValueError):
+            return None
+
+    def save_params(self, key: tuple, params: np.ndarray) -> None:
+        path = self._params_path(key)
+        if path is None:
+            return
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp.npy"
+            np.save(tmp_path, np.asarray(params, dtype=np.float64))
+            os.replace(tmp_path, path)
+        except OSError:
+            return
+        self._prune(key, keep=path)
+
+    def latest_params(self, ts_id: str, order: Tuple[int, ...], seasonal_order: Tuple[int, ...]) -> Optional[np.ndarray]:
+        # Parameters saved for any earlier version of the series, used to
+        # warm-start a refit.
+        if not self.cache_dir:
+            return None
+        # Another worker may prune a file between the glob and the stat.
+        paths = []
+        for path in self._params_paths(ts_id, order, seasonal_order):
+            try:
+                paths.append((os.path.getmtime(path), path))
+            except OSError:
+                continue
+        for _, path in sorted(paths, reverse=True):
+            try:
+                return np.load(path)
+            except (OSError, ValueError):
+                continue
+        return None
+
+    def restore(self, series: Series, order: Tuple[int, ...] = SARIMA_ORDER,
+                seasonal_order: Tuple[int, ...] = SARIMA_SEASONAL_ORDER):
+        key = model_key(series, order, seasonal_order)
+        results = self.lookup(key)
+        cache_lookup("model", results is not None)
+        if results is not None:
+            return results
+
+        params = self.load_params(key)
+        cache_lookup("model_params", params is not None)
+        if params is None:
+            return None
+        with span("model_restore"):
+            results = build_sarima(aggregate_monthly(series), order, seasonal_order).filter(params)
+        self.store(key, results)
+        return results
+
+    def get(self, series: Series, order: Tuple[int, ...] = SARIMA_ORDER,
+            seasonal_order: Tuple[int, ...] = SARIMA_SEASONAL_ORDER):
+        results = self.restore(series, order, seasonal_order)
+        if results is not None:
+            return results
+
+        key = model_key(series, order, seasonal_order)
+        with span("model_fit"):
+            results = fit_sarima_model(aggregate_monthly(series), order, seasonal_order)
+        self.save_params(key, results.params)
+        self.store(key, results)
+        return results
+
+    def clear(self) -> None:
+        with self._lock:
+            self._results.clear()
+
+
+model_cache = ModelCache()
+
+
+class ModelConfigStore:
+    # The SARIMA orders chosen for each ts_id by the order search, kept as
+    # <ts_id>.config.json next to the cached parameters. Series without a
+    # saved choice use the default orders.
+    def __init__(self, config_dir: Optional[str] = MODEL_CACHE_DIR):
+        self.config_dir = config_dir
+        self._configs = {}
+        self._lock = threading.Lock()
+
+    def _path(self, ts_id: str) -> Optional[str]:
+        return os.path.join(self.config_dir, f"{ts_id}.config.json") if self.config_dir else None
+
+    def load(self, ts_id: str) -> Optional[dict]:
+        path = self._path(ts_id)
+        try:
+            mtime = os.stat(path).st_mtime_ns if path else None
+        except OSError:
+            return None
+        cached = self._configs.get(ts_id)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        try:
+            with open(path, 'r') as f:
+                config = json.load(f)
+        except (OSError, ValueError):
+            return None
+        with self._lock:
+            self._configs[ts_id] = (mtime, config)
+        return config
+
+    def orders(self, ts_id: str) -> Tuple[Tuple[int, ...], Tuple[int, ...]]:
+        config = self.load(ts_id)
+        if not config:
+            return SARIMA_ORDER, SARIMA_SEASONAL_ORDER
+        return tuple(config["order"]), tuple(config["seasonal_order"])
+
+    def save(self, ts_id: str, config: dict) -> None:
+        path = self._path(ts_id)
+        if path is None:
+            return
+        os.makedirs(self.config_dir, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(config, f, indent=2)
+        os.replace(tmp_path, path)
+
+
+model_configs = ModelConfigStore()
@@ -0,0 +1,212 @@
+import copy
+from itertools import count
+from typing import Callable, Dict, Optional
+
+import numpy as np
+
+BLOCK_SIZE = 256
+# Windows at most this long are reduced directly from the value view; the
+# two-pass variance is both cheap here and free of prefix-sum cancellation.
+DIRECT_SCAN_MAX = 4096
+
+
+class GrowableArray:
+    def __init__(self, dtype, capacity: int = 16):
+        self._data = np.empty(max(capacity, 16), dtype=dtype)
+        self._size = 0
+        self._frozen = 0
+
+    @classmethod
+    def wrap(cls, array: np.ndarray) -> "GrowableArray":
+        wrapped = cls.__new__(cls)
+        wrapped._data = array
+        wrapped._size = len(array)
+        wrapped._frozen = 0
+        return wrapped
+
+    def fork(self, frozen: Optional[int] = None) -> "GrowableArray":
+        # A handle on the same buffer for building the next version while
+        # readers keep using this one. Positions below `frozen` (default: all
+        # current ones) are never written in place; the first write into them
+        # moves the fork onto a buffer of its own.
+        forked = GrowableArray.wrap(self._data)
+        forked._size = self._size
+        forked._frozen = self._size if frozen is None else min(frozen, self._size)
+        return forked
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def view(self) -> np.ndarray:
+        return self._data[:self._size]
+
+    def truncate(self, size: int) -> None:
+        self._size = min(size, self._size)
+
+    def extend(self, values: np.ndarray) -> None:
+        needed = self._size + len(values)
+        # Wrapped read-only maps are copied to the heap on first write, and
+        # forks on their first write below the frozen size.
+        if needed > len(self._data) or not self._data.flags.writeable or self._size < self._frozen:
+            capacity = max(needed, 2 * len(self._data)) if needed > len(self._data) else len(self._data)
+            grown = np.empty(capacity, dtype=self._data.dtype)
+            grown[:self._size] = self._data[:self._size]
+            self._data = grown
+            self._frozen = 0
+        self._data[self._size:needed] = values
+        self._size = needed
+
+
+class BlockSparseTable:
+    def __init__(self, reduce: Callable, block_size: int = BLOCK_SIZE):
+        self.reduce = reduce
+        self.block_size = block_size
+        self.levels = []
+
+    def fork(self, full_blocks: int) -> "BlockSparseTable":
+        # Readers only use entries spanning whole blocks; those touching the
+        # trailing partial block are the ones an append rewrites, in place.
+        forked = BlockSparseTable(self.reduce, self.block_size)
+        forked.levels = [level.fork(full_blocks - (1 << j) + 1) for j, level in enumerate(self.levels)]
+        return forked
+
+    def update(self, values: np.ndarray, position: int) -> None:
+        first_block = position // self.block_size
+        start = first_block * self.block_size
+        tail = values[start:]
+        if len(tail):
+            edges = np.arange(0, len(tail), self.block_size)
+            blocks = self.reduce.reduceat(tail, edges)
+        else:
+            blocks = np.empty(0, dtype=values.dtype)
+        self._update_levels(blocks, first_block)
+
+    def _update_levels(self, blocks: np.ndarray, first_block: int) -> None:
+        if not self.levels:
+            self.levels.append(GrowableArray(blocks.dtype))
+        base = self.levels[0]
+        base.truncate(first_block)
+        base.extend(blocks)
+
+        changed_from = first_block
+        j = 1
+        while (1 << j) <= len(base):
+            if len(self.levels) <= j:
+                self.levels.append(GrowableArray(blocks.dtype))
+            half = 1 << (j - 1)
+            prev = self.levels[j - 1].view
+            start = max(0, changed_from - half)
+            level = self.levels[j]
+            level.truncate(start)
+            level.extend(self.reduce(prev[start:len(prev) - half], prev[start + half:]))
+            changed_from = start
+            j += 1
+        del self.levels[j:]
+
+    def query(self, lo_block: int, hi_block: int):
+        j = int(hi_block - lo_block).bit_length() - 1
+        level = self.levels[j].view
+        return self.reduce(level[lo_block], level[hi_block - (1 << j)])
+
+
+class AggregateIndex:
+    def __init__(self, values: np.ndarray):
+        self.values = values
+        self.offset = float(values[0]) if len(values) else 0.0
+        self._prefix_sum = GrowableArray(np.float64, len(values) + 1)
+        self._prefix_sumsq = GrowableArray(np.float64, len(values) + 1)
+        self._prefix_sum.extend(np.zeros(1))
+        self._prefix_sumsq.extend(np.zeros(1))
+        self._min = BlockSparseTable(np.minimum)
+        self._max = BlockSparseTable(np.maximum)
+        self.update(values, 0)
+
+    @classmethod
+    def from_arrays(cls, values: np.ndarray, arrays: Dict[str, np.ndarray]) -> "AggregateIndex":
+        if int(arrays["block_size"][0]) != BLOCK_SIZE:
+            return cls(values)
+        index = cls.__new__(cls)
+        index.values = values
+        index.offset = float(arrays["offset"][0])
+        index._prefix_sum = GrowableArray.wrap(arrays["prefix_sum"])
+        index._prefix_sumsq = GrowableArray.wrap(arrays["prefix_sumsq"])
+        index._min = BlockSparseTable(np.minimum)
+        index._max = BlockSparseTable(np.maximum)
+        for name, table in (("min", index._min), ("max", index._max)):
+            for j in count():
+                if f"{name}_{j}" not in arrays:
+                    break
+                table.levels.append(GrowableArray.wrap(arrays[f"{name}_{j}"]))
+        return index
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        arrays = {
+            "block_size": np.array([BLOCK_SIZE]),
+            "offset": np.array([self.offset]),
+            "prefix_sum": self._prefix_sum.view,
+            "prefix_sumsq": self._prefix_sumsq.view,
+        }
+        for name, table in (("min", self._min), ("max", self._max)):
+            for j, level in enumerate(table.levels):
+                arrays[f"{name}_{j}"] = level.view
+        return arrays
+
+    def fork(self) -> "AggregateIndex":
+        forked = copy.copy(self)
+        forked._prefix_sum = self._prefix_sum.fork()
+        forked._prefix_sumsq = self._prefix_sumsq.fork()
+        forked._min = self._min.fork(len(self.values) // BLOCK_SIZE)
+        forked._max = self._max.fork(len(self.values) // BLOCK_SIZE)
+        return forked
+
+    def update(self, values: np.ndarray, position: int) -> None:
+        # Everything before `position` is unchanged, so only the tail of each
+        # structure is recomputed: appends cost O(batch), not O(series).
+        self.values = values
+        tail = values[position:]
+        for prefix, column in ((self._prefix_sum, tail), (self._prefix_sumsq, (tail - self.offset) ** 2)):
+            prefix.truncate(position + 1)
+            base = prefix.view[position]
+            prefix.extend(base + np.cumsum(column))
+        self._min.update(values, position)
+        self._max.update(values, position)
+
+    def extend(self, values: np.ndarray) -> None:
+        self.update(values, len(self.values))
+
+    def sum(self, lo: int, hi: int) -> float:
+        prefix = self._prefix_sum.view
+        return float(prefix[hi] - prefix[lo])
+
+    def mean(self, lo: int, hi: int) -> float:
+        return self.sum(lo, hi) / (hi - lo)
+
+    def variance(self, lo: int, hi: int) -> float:
+        count = hi - lo
+        if count <= DIRECT_SCAN_MAX:
+            window = self.values[lo:hi]
+            return float(((window - window.sum() / count) ** 2).sum() / (count - 1))
+        shifted_sum = self.sum(lo, hi) - count * self.offset
+        prefix_sumsq = self._prefix_sumsq.view
+        shifted_sumsq = float(prefix_sumsq[hi] - prefix_sumsq[lo])
+        return max(0.0, (shifted_sumsq - shifted_sum * shifted_sum / count) / (count - 1))
+
+    def min(self, lo: int, hi: int) -> float:
+        return self._extreme(self._min, lo, hi)
+
+    def max(self, lo: int, hi: int) -> float:
+        return self._extreme(self._max, lo, hi)
+
+    def _extreme(self, table: BlockSparseTable, lo: int, hi: int) -> float:
+        size = table.block_size
+        lo_block = -(-lo // size)
+        hi_block = hi // size
+        if lo_block >= hi_block:
+            return float(table.reduce.reduce(self.values[lo:hi]))
+        result = table.query(lo_block, hi_block)
+        if lo < lo_block * size:
+            result = table.reduce(result, table.reduce.reduce(self.values[lo:lo_block * size]))
+        if hi_block * size < hi:
+            result = table.reduce(result, table.reduce.reduce(self.values[hi_block * size:hi]))
+        return float(result)
@@ -1,10 +1,49 @@
-from fastapi import FastAPI
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from app import executors
+from app.metrics import HTTP_REQUEST_SECONDS
+from app.profiler import profiler
 from app.routes import router
+from app.training import model_trainer
+from app.warmup import warmup
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    warmup.start()
+    yield
+    profiler.stop()
+    executors.shutdown()
+    model_trainer.shutdown()
+
+app = FastAPI(lifespan=lifespan)
 
 app.include_router(router)
 
+@app.middleware("http")
+async def record_latency(request: Request, call_next):
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Label by route template, not raw path, to keep cardinality bounded.
+        route = request.scope.get("route")
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, method=request.method,
+                                     route=getattr(route, "path", "unmatched"), status=str(status))
+
 @app.get("/")
 def read_root():
     return {"message": "Welcome to the Carbon Intensity Prediction Service"}
+
+@app.get("/health")
+def health():
+    return {"status": "ok"}
+
+@app.get("/ready")
+def ready():
+    status = warmup.status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
@@ -0,0 +1,189 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Seconds; wide enough for both microsecond index lookups and SARIMA fits.
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0, 30.0, 60.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labelnames: Tuple[str, ...], values: Dict[str, str]) -> Labels:
+    if set(values) != set(labelnames):
+        raise ValueError(f"Expected labels {labelnames}, got {tuple(values)}")
+    return tuple((name, str(values[name])) for name in labelnames)
+
+
+def _format_labels(labels: Iterable[Tuple[str, str]]) -> str:
+    pairs = [
+        '{}="{}"'.format(name, value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'))
+        for name, value in labels
+    ]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = _labels(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(_labels(self.labelnames, labels), 0.0)
+
+    def samples(self) -> List[Tuple[str, Labels, float]]:
+        with self._lock:
+            return [(self.name, key, value) for key, value in sorted(self._values.items())]
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Labels, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = _labels(self.labelnames, labels)
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # Per-bucket counts (last slot is +Inf), then count and sum.
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0, 0.0]
+            series[0][position] += 1
+            series[1] += 1
+            series[2] += value
+
+    def count(self, **labels) -> int:
+        series = self._series.get(_labels(self.labelnames, labels))
+        return series[1] if series else 0
+
+    def samples(self) -> List[Tuple[str, Labels, float]]:
+        samples = []
+        with self._lock:
+            for key, (counts, count, total) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += bucket_count
+                    samples.append((self.name + "_bucket", key + (("le", _format_value(bound)),), cumulative))
+                samples.append((self.name + "_count", key, count))
+                samples.append((self.name + "_sum", key, total))
+        return samples
+
+
+class Gauge:
+    # Read at scrape time from a callback returning {label values: value},
+    # so queue depths and ratios are never stale.
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...],
+                 collect: Callable[[], Dict[Tuple[str, ...], float]]):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.collect = collect
+
+    def samples(self) -> List[Tuple[str, Labels, float]]:
+        return [
+            (self.name, tuple(zip(self.labelnames, (str(value) for value in values))), float(sample))
+            for values, sample in sorted(self.collect().items())
+        ]
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Duplicate metric: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(self, name: str, documentation: str, labelnames: Tuple[str, ...],
+              collect: Callable[[], Dict[Tuple[str, ...], float]]) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames, collect))
+
+    def render(self) -> str:
+        # Prometheus text exposition format 0.0.4.
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+SPAN_SECONDS = metrics.histogram(
+    "prediction_span_seconds", "Time spent in instrumented sections of the request path.", ("span",))
+HTTP_REQUEST_SECONDS = metrics.histogram(
+    "prediction_http_request_seconds", "HTTP request latency by route template.", ("method", "route", "status"))
+CACHE_REQUESTS = metrics.counter(
+    "prediction_cache_requests_total", "Cache lookups by cache and result (hit or miss).", ("cache", "result"))
+
+
+def _hit_ratios() -> Dict[Tuple[str, ...], float]:
+    totals: Dict[str, List[float]] = {}
+    for _, labels, value in CACHE_REQUESTS.samples():
+        cache, result = dict(labels)["cache"], dict(labels)["result"]
+        hits_and_total = totals.setdefault(cache, [0.0, 0.0])
+        hits_and_total[1] += value
+        if result == "hit":
+            hits_and_total[0] += value
+    return {(cache,): hits / total for cache, (hits, total) in totals.items() if total}
+
+
+metrics.gauge("prediction_cache_hit_ratio", "Share of cache lookups that hit, since start.", ("cache",),
+              _hit_ratios)
+
+
+@contextmanager
+def span(name: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        SPAN_SECONDS.observe(time.perf_counter() - started, span=name)
+
+
+def cache_lookup(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def observe_since(name: str, started: Optional[float]) -> None:
+    if started is not None:
+        SPAN_SECONDS.observe(time.perf_counter() - started, span=name)
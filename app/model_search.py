@@ -0,0 +1,187 @@
+import argparse
+import itertools
+import json
+import os
+import threading
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.forecasting import (
+    ModelConfigStore, ModelCache, aggregate_monthly, fit_sarima_model, model_cache, model_configs, model_key,
+)
+from app.executors import PROCESS_CONTEXT
+from app.metrics import span
+from app.store import Series, get_series
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+SEARCH_WORKERS = int(os.getenv("SEARCH_WORKERS", str(os.cpu_count() or 1)))
+CRITERIA = ("mae", "aic")
+
+Candidate = Tuple[Tuple[int, ...], Tuple[int, ...]]
+
+
+def candidate_grid(max_p: int = 2, max_q: int = 2, max_seasonal_p: int = 1, max_seasonal_q: int = 1,
+                   d: int = 1, seasonal_d: int = 1, period: int = 12) -> List[Candidate]:
+    return [
+        ((p, d, q), (seasonal_p, seasonal_d, seasonal_q, period))
+        for p, q, seasonal_p, seasonal_q in itertools.product(
+            range(max_p + 1), range(max_q + 1), range(max_seasonal_p + 1), range(max_seasonal_q + 1))
+    ]
+
+
+def _evaluate(monthly_data: "pd.DataFrame", order: Tuple[int, ...], seasonal_order: Tuple[int, ...],
+              folds: int, horizon: int) -> dict:
+    # Runs in a pool process: one fit on the full history for AIC, then a
+    # rolling-origin backtest that refits on each prefix and scores the next
+    # `horizon` months. Fold fits start from the full-fit parameters.
+    result = {"order": list(order), "seasonal_order": list(seasonal_order)}
+    started = time.perf_counter()
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            full = fit_sarima_model(monthly_data, order, seasonal_order)
+            result["aic"] = float(full.aic)
+            result["params"] = np.asarray(full.params).tolist()
+            result["fit_seconds"] = time.perf_counter() - started
+
+            actual = monthly_data.iloc[:, 0].to_numpy()
+            minimum_train = 2 * seasonal_order[3] + order[1] + seasonal_order[1]
+            errors = []
+            for fold in range(folds, 0, -1):
+                origin = len(actual) - fold * horizon
+                if origin < minimum_train:
+                    continue
+                fit = fit_sarima_model(monthly_data.iloc[:origin], order, seasonal_order, full.params)
+                forecast = np.asarray(fit.get_forecast(steps=horizon).predicted_mean)
+                observed = actual[origin:origin + horizon]
+                present = ~np.isnan(observed)
+                errors.append(np.abs(forecast[:len(observed)][present] - observed[present]))
+            errors = np.concatenate(errors) if errors else np.empty(0)
+            result["mae"] = float(errors.mean()) if len(errors) else None
+            result["backtest_points"] = int(len(errors))
+    except Exception as e:
+        result["error"] = str(e)
+    result["seconds"] = time.perf_counter() - started
+    return result
+
+
+def rank(results: List[dict], criterion: str) -> List[dict]:
+    fitted = [result for result in results if "error" not in result and np.isfinite(result["aic"])]
+    if criterion == "aic":
+        return sorted(fitted, key=lambda result: result["aic"])
+    scored = [result for result in fitted if result["mae"] is not None]
+    return sorted(scored, key=lambda result: (result["mae"], result["aic"]))
+
+
+def check_options(criterion: str = "mae", folds: int = 2, horizon: int = 6) -> None:
+    if criterion not in CRITERIA:
+        raise ValueError(f"Unknown criterion: {criterion}. Use any of {', '.join(CRITERIA)}.")
+    if folds < 1 or horizon < 1:
+        raise ValueError("folds and horizon must be at least 1")
+
+
+def search_orders(series: Series, grid: Optional[List[Candidate]] = None, folds: int = 2, horizon: int = 6,
+                  criterion: str = "mae", workers: int = SEARCH_WORKERS, configs: ModelConfigStore = model_configs,
+                  cache: ModelCache = model_cache) -> dict:
+    check_options(criterion, folds, horizon)
+    grid = grid or candidate_grid()
+    monthly_data = aggregate_monthly(series)
+
+    workers = max(1, min(workers, len(grid)))
+    started = time.perf_counter()
+    with span("model_search"), ProcessPoolExecutor(max_workers=workers, mp_context=PROCESS_CONTEXT) as pool:
+        futures = [pool.submit(_evaluate, monthly_data, order, seasonal_order, folds, horizon)
+                   for order, seasonal_order in grid]
+        results = [future.result() for future in futures]
+    wall_seconds = time.perf_counter() - started
+
+    ranked = rank(results, criterion)
+    if not ranked:
+        raise RuntimeError("No candidate model could be fitted")
+    best = ranked[0]
+    order, seasonal_order = tuple(best["order"]), tuple(best["seasonal_order"])
+    # The winner's full fit doubles as the served model, so switching to it
+    # needs a Kalman filter pass rather than another fit.
+    cache.save_params(model_key(series, order, seasonal_order), np.asarray(best["params"]))
+    configs.save(series.ts_id, {
+        "order": list(order),
+        "seasonal_order": list(seasonal_order),
+        "criterion": criterion,
+        "aic": best["aic"],
+        "mae": best["mae"],
+        "version": series.version,
+        "searched_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    })
+
+    candidate_seconds = sum(result["seconds"] for result in results)
+    for result in results:
+        result.pop("params", None)
+    return {
+        "ts_id": series.ts_id,
+        "version": series.version,
+        "criterion": criterion,
+        "folds": folds,
+        "horizon": horizon,
+        "workers": workers,
+        "best": {key: best[key] for key in ("order", "seasonal_order", "aic", "mae")},
+        "wall_seconds": round(wall_seconds, 3),
+        "candidate_seconds": round(candidate_seconds, 3),
+        "speedup": round(candidate_seconds / wall_seconds, 2) if wall_seconds else None,
+        "candidates": sorted(results, key=lambda result: result["seconds"], reverse=True),
+    }
+
+
+class SearchJobs:
+    # At most one search per ts_id at a time, run on a background thread
+    # that fans the candidates out to a process pool.
+    def __init__(self):
+        self._jobs: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def start(self, ts_id: str, criterion: str = "mae", folds: int = 2, horizon: int = 6, **options) -> dict:
+        # Bad options fail here, not later in the background job.
+        check_options(criterion, folds, horizon)
+        options.update(criterion=criterion, folds=folds, horizon=horizon)
+        series = get_series(ts_id)
+        with self._lock:
+            job = self._jobs.get(ts_id)
+            if job is not None and job["status"] == "running":
+                return dict(job)
+            job = self._jobs[ts_id] = {"ts_id": ts_id, "status": "running", "started_at": time.time()}
+
+        def run():
+            try:
+                report = search_orders(series, **options)
+                job.update(status="done", report=report)
+            except Exception as e:
+                job.update(status="failed", error=str(e))
+            job["finished_at"] = time.time()
+
+        threading.Thread(target=run, name=f"model-search-{ts_id}", daemon=True).start()
+        return dict(job)
+
+    def status(self, ts_id: str) -> Optional[dict]:
+        # Jobs started by this process only; see get_model_search.
+        job = self._jobs.get(ts_id)
+        return dict(job) if job is not None else None
+
+
+search_jobs = SearchJobs()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Search SARIMA orders for a series and save the winner.")
+    parser.add_argument("ts_id")
+    parser.add_argument("--criterion", choices=CRITERIA, default="mae")
+    parser.add_argument("--folds", type=int, default=2)
+    parser.add_argument("--horizon", type=int, default=6)
+    parser.add_argument("--workers", type=int, default=SEARCH_WORKERS)
+    args = parser.parse_args()
+    print(json.dumps(search_orders(get_series(args.ts_id), folds=args.folds, horizon=args.horizon,
+                                   criterion=args.criterion, workers=args.workers), indent=2))
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Dict
+from typing import Dict, List, Optional
 
 class CarbonIntensityRecord(BaseModel):
     date: str
@@ -8,3 +8,24 @@ class CarbonIntensityRecord(BaseModel):
 class Preferences(BaseModel):
     customer_id: str
     preferences: Dict[str, str]
+
+class BulkPreferencesRequest(BaseModel):
+    items: List[Preferences]
+
+class StatsWindow(BaseModel):
+    ts_id: str = 'caiso_carbon_intensity'
+    start: str
+    end: str
+
+class BatchStatsRequest(BaseModel):
+    windows: List[StatsWindow]
+    metrics: List[str] = ["max", "min", "average", "variance"]
+
+class MultiStatsRequest(BaseModel):
+    ts_ids: List[str] = []
+    start: str
+    end: str
+    metrics: List[str] = ["max", "min", "average", "variance"]
+    resolution: str = "hour"
+    common_only: bool = False
+    top: Optional[int] = None
@@ -0,0 +1,140 @@
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from app.rollups import RESOLUTIONS, bucket_keys, bucket_start
+from app.store import Series
+
+MULTI_METRICS = ("max", "min", "average", "variance")
+
+
+FIELDS = ("count", "sum", "sumsq", "min", "max")
+
+
+def edge_pieces(unit: str, start: int, end: int):
+    # The buckets [start, end) cuts through, as (key, piece start, piece end),
+    # plus the span of the buckets it covers whole.
+    first_key = int(bucket_keys(np.array([start], dtype=np.int64), unit)[0])
+    last_key = int(bucket_keys(np.array([end], dtype=np.int64), unit)[0])
+    first_start, last_start = bucket_start(first_key, unit), bucket_start(last_key, unit)
+    if first_key == last_key:
+        return ([(first_key, start, end)] if start < end else []), (end, end)
+    pieces = []
+    whole_start = start
+    if first_start < start:
+        whole_start = bucket_start(first_key + 1, unit)
+        pieces.append((first_key, start, whole_start))
+    if last_start < end:
+        pieces.append((last_key, last_start, end))
+    return pieces, (whole_start, last_start)
+
+
+def series_buckets(series: Series, resolution: str, start: int, end: int) -> Dict[str, np.ndarray]:
+    # Per-bucket fields over exactly [start, end): whole buckets come from the
+    # rollup, the partial ones at either edge from the raw points.
+    table = series.rollups[resolution]
+    pieces, (whole_start, whole_end) = edge_pieces(table.unit, start, end)
+    lo, hi = table.range(whole_start, whole_end)
+    columns = {"bucket": [table["bucket"][lo:hi]]}
+    for field in FIELDS:
+        columns[field] = [table[field][lo:hi]]
+
+    for key, piece_start, piece_end in pieces:
+        piece_lo, piece_hi = series.range_indices(piece_start, piece_end)
+        count = piece_hi - piece_lo
+        if not count:
+            continue
+        index = series.index
+        total = index.sum(piece_lo, piece_hi)
+        spread = index.variance(piece_lo, piece_hi) * (count - 1) if count > 1 else 0.0
+        for field, value in (("bucket", key), ("count", count), ("sum", total),
+                             ("sumsq", spread + total * total / count),
+                             ("min", index.min(piece_lo, piece_hi)), ("max", index.max(piece_lo, piece_hi))):
+            columns[field].append(np.array([value]))
+    merged = {field: np.concatenate(parts) for field, parts in columns.items()}
+    order = np.argsort(merged["bucket"], kind="stable")
+    return {field: column[order] for field, column in merged.items()}
+
+
+class AlignedFrame:
+    # Several series aligned on one calendar grid: a (series x bucket) matrix
+    # per rollup field, with count 0 (and NaN min/max) where a series has no
+    # points in a bucket. Whole buckets come from the rollups, so no raw
+    # points are copied; buckets cut by the window only count the points
+    # inside it.
+    def __init__(self, series: List[Series], resolution: str, start: int, end: int):
+        if resolution not in RESOLUTIONS:
+            raise ValueError(f"Unknown resolution: {resolution}. Use any of {', '.join(RESOLUTIONS)}.")
+        self.ts_ids = [item.ts_id for item in series]
+        self.resolution = resolution
+        self.unit = RESOLUTIONS[resolution]
+
+        rows = [series_buckets(item, resolution, start, end) for item in series]
+        keys = [row["bucket"] for row in rows]
+        self.buckets = np.unique(np.concatenate(keys)) if keys else np.empty(0, dtype=np.int64)
+
+        shape = (len(series), len(self.buckets))
+        self.count = np.zeros(shape, dtype=np.int64)
+        self.sum = np.zeros(shape)
+        self.sumsq = np.zeros(shape)
+        self.min = np.full(shape, np.nan)
+        self.max = np.full(shape, np.nan)
+        for position, row in enumerate(rows):
+            columns = np.searchsorted(self.buckets, row["bucket"])
+            for field in FIELDS:
+                getattr(self, field)[position, columns] = row[field]
+
+    def restrict_to_common(self) -> None:
+        # Keep only buckets every series has data for, so regions are compared
+        # over the same hours rather than over whatever each one reported.
+        common = (self.count > 0).all(axis=0)
+        self.buckets = self.buckets[common]
+        for field in ("count", "sum", "sumsq", "min", "max"):
+            setattr(self, field, getattr(self, field)[:, common])
+
+    def reduce(self, metrics: List[str]) -> Dict[str, np.ndarray]:
+        counts = self.count.sum(axis=1)
+        sums = self.sum.sum(axis=1)
+        has_data = counts > 0
+        results = {"count": counts}
+        with np.errstate(invalid="ignore", divide="ignore"):
+            if "average" in metrics:
+                results["average"] = np.where(has_data, sums / counts, np.nan)
+            if "variance" in metrics:
+                variance = (self.sumsq.sum(axis=1) - sums * sums / counts) / (counts - 1)
+                results["variance"] = np.where(counts > 1, np.maximum(variance, 0.0), np.nan)
+        if "max" in metrics:
+            results["max"] = np.where(has_data, np.fmax.reduce(self.max, axis=1, initial=-np.inf), np.nan)
+        if "min" in metrics:
+            results["min"] = np.where(has_data, np.fmin.reduce(self.min, axis=1, initial=np.inf), np.nan)
+        return results
+
+
+def rank(ts_ids: List[str], values: np.ndarray) -> List[str]:
+    # Ascending, so the first entry is the cleanest region for that metric.
+    present = np.flatnonzero(~np.isnan(values))
+    order = present[np.argsort(values[present], kind="stable")]
+    return [ts_ids[position] for position in order.tolist()]
+
+
+def evaluate(series: List[Series], start: int, end: int, metrics: List[str], resolution: str = "hour",
+             common_only: bool = False, top: Optional[int] = None) -> dict:
+    unknown = [metric for metric in metrics if metric not in MULTI_METRICS]
+    if unknown:
+        raise ValueError(f"Unknown metrics: {', '.join(unknown)}. Use any of {', '.join(MULTI_METRICS)}.")
+
+    frame = AlignedFrame(series, resolution, start, end)
+    if common_only:
+        frame.restrict_to_common()
+    reduced = frame.reduce(metrics)
+
+    regions = []
+    for row, ts_id in enumerate(frame.ts_ids):
+        region = {"ts_id": ts_id, "count": int(reduced["count"][row])}
+        for metric in metrics:
+            value = reduced[metric][row]
+            region[metric] = None if np.isnan(value) else float(value)
+        regions.append(region)
+
+    rankings = {metric: rank(frame.ts_ids, reduced[metric])[:top] for metric in metrics}
+    return {"resolution": resolution, "buckets": len(frame.buckets), "regions": regions, "rankings": rankings}
@@ -0,0 +1,187 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.metrics import cache_lookup, metrics, span
+from app.store import DATA_DIR
+
+PREFERENCES_DB = os.getenv("PREFERENCES_DB", os.path.join(DATA_DIR, "preferences.sqlite3"))
+PREFERENCES_CACHE_SIZE = int(os.getenv("PREFERENCES_CACHE_SIZE", "10000"))
+# A write waits at most this long for others to share its commit.
+PREFERENCES_BATCH_WINDOW = float(os.getenv("PREFERENCES_BATCH_WINDOW", "0.002"))
+PREFERENCES_BATCH_SIZE = int(os.getenv("PREFERENCES_BATCH_SIZE", "512"))
+PREFERENCES_BULK_MAX = 1000
+# SQLite allows at most 999 bound parameters per statement in older builds.
+SQLITE_MAX_PARAMS = 900
+
+COMMIT_WRITES = metrics.histogram(
+    "prediction_preferences_commit_writes", "Preference writes folded into each group commit.",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512))
+
+
+class PreferenceStore:
+    # Customer preferences in an SQLite database in WAL mode, shared by every
+    # uvicorn worker. Reads go through an LRU cache that is dropped whenever
+    # another connection has committed (PRAGMA data_version), so workers
+    # never serve each other's stale entries. Writes are queued and a writer
+    # thread commits everything queued within PREFERENCES_BATCH_WINDOW in one
+    # transaction; each caller's future resolves once its write is committed.
+    def __init__(self, path: str = PREFERENCES_DB, cache_size: int = PREFERENCES_CACHE_SIZE,
+                 batch_window: float = PREFERENCES_BATCH_WINDOW, batch_size: int = PREFERENCES_BATCH_SIZE):
+        self.path = path
+        self.cache_size = cache_size
+        self.batch_window = batch_window
+        self.batch_size = batch_size
+        self._connection: Optional[sqlite3.Connection] = None
+        self._data_version: Optional[int] = None
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._pending: List[Tuple[Dict[str, dict], Future]] = []
+        self._wakeup = threading.Condition()
+        self._writer: Optional[threading.Thread] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        # Called with self._lock held. One connection per process: its own
+        # commits leave data_version unchanged, other workers' bump it.
+        if self._connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS preferences ("
+                "customer_id TEXT PRIMARY KEY, preferences TEXT NOT NULL, updated_at REAL NOT NULL)")
+            self._connection = connection
+        return self._connection
+
+    def _revalidate(self, connection: sqlite3.Connection) -> None:
+        version = connection.execute("PRAGMA data_version").fetchone()[0]
+        if version != self._data_version:
+            self._cache.clear()
+            self._data_version = version
+
+    def _remember(self, customer_id: str, preferences: Optional[dict]) -> None:
+        self._cache[customer_id] = preferences
+        self._cache.move_to_end(customer_id)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def get_many(self, customer_ids: Iterable[str]) -> Dict[str, dict]:
+        # Unknown customers are left out of the result.
+        customer_ids = list(dict.fromkeys(customer_ids))
+        found = {}
+        with self._lock:
+            connection = self._connect()
+            self._revalidate(connection)
+            missing = []
+            for customer_id in customer_ids:
+                hit = customer_id in self._cache
+                cache_lookup("preferences", hit)
+                if hit:
+                    self._cache.move_to_end(customer_id)
+                    if self._cache[customer_id] is not None:
+                        found[customer_id] = self._cache[customer_id]
+                else:
+                    missing.append(customer_id)
+            for start in range(0, len(missing), SQLITE_MAX_PARAMS):
+                chunk = missing[start:start + SQLITE_MAX_PARAMS]
+                rows = dict(connection.execute(
+                    f"SELECT customer_id, preferences FROM preferences "
+                    f"WHERE customer_id IN ({','.join('?' * len(chunk))})", chunk).fetchall())
+                for customer_id in chunk:
+                    preferences = json.loads(rows[customer_id]) if customer_id in rows else None
+                    # Misses are cached too, so repeated lookups of unknown
+                    # customers do not reach the database either.
+                    self._remember(customer_id, preferences)
+                    if preferences is not None:
+                        found[customer_id] = preferences
+        return {customer_id: found[customer_id] for customer_id in customer_ids if customer_id in found}
+
+    def get(self, customer_id: str) -> Optional[dict]:
+        return self.get_many([customer_id]).get(customer_id)
+
+    def submit(self, items: Dict[str, dict]) -> Future:
+        future = Future()
+        if not items:
+            future.set_result({})
+            return future
+        with self._wakeup:
+            self._pending.append((dict(items), future))
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._write_loop, name="preferences-writer", daemon=True)
+                self._writer.start()
+            self._wakeup.notify()
+        return future
+
+    def put_many(self, items: Dict[str, dict]) -> Dict[str, dict]:
+        return self.submit(items).result()
+
+    def put(self, customer_id: str, preferences: dict) -> Dict[str, dict]:
+        return self.put_many({customer_id: preferences})
+
+    def _write_loop(self) -> None:
+        while True:
+            with self._wakeup:
+                while not self._pending:
+                    self._wakeup.wait()
+                deadline = time.monotonic() + self.batch_window
+                while sum(len(items) for items, _ in self._pending) < self.batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._wakeup.wait(remaining)
+                batch, self._pending = self._pending, []
+            self._commit(batch)
+
+    def _commit(self, batch: List[Tuple[Dict[str, dict], Future]]) -> None:
+        # Later writes to the same customer within a batch win.
+        merged = {}
+        for items, _ in batch:
+            merged.update(items)
+        now = time.time()
+        rows = [(customer_id, json.dumps(preferences), now) for customer_id, preferences in merged.items()]
+        try:
+            with self._lock, span("preferences_commit"):
+                connection = self._connect()
+                self._revalidate(connection)
+                connection.execute("BEGIN IMMEDIATE")
+                try:
+                    connection.executemany(
+                        "INSERT INTO preferences (customer_id, preferences, updated_at) VALUES (?, ?, ?) "
+                        "ON CONFLICT(customer_id) DO UPDATE SET "
+                        "preferences = excluded.preferences, updated_at = excluded.updated_at", rows)
+                    connection.execute("COMMIT")
+                except Exception:
+                    connection.execute("ROLLBACK")
+                    raise
+                for customer_id, preferences in merged.items():
+                    self._remember(customer_id, preferences)
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        COMMIT_WRITES.observe(len(rows))
+        for items, future in batch:
+            future.set_result(items)
+
+    def count(self) -> int:
+        with self._lock:
+            return self._connect().execute("SELECT COUNT(*) FROM preferences").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+            self._cache.clear()
+            self._data_version = None
+
+
+preferences_store = PreferenceStore()
@@ -0,0 +1,83 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import List, Optional
+
+PROFILER_ENABLED = os.getenv("PROFILER_ENABLED", "0") == "1"
+PROFILER_INTERVAL = float(os.getenv("PROFILER_INTERVAL", "0.01"))
+PROFILER_MAX_DEPTH = 64
+
+
+def _collapse(frame) -> str:
+    # Root-first "file:function;file:function" stacks, the collapsed format
+    # flame graph tools read.
+    names = []
+    while frame is not None and len(names) < PROFILER_MAX_DEPTH:
+        code = frame.f_code
+        names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class SamplingProfiler:
+    # Samples every thread's stack from a daemon thread at a fixed interval.
+    # It never runs unless started; PROFILER_ENABLED only gates whether the
+    # HTTP toggle may start it.
+    def __init__(self, interval: float = PROFILER_INTERVAL):
+        self.interval = interval
+        self.samples = 0
+        self.started_at: Optional[float] = None
+        self._stacks = Counter()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval: Optional[float] = None) -> None:
+        if self.running:
+            return
+        if interval is not None:
+            if interval <= 0:
+                raise ValueError("interval must be positive")
+            self.interval = interval
+        self._stop.clear()
+        self.started_at = time.time()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stacks.clear()
+            self.samples = 0
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            with self._lock:
+                self.samples += 1
+                for ident, frame in frames.items():
+                    if ident != own:
+                        self._stacks[_collapse(frame)] += 1
+
+    def top(self, limit: int = 50) -> List[dict]:
+        with self._lock:
+            return [{"stack": stack, "count": count} for stack, count in self._stacks.most_common(limit)]
+
+    def collapsed(self) -> str:
+        with self._lock:
+            return "".join(f"{stack} {count}\n" for stack, count in self._stacks.most_common())
+
+
+profiler = SamplingProfiler()
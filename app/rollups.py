@@ -0,0 +1,122 @@
+from typing import Dict, Optional
+
+import numpy as np
+
+from app.indexes import GrowableArray
+
+RESOLUTIONS = {
+    "hour": "datetime64[h]",
+    "day": "datetime64[D]",
+    "month": "datetime64[M]",
+    "year": "datetime64[Y]",
+}
+FIELDS = ("bucket", "count", "sum", "sumsq", "min", "max")
+
+
+def bucket_keys(timestamps: np.ndarray, unit: str) -> np.ndarray:
+    return timestamps.astype("datetime64[s]").astype(unit).astype(np.int64)
+
+
+def bucket_start(key: int, unit: str) -> int:
+    return int(np.array(key, dtype=np.int64).astype(unit).astype("datetime64[s]").astype(np.int64))
+
+
+class Rollup:
+    # Calendar buckets over the sorted series: one row per non-empty bucket
+    # with count, sum, sum of squares, min and max.
+    def __init__(self, resolution: str):
+        self.resolution = resolution
+        self.unit = RESOLUTIONS[resolution]
+        self.columns = {
+            "bucket": GrowableArray(np.int64),
+            "count": GrowableArray(np.int64),
+            "sum": GrowableArray(np.float64),
+            "sumsq": GrowableArray(np.float64),
+            "min": GrowableArray(np.float64),
+            "max": GrowableArray(np.float64),
+        }
+
+    def __len__(self) -> int:
+        return len(self.columns["bucket"])
+
+    def __getitem__(self, field: str) -> np.ndarray:
+        return self.columns[field].view
+
+    def fork(self) -> "Rollup":
+        forked = Rollup(self.resolution)
+        forked.columns = {field: column.fork() for field, column in self.columns.items()}
+        return forked
+
+    def update(self, timestamps: np.ndarray, values: np.ndarray, position: int) -> None:
+        # Only the bucket holding `position` and the ones after it change.
+        if position < len(timestamps):
+            first_key = bucket_keys(timestamps[position:position + 1], self.unit)[0]
+            start = int(np.searchsorted(timestamps, bucket_start(first_key, self.unit), side='left'))
+            kept = int(np.searchsorted(self["bucket"], first_key, side='left'))
+        else:
+            start, kept = len(timestamps), len(self)
+        for column in self.columns.values():
+            column.truncate(kept)
+
+        tail_values = values[start:]
+        if not len(tail_values):
+            return
+        keys = bucket_keys(timestamps[start:], self.unit)
+        edges = np.concatenate(([0], np.flatnonzero(np.diff(keys)) + 1))
+        counts = np.diff(np.append(edges, len(keys)))
+        self.columns["bucket"].extend(keys[edges])
+        self.columns["count"].extend(counts)
+        self.columns["sum"].extend(np.add.reduceat(tail_values, edges))
+        self.columns["sumsq"].extend(np.add.reduceat(tail_values * tail_values, edges))
+        self.columns["min"].extend(np.minimum.reduceat(tail_values, edges))
+        self.columns["max"].extend(np.maximum.reduceat(tail_values, edges))
+
+    def means(self) -> np.ndarray:
+        return self["sum"] / self["count"]
+
+    def range(self, start: int, end: int):
+        # Buckets whose start lies in [start, end).
+        buckets = self["bucket"]
+        starts = buckets.astype(self.unit).astype("datetime64[s]").astype(np.int64)
+        lo = int(np.searchsorted(starts, start, side='left'))
+        hi = int(np.searchsorted(starts, end, side='left'))
+        return lo, max(lo, hi)
+
+
+class Rollups:
+    def __init__(self, timestamps: np.ndarray, values: np.ndarray):
+        self.tables = {resolution: Rollup(resolution) for resolution in RESOLUTIONS}
+        self.update(timestamps, values, 0)
+
+    def __getitem__(self, resolution: str) -> Rollup:
+        if resolution not in self.tables:
+            raise ValueError(f"Unknown resolution: {resolution}. Use any of {', '.join(RESOLUTIONS)}.")
+        return self.tables[resolution]
+
+    def fork(self) -> "Rollups":
+        forked = Rollups.__new__(Rollups)
+        forked.tables = {resolution: table.fork() for resolution, table in self.tables.items()}
+        return forked
+
+    def update(self, timestamps: np.ndarray, values: np.ndarray, position: int) -> None:
+        for table in self.tables.values():
+            table.update(timestamps, values, position)
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray]) -> Optional["Rollups"]:
+        if any(f"rollup_{resolution}_{field}" not in arrays for resolution in RESOLUTIONS for field in FIELDS):
+            return None
+        rollups = cls.__new__(cls)
+        rollups.tables = {}
+        for resolution in RESOLUTIONS:
+            table = Rollup(resolution)
+            for field in FIELDS:
+                table.columns[field] = GrowableArray.wrap(arrays[f"rollup_{resolution}_{field}"])
+            rollups.tables[resolution] = table
+        return rollups
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        return {
+            f"rollup_{resolution}_{field}": table[field]
+            for resolution, table in self.tables.items() for field in FIELDS
+        }
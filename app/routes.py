@@ -1,84 +1,281 @@
 from fastapi import APIRouter, HTTPException, Query, FastAPI, Request, Depends
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
 from fastapi.templating import Jinja2Templates
-from typing import List,Optional
-from app.models import CarbonIntensityRecord, Preferences
-from app.services import get_max, get_min, get_avg, get_var, get_predict_least_carbon, save_customer_preferences, get_prompt_response, get_predict_advanced_least_carbon
+from typing import Awaitable, Callable, List,Optional
+from app.models import CarbonIntensityRecord, Preferences, BulkPreferencesRequest, BatchStatsRequest, MultiStatsRequest
+from app.services import get_max, get_min, get_avg, get_var, get_predict_least_carbon, submit_customer_preferences, get_customer_preferences, get_prompt_response, get_predict_advanced_least_carbon, get_batch_stats, get_rollup, ingest_points, get_multi_stats, get_best_windows, response_key, get_series_points, prepare_export, start_model_search, get_model_search, get_percentiles, get_histogram, parse_percentiles
+from app.cache import RESPONSE_MAX_AGE, etag_for, etag_matches, response_cache
+from app.executors import run_in_thread
+from app.export import EXPORT_FORMATS
+from app.metrics import metrics, span
+from app.profiler import PROFILER_ENABLED, profiler
+from app.singleflight import AsyncSingleFlight
+from app.store import registry
 from collections import defaultdict
+from datetime import datetime
+from functools import partial
+import asyncio
 import json
 import os
 
 router = APIRouter()
 templates = Jinja2Templates(directory="templates")
 
+async def run_stat(fn, ts_id: str, *args):
+    # Aggregates over an already loaded series are microseconds of work and
+    # run on the event loop; a first load (file parse) goes to a thread.
+    if registry.is_loaded(ts_id):
+        return fn(ts_id, *args)
+    return await run_in_thread("stats", fn, ts_id, *args)
+
+# Identical requests that arrive while one is being computed wait for it
+# instead of starting their own.
+flights = AsyncSingleFlight()
+
+async def cached_json(request: Request, key: Optional[tuple], compute: Callable[[], Awaitable[dict]]) -> Response:
+    # Serves repeated queries from the response cache and answers matching
+    # If-None-Match headers with 304 without touching the series at all.
+    if key is None:
+        return JSONResponse(await compute())
+    etag = etag_for(key)
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={RESPONSE_MAX_AGE}"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    body = response_cache.get(key)
+    if body is None:
+        body = await flights.do(key, partial(render, key, compute))
+    return Response(content=body, media_type="application/json", headers=headers)
+
+async def render(key: tuple, compute: Callable[[], Awaitable[dict]]) -> bytes:
+    body = JSONResponse(await compute()).body
+    response_cache.put(key, body)
+    return body
+
 @router.get("/max/")
-def max_value(ts_id: str, start: str, end: str):
+async def max_value(request: Request, ts_id: str, start: str, end: str):
+    async def compute():
+        return {"max": await run_stat(get_max, ts_id, start, end)}
     try:
-        return {"max": get_max(ts_id, start, end)}
+        return await cached_json(request, response_key("max", ts_id, start, end), compute)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.get("/min/")
-def min_value(ts_id: str, start: str, end: str):
+async def min_value(request: Request, ts_id: str, start: str, end: str):
+    async def compute():
+        return {"min": await run_stat(get_min, ts_id, start, end)}
     try:
-        return {"min": get_min(ts_id, start, end)}
+        return await cached_json(request, response_key("min", ts_id, start, end), compute)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.get("/predict_least_carbon/")
-def predict_least_carbon(ts_id: str) -> dict:
-    try:
-        print("hello")
-        prediction = get_predict_least_carbon(ts_id)
+async def predict_least_carbon(request: Request, ts_id: str):
+    async def compute():
+        prediction = await run_stat(get_predict_least_carbon, ts_id)
         return {
             "year": prediction["year"],
             "month": prediction["month"],
             "predicted_value": prediction["predicted_value"]
         }
+    try:
+        # The prediction is for next year, so it also changes at new year.
+        key = response_key("predict_least_carbon", ts_id, extra=(datetime.now().year,))
+        return await cached_json(request, key, compute)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
 @router.get("/predict_advanced_least_carbon/")
-def predict_advanced_least_carbon(ts_id: str, start_date: str, end_date: str) -> dict:
+async def predict_advanced_least_carbon(ts_id: str, start_date: str, end_date: str) -> dict:
     try:
-        prediction = get_predict_advanced_least_carbon(ts_id, start_date, end_date)
+        key = response_key("predict_advanced_least_carbon", ts_id, start_date, end_date)
+        compute = partial(run_in_thread, "predict_advanced_least_carbon", get_predict_advanced_least_carbon, ts_id, start_date, end_date)
+        prediction = await (flights.do(key, compute) if key is not None else compute())
         return {
             "month": prediction["month"],
-            "predicted_value": prediction["predicted_value"]
+            "predicted_value": prediction["predicted_value"],
+            "model_version": prediction["model_version"],
+            "model_age_seconds": prediction["model_age_seconds"]
         }
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+@router.get("/best_window/")
+async def best_window(ts_id: str, start: str, end: str, hours: int, k: int = 1, source: str = "historical"):
+    try:
+        return await run_in_thread("best_window", get_best_windows, ts_id, start, end, hours, k, source)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @router.post("/preferences/")
-def save_preferences(preferences: Preferences):
+async def save_preferences(preferences: Preferences):
     try:
-        result = save_customer_preferences(preferences.customer_id, preferences.preferences)
+        result = await asyncio.wrap_future(
+            submit_customer_preferences({preferences.customer_id: preferences.preferences}))
         return {"message": "Preferences saved successfully", "data": result}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
-@router.get("/average/")
-def average(ts_id: str, start: str, end: str):
+@router.get("/preferences/")
+async def read_preferences(customer_id: List[str] = Query(...)):
     try:
-        avg = get_avg(ts_id, start, end)
+        return await run_in_thread("preferences", get_customer_preferences, customer_id)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/preferences/bulk/")
+async def save_preferences_bulk(request: BulkPreferencesRequest):
+    try:
+        items = {item.customer_id: item.preferences for item in request.items}
+        result = await asyncio.wrap_future(submit_customer_preferences(items))
+        return {"message": "Preferences saved successfully", "count": len(result), "data": result}
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/average/")
+async def average(request: Request, ts_id: str, start: str, end: str):
+    async def compute():
+        avg = await run_stat(get_avg, ts_id, start, end)
         return {"average": avg}
+    try:
+        return await cached_json(request, response_key("average", ts_id, start, end), compute)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.get("/variance/")
-def variance(ts_id: str, start: str, end: str):
-    try:
-        var = get_var(ts_id, start, end)
+async def variance(request: Request, ts_id: str, start: str, end: str):
+    async def compute():
+        var = await run_stat(get_var, ts_id, start, end)
         return {"variance": var}
+    try:
+        return await cached_json(request, response_key("variance", ts_id, start, end), compute)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/percentile/")
+async def percentile(request: Request, ts_id: str, start: str, end: str, q: str = "10,50,90"):
+    async def compute():
+        return await run_stat(get_percentiles, ts_id, start, end, q)
+    try:
+        key = response_key("percentile", ts_id, start, end, tuple(parse_percentiles(q)))
+        return await cached_json(request, key, compute)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/histogram/")
+async def histogram(request: Request, ts_id: str, start: str, end: str, bins: int = 20):
+    async def compute():
+        return await run_stat(get_histogram, ts_id, start, end, bins)
+    try:
+        return await cached_json(request, response_key("histogram", ts_id, start, end, (bins,)), compute)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/batch_stats/")
+async def batch_stats(request: BatchStatsRequest):
+    try:
+        windows = [(window.ts_id, window.start, window.end) for window in request.windows]
+        return {"results": await run_in_thread("batch_stats", get_batch_stats, windows, request.metrics)}
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/multi_stats/")
+async def multi_stats(request: MultiStatsRequest):
+    try:
+        return await run_in_thread("multi_stats", get_multi_stats, request.ts_ids, request.start, request.end,
+                                   request.metrics, request.resolution, request.common_only, request.top)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/series/")
+async def series_points(ts_id: str, start: Optional[str] = None, end: Optional[str] = None, max_points: int = 1000,
+                        method: str = "lttb"):
+    try:
+        return await run_in_thread("series", get_series_points, ts_id, start, end, max_points, method)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/export/")
+async def export(ts_id: str, start: Optional[str] = None, end: Optional[str] = None, format: str = "ndjson"):
+    try:
+        series, count, chunks = await run_in_thread("export", prepare_export, ts_id, start, end, format)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    headers = {
+        "Content-Disposition": f'attachment; filename="{ts_id}.{format}"',
+        "X-Series-Version": series.version,
+        "X-Total-Count": str(count),
+    }
+    return StreamingResponse(chunks, media_type=EXPORT_FORMATS[format], headers=headers)
+
+@router.post("/model_search/")
+async def model_search(ts_id: str, criterion: str = "mae", folds: int = 2, horizon: int = 6):
+    try:
+        return await run_in_thread("model_search", start_model_search, ts_id, criterion, folds, horizon)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/model_search/")
+async def model_search_status(ts_id: str):
+    try:
+        return get_model_search(ts_id)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/rollup/")
+async def rollup(ts_id: str, start: str, end: str, resolution: str = "month", offset: int = 0, limit: int = 1000):
+    try:
+        return await run_in_thread("rollup", get_rollup, ts_id, resolution, start, end, offset, limit)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/ingest/")
+async def ingest(ts_id: str, records: List[CarbonIntensityRecord]):
+    try:
+        points = [(record.date, record.intensity) for record in records]
+        return await run_in_thread("ingest", ingest_points, ts_id, points)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@router.get("/profiler/")
+async def profiler_report(limit: int = 50, format: str = "json"):
+    if format == "collapsed":
+        return PlainTextResponse(profiler.collapsed())
+    return {"running": profiler.running, "interval": profiler.interval, "samples": profiler.samples,
+            "stacks": profiler.top(limit)}
+
+@router.post("/profiler/")
+async def toggle_profiler(enabled: bool, interval: Optional[float] = None, reset: bool = False):
+    if not PROFILER_ENABLED:
+        raise HTTPException(status_code=400, detail="The profiler is disabled; start the service with PROFILER_ENABLED=1.")
+    try:
+        if reset:
+            profiler.reset()
+        if enabled:
+            profiler.start(interval)
+        else:
+            await run_in_thread("profiler", profiler.stop)
+        return {"running": profiler.running, "interval": profiler.interval, "samples": profiler.samples}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.get("/give_prompt/", response_class=HTMLResponse)
 async def give_prompt(request: Request):
-    return templates.TemplateResponse("form.html", {"request": request})
+    with span("template_render"):
+        return templates.TemplateResponse("form.html", {"request": request})
 
 @router.get("/process_prompt/", response_class=HTMLResponse)
-async def process_prompt(request: Request, prompt: str):
-    output = get_prompt_response(prompt)
-    return templates.TemplateResponse("form.html", {"request": request, "input": prompt, "output": output})
\ No newline at end of file
+async def process_prompt(request: Request, prompt: str, ts_id: Optional[str] = None):
+    try:
+        output = await run_in_thread("process_prompt", get_prompt_response, prompt, ts_id)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    with span("template_render"):
+        return templates.TemplateResponse("form.html", {"request": request, "input": prompt, "output": output})
\ No newline at end of file
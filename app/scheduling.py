@@ -0,0 +1,76 @@
+from typing import List, Tuple
+
+import numpy as np
+
+from app.rollups import Rollup
+
+HOUR = 3600
+MAX_WINDOWS = 100
+# SARIMA levels further out than this are no better than the seasonal mean.
+MAX_FORECAST_MONTHS = 24
+
+
+def window_averages(keys: np.ndarray, values: np.ndarray, hours: int) -> Tuple[np.ndarray, np.ndarray]:
+    # Average of every run of `hours` consecutive hourly values, from one
+    # prefix sum. `keys` are sorted, distinct hour numbers; windows that
+    # would span a missing hour are dropped. Returns start positions and
+    # window averages.
+    if hours < 1:
+        raise ValueError("hours must be at least 1")
+    if len(keys) < hours:
+        return np.empty(0, dtype=np.int64), np.empty(0)
+    prefix = np.concatenate(([0.0], np.cumsum(values, dtype=np.float64)))
+    starts = np.arange(len(keys) - hours + 1)
+    complete = keys[starts + hours - 1] - keys[starts] == hours - 1
+    starts = starts[complete]
+    return starts, (prefix[starts + hours] - prefix[starts]) / hours
+
+
+def select_windows(keys: np.ndarray, starts: np.ndarray, averages: np.ndarray, hours: int,
+                   k: int) -> List[Tuple[int, float]]:
+    # The k lowest windows that do not overlap, picked greedily in order of
+    # average. Each pick blocks the 2 * hours - 1 start hours that would
+    # overlap it, so checking a candidate is a single lookup.
+    chosen: List[Tuple[int, float]] = []
+    if not len(starts):
+        return chosen
+    start_keys = keys[starts]
+    base = int(start_keys.min())
+    blocked = np.zeros(int(start_keys.max()) - base + 1, dtype=bool)
+    for position in np.argsort(averages, kind="stable").tolist():
+        offset = int(start_keys[position]) - base
+        if blocked[offset]:
+            continue
+        chosen.append((base + offset, float(averages[position])))
+        if len(chosen) == k:
+            break
+        blocked[max(0, offset - hours + 1):offset + hours] = True
+    return chosen
+
+
+def hour_keys(start: int, end: int) -> np.ndarray:
+    # Hour numbers of the whole hours inside [start, end).
+    first = -(-start // HOUR)
+    return np.arange(first, end // HOUR, dtype=np.int64)
+
+
+def month_keys(keys: np.ndarray) -> np.ndarray:
+    return keys.astype("datetime64[h]").astype("datetime64[M]").astype(np.int64)
+
+
+def hourly_profile(hourly: Rollup) -> np.ndarray:
+    # Average deviation of each (month of year, hour of day) from that
+    # month's mean, used to spread a monthly forecast over the day.
+    keys = hourly["bucket"]
+    means = hourly.means()
+    month_of_year = month_keys(keys) % 12
+    cells = month_of_year * 24 + keys % 24
+    cell_counts = np.bincount(cells, minlength=12 * 24)
+    cell_sums = np.bincount(cells, weights=means, minlength=12 * 24)
+    month_counts = np.bincount(month_of_year, minlength=12)
+    month_sums = np.bincount(month_of_year, weights=means, minlength=12)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cell_means = cell_sums / cell_counts
+        month_means = month_sums / month_counts
+    profile = cell_means.reshape(12, 24) - month_means[:, None]
+    return np.nan_to_num(profile)
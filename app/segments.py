@@ -0,0 +1,86 @@
+import fcntl
+import json
+import os
+from contextlib import contextmanager
+from typing import List, Tuple
+
+import numpy as np
+
+from app.indexes import GrowableArray
+from app.storage import NdjsonFormat, format_epoch, sort_columns
+
+SEGMENT_MAX_BYTES = int(os.getenv("SEGMENT_MAX_BYTES", str(8 * 1024 * 1024)))
+COMPACT_BYTES = int(os.getenv("COMPACT_BYTES", str(32 * 1024 * 1024)))
+COMPACT_DELAY = float(os.getenv("COMPACT_DELAY", "30"))
+
+
+class SegmentLog:
+    # Appended points live next to the base file in data/<ts_id>.segments/ as
+    # numbered NDJSON files. Writers hold an flock on the directory so
+    # workers never interleave a batch; readers replay the files in order.
+    def __init__(self, data_dir: str):
+        self.data_dir = data_dir
+
+    def directory(self, ts_id: str) -> str:
+        return os.path.join(self.data_dir, f"{ts_id}.segments")
+
+    def names(self, ts_id: str) -> List[str]:
+        try:
+            return sorted(name for name in os.listdir(self.directory(ts_id)) if name.endswith(".ndjson"))
+        except FileNotFoundError:
+            return []
+
+    def signature(self, ts_id: str) -> Tuple[Tuple[str, int], ...]:
+        directory = self.directory(ts_id)
+        return tuple((name, os.stat(os.path.join(directory, name)).st_size) for name in self.names(ts_id))
+
+    def total_bytes(self, ts_id: str) -> int:
+        return sum(size for _, size in self.signature(ts_id))
+
+    @contextmanager
+    def locked(self, ts_id: str):
+        directory = self.directory(ts_id)
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, ".lock"), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def append(self, ts_id: str, timestamps: np.ndarray, values: np.ndarray) -> None:
+        # Callers hold `locked(ts_id)`.
+        names = self.names(ts_id)
+        directory = self.directory(ts_id)
+        if names and os.stat(os.path.join(directory, names[-1])).st_size < SEGMENT_MAX_BYTES:
+            name = names[-1]
+        else:
+            name = f"{int(names[-1][:-len('.ndjson')]) + 1 if names else 0:08d}.ndjson"
+        lines = "".join(
+            json.dumps({"datetime": format_epoch(ts), "carbon_intensity": value}) + "\n"
+            for ts, value in zip(timestamps.tolist(), values.tolist())
+        )
+        fd = os.open(os.path.join(directory, name), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, lines.encode())
+        finally:
+            os.close(fd)
+
+    def read(self, ts_id: str, names: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        # Sorted by timestamp; equal timestamps keep their write order, so the
+        # last write of a point wins when the batch is applied.
+        timestamps = GrowableArray(np.int64)
+        values = GrowableArray(np.float64)
+        reader = NdjsonFormat()
+        for name in names:
+            segment_timestamps, segment_values = reader.read(os.path.join(self.directory(ts_id), name))
+            timestamps.extend(segment_timestamps)
+            values.extend(segment_values)
+        return sort_columns(timestamps.view, values.view)
+
+    def remove(self, ts_id: str, names: List[str]) -> None:
+        for name in names:
+            try:
+                os.remove(os.path.join(self.directory(ts_id), name))
+            except FileNotFoundError:
+                pass
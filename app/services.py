@@ -1,142 +1,356 @@
 import json
 import os
 from datetime import datetime
-from typing import Dict, Optional
-import subprocess
-from subprocess import Popen, PIPE
-import ast
-import pandas as pd
-import statsmodels.api as sm
-import requests
+from typing import Dict, List, Optional, Tuple
 from collections import defaultdict
+from concurrent.futures import Future
+import numpy as np
+from app.sketches import HISTOGRAM_MAX_BINS
+from app.scheduling import HOUR, MAX_FORECAST_MONTHS, MAX_WINDOWS, hour_keys, hourly_profile, month_keys, select_windows, window_averages
+from app.store import TS_ID_RE, format_epoch, get_series, load_data, parse_datetime, parse_timestamps, registry, to_epoch, Series
+from app.downsample import downsample
+from app.export import EXPORT_FORMATS, export_chunks
+from app.metrics import span
+from app.multiseries import evaluate
+from app.forecasting import model_configs
+from app.model_search import search_jobs
+from app.preferences import PREFERENCES_BULK_MAX, preferences_store
+from app.training import model_trainer
+from prompt.prompt_processor import prompt_engine
+
+ROLLUP_MAX_BUCKETS = int(os.getenv("ROLLUP_MAX_BUCKETS", "5000"))
 
-customer_preferences_db: Dict[str, Dict[str, str]] = {}
 
-def load_data(file_path: str) -> list:
-    file_path = file_path+".json"
-    if not os.path.exists(file_path):
-        raise FileNotFoundError(f"File not found: {file_path}")
-    
-    with open(file_path, 'r') as f:
-        try:
-            data = json.load(f)
-        except json.JSONDecodeError as e:
-            raise ValueError(f"Error decoding JSON: {e}")
-
-    records = data.get('data', [])
-    
-    if not isinstance(records, list):
-        raise ValueError("Invalid format: 'data' must be a list")
-
-    for record in records:
-        if not isinstance(record, dict):
-            raise ValueError(f"Invalid record format: Each record must be a dictionary, found {type(record)}")
-        if 'datetime' not in record or 'carbon_intensity' not in record:
-            raise ValueError("Invalid record format: Each record must contain 'datetime' and 'carbon_intensity' keys")
+def save_customer_preferences(cust_id: str, pref: dict) -> dict:
+    return preferences_store.put(cust_id, pref)
 
-    return records
 
+def get_customer_preferences(customer_ids: List[str]) -> dict:
+    if not customer_ids:
+        raise ValueError("At least one customer_id is required")
+    if len(customer_ids) > PREFERENCES_BULK_MAX:
+        raise ValueError(f"At most {PREFERENCES_BULK_MAX} customers can be read at once")
+    found = preferences_store.get_many(customer_ids)
+    return {"data": found, "missing": [customer_id for customer_id in dict.fromkeys(customer_ids)
+                                       if customer_id not in found]}
 
-def save_customer_preferences(cust_id: str, pref: dict) -> dict:
-    # Store preferences in-memory (could be replaced by a database)
-    customer_preferences_db[cust_id] = pref
 
-    return {cust_id: customer_preferences_db[cust_id]}
+def submit_customer_preferences(items: Dict[str, dict]) -> Future:
+    # Resolves once the group commit holding these writes is done, so async
+    # callers can await it without tying up a thread.
+    if not items:
+        raise ValueError("At least one customer is required")
+    if len(items) > PREFERENCES_BULK_MAX:
+        raise ValueError(f"At most {PREFERENCES_BULK_MAX} customers can be saved at once")
+    return preferences_store.submit(items)
 
 
-def get_max(ts_id: str = 'caiso_carbon_intensity', start: str = '', end: str = '') -> int:
+def _parse_range(start: str, end: str):
     try:
         # Convert start and end to datetime objects
-        start_dt = datetime.fromisoformat(start.replace('Z', '+00:00'))
-        end_dt = datetime.fromisoformat(end.replace('Z', '+00:00'))
+        start_dt = parse_datetime(start)
+        end_dt = parse_datetime(end)
     except ValueError as e:
         raise ValueError("Invalid datetime format. Use ISO 8601 format.")
+    return start_dt, end_dt
+
 
+def _load_series(ts_id: str) -> Series:
     try:
-        data = load_data(f'data/{ts_id}')
+        return get_series(ts_id)
     except Exception as e:
         raise RuntimeError("Error loading data: " + str(e))
 
-    filtered_data = []
-    for record in data:
-        if start_dt <= datetime.fromisoformat(record['datetime'].replace('Z', '+00:00')) < end_dt:
-            filtered_data.append(record)
-    if not filtered_data:
-        raise ValueError("No data available for the given range")
 
-    return max(record['carbon_intensity'] for record in filtered_data)
+def _range_bounds(ts_id: str, start: str, end: str):
+    start_dt, end_dt = _parse_range(start, end)
+    series = _load_series(ts_id)
 
+    with span("range_filter"):
+        lo, hi = series.range_indices(to_epoch(start_dt), to_epoch(end_dt))
+    if lo == hi:
+        raise ValueError("No data available for the given range")
+    return series, lo, hi
 
-def get_min(ts_id: str = 'caiso_carbon_intensity', start: str = '', end: str = '') -> int:
-    try:
-        start_dt = datetime.fromisoformat(start.replace('Z', '+00:00'))
-        end_dt = datetime.fromisoformat(end.replace('Z', '+00:00'))
-    except ValueError as e:
-        raise ValueError("Invalid datetime format. Use ISO 8601 format.")
 
+def response_key(endpoint: str, ts_id: str, start: Optional[str] = None, end: Optional[str] = None,
+                 extra: tuple = ()) -> Optional[tuple]:
+    # Normalized parameters plus the series version. Requests that cannot be
+    # keyed (bad dates, unknown series) return None and are not cached.
     try:
-        data = load_data(f'data/{ts_id}')
-    except Exception as e:
-        raise RuntimeError("Error loading data: " + str(e))
+        key = (endpoint, ts_id, registry.version(ts_id))
+        if start is not None:
+            start_dt, end_dt = _parse_range(start, end)
+            key += (to_epoch(start_dt), to_epoch(end_dt))
+    except (ValueError, OSError):
+        return None
+    return key + tuple(extra)
 
-    filtered_data = []
-    for record in data:
-        if start_dt <= datetime.fromisoformat(record['datetime'].replace('Z', '+00:00')) < end_dt:
-            filtered_data.append(record)
-    if not filtered_data:
-        raise ValueError("No data available for the given range")
 
-    return min(record['carbon_intensity'] for record in filtered_data)
+def _as_number(value: float):
+    value = float(value)
+    return int(value) if value.is_integer() else value
+
+
+def get_max(ts_id: str = 'caiso_carbon_intensity', start: str = '', end: str = '') -> int:
+    series, lo, hi = _range_bounds(ts_id, start, end)
+    with span("aggregate"):
+        return _as_number(series.index.max(lo, hi))
+
+
+def get_min(ts_id: str = 'caiso_carbon_intensity', start: str = '', end: str = '') -> int:
+    series, lo, hi = _range_bounds(ts_id, start, end)
+    with span("aggregate"):
+        return _as_number(series.index.min(lo, hi))
+
 
 def get_avg(ts_id: str = 'caiso_carbon_intensity', start: str = '', end: str = ''):
-    try:
-        start_dt = datetime.fromisoformat(start.replace('Z', '+00:00'))
-        end_dt = datetime.fromisoformat(end.replace('Z', '+00:00'))
-    except ValueError as e:
-        raise ValueError("Invalid datetime format. Use ISO 8601 format.")
+    series, lo, hi = _range_bounds(ts_id, start, end)
+    with span("aggregate"):
+        return series.index.mean(lo, hi)
+
+
+def get_var(ts_id: str = 'caiso_carbon_intensity', start: str = '', end: str = '') -> float:
+    series, lo, hi = _range_bounds(ts_id, start, end)
+    if hi - lo < 2:
+        raise ValueError("At least two data points are required to compute variance")
+    with span("aggregate"):
+        return series.index.variance(lo, hi)
 
+def parse_percentiles(q: str) -> List[float]:
     try:
-        data = load_data(f'data/{ts_id}')
-    except Exception as e:
-        raise RuntimeError("Error loading data: " + str(e))
+        percentiles = [float(value) for value in q.split(",") if value.strip()]
+    except ValueError:
+        raise ValueError("Percentiles must be a comma-separated list of numbers, e.g. 10,50,90")
+    if not percentiles or any(not 0 <= value <= 100 for value in percentiles):
+        raise ValueError("Percentiles must be between 0 and 100")
+    return percentiles
+
+
+def get_percentiles(ts_id: str = 'caiso_carbon_intensity', start: str = '', end: str = '',
+                    q: str = '10,50,90') -> dict:
+    percentiles = parse_percentiles(q)
+    series, lo, hi = _range_bounds(ts_id, start, end)
+    with span("percentile"):
+        values, rank_error = series.sketches.quantiles(lo, hi, np.array(percentiles))
+    return {
+        "count": hi - lo,
+        "percentiles": {f"p{_as_number(p)}": float(value) for p, value in zip(percentiles, values)},
+        "exact": rank_error == 0,
+        "rank_error": rank_error,
+    }
+
+
+def get_histogram(ts_id: str = 'caiso_carbon_intensity', start: str = '', end: str = '', bins: int = 20) -> dict:
+    if not 1 <= bins <= HISTOGRAM_MAX_BINS:
+        raise ValueError(f"bins must be between 1 and {HISTOGRAM_MAX_BINS}")
+    series, lo, hi = _range_bounds(ts_id, start, end)
+    with span("histogram"):
+        low, high = series.index.min(lo, hi), series.index.max(lo, hi)
+        counts, edges, rank_error = series.sketches.histogram(lo, hi, bins, low, high)
+    return {
+        "count": hi - lo,
+        "edges": edges.tolist(),
+        "counts": counts.tolist(),
+        "exact": rank_error == 0,
+        "rank_error": rank_error,
+    }
+
+STAT_METRICS = {
+    "max": lambda index, lo, hi: _as_number(index.max(lo, hi)),
+    "min": lambda index, lo, hi: _as_number(index.min(lo, hi)),
+    "average": lambda index, lo, hi: index.mean(lo, hi),
+    "variance": lambda index, lo, hi: index.variance(lo, hi) if hi - lo > 1 else None,
+}
+
+
+def get_batch_stats(windows: List[Tuple[str, str, str]], metrics: List[str]) -> List[dict]:
+    unknown = [metric for metric in metrics if metric not in STAT_METRICS]
+    if unknown:
+        raise ValueError(f"Unknown metrics: {', '.join(unknown)}. Use any of {', '.join(STAT_METRICS)}.")
+
+    results = [{"ts_id": ts_id, "start": start, "end": end} for ts_id, start, end in windows]
+    by_series = defaultdict(list)
+    for position, (ts_id, start, end) in enumerate(windows):
+        try:
+            start_dt, end_dt = _parse_range(start, end)
+        except ValueError as e:
+            results[position]["error"] = str(e)
+            continue
+        by_series[ts_id].append((position, to_epoch(start_dt), to_epoch(end_dt)))
+
+    for ts_id, bounds in by_series.items():
+        try:
+            series = _load_series(ts_id)
+        except RuntimeError as e:
+            for position, _, _ in bounds:
+                results[position]["error"] = str(e)
+            continue
+
+        # One vectorized lookup locates every window on this series.
+        positions, starts, ends = (np.array(column) for column in zip(*bounds))
+        los = np.searchsorted(series.timestamps, starts, side='left')
+        his = np.maximum(los, np.searchsorted(series.timestamps, ends, side='left'))
+        for position, lo, hi in zip(positions.tolist(), los.tolist(), his.tolist()):
+            result = results[position]
+            result["count"] = hi - lo
+            if lo == hi:
+                result["error"] = "No data available for the given range"
+                continue
+            for metric in metrics:
+                result[metric] = STAT_METRICS[metric](series.index, lo, hi)
+
+    return results
+
 
-    filtered_data = []
-    for record in data:
-        if start_dt <= datetime.fromisoformat(record['datetime'].replace('Z', '+00:00')) < end_dt:
-            filtered_data.append(record)
-    if not filtered_data:
+def get_multi_stats(ts_ids: List[str], start: str, end: str, metrics: List[str], resolution: str = 'hour',
+                    common_only: bool = False, top: Optional[int] = None) -> dict:
+    if top is not None and top < 1:
+        raise ValueError("top must be at least 1")
+    start_dt, end_dt = _parse_range(start, end)
+    ts_ids = list(dict.fromkeys(ts_ids)) or registry.series_ids()
+    series, errors = [], {}
+    for ts_id in ts_ids:
+        try:
+            series.append(_load_series(ts_id))
+        except RuntimeError as e:
+            errors[ts_id] = str(e)
+    if not series:
+        raise ValueError("No series could be loaded")
+
+    result = evaluate(series, to_epoch(start_dt), to_epoch(end_dt), metrics, resolution, common_only, top)
+    for region in result["regions"]:
+        for metric in ("max", "min"):
+            if region.get(metric) is not None:
+                region[metric] = _as_number(region[metric])
+    if errors:
+        result["errors"] = errors
+    return result
+
+
+def _optional_range(start: Optional[str], end: Optional[str]) -> Tuple[int, int]:
+    # A missing bound leaves that side of the series open.
+    start_dt, end_dt = _parse_range(start or "1970-01-01T00:00:00Z", end or "9999-12-31T23:59:59Z")
+    return (to_epoch(start_dt) if start else np.iinfo(np.int64).min,
+            to_epoch(end_dt) if end else np.iinfo(np.int64).max)
+
+
+def get_series_points(ts_id: str, start: Optional[str] = None, end: Optional[str] = None, max_points: int = 1000,
+                      method: str = 'lttb') -> dict:
+    series = _load_series(ts_id)
+    start_epoch, end_epoch = _optional_range(start, end)
+    lo, hi = series.range_indices(start_epoch, end_epoch)
+    if lo == hi:
         raise ValueError("No data available for the given range")
 
-    total_intensity = sum(record['carbon_intensity'] for record in filtered_data)
-    avg_intensity = total_intensity / len(filtered_data)
-    return avg_intensity
+    with span("downsample"):
+        level, timestamps, values = downsample(series, start_epoch, end_epoch, max_points, method)
+    dates = np.char.add(np.datetime_as_string(timestamps.astype("datetime64[s]")), ".000Z")
+    return {
+        "ts_id": ts_id,
+        "method": method,
+        "level": level,
+        "count": hi - lo,
+        "returned": len(timestamps),
+        "datetime": dates.tolist(),
+        "carbon_intensity": [_as_number(value) for value in values.tolist()],
+    }
 
 
-def get_var(ts_id: str = 'caiso_carbon_intensity', start: str = '', end: str = '') -> float:
-    try:
-        start_dt = datetime.fromisoformat(start.replace('Z', '+00:00'))
-        end_dt = datetime.fromisoformat(end.replace('Z', '+00:00'))
-    except ValueError as e:
-        raise ValueError("Invalid datetime format. Use ISO 8601 format.")
+def prepare_export(ts_id: str, start: Optional[str] = None, end: Optional[str] = None, fmt: str = 'ndjson'):
+    # Validates and resolves the range eagerly so errors become a 400
+    # before any bytes are sent; the returned iterator does the streaming.
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown format: {fmt}. Use any of {', '.join(EXPORT_FORMATS)}.")
+    start_epoch, end_epoch = _optional_range(start, end)
+    series = _load_series(ts_id)
+    lo, hi = series.range_indices(start_epoch, end_epoch)
+    return series, hi - lo, export_chunks(series.timestamps[lo:hi], series.values[lo:hi], fmt)
+
 
+def start_model_search(ts_id: str, criterion: str = 'mae', folds: int = 2, horizon: int = 6) -> dict:
     try:
-        data = load_data(f'data/{ts_id}')
-    except Exception as e:
+        return search_jobs.start(ts_id, criterion=criterion, folds=folds, horizon=horizon)
+    except OSError as e:
         raise RuntimeError("Error loading data: " + str(e))
 
-    filtered_data = []
-    for record in data:
-        if start_dt <= datetime.fromisoformat(record['datetime'].replace('Z', '+00:00')) < end_dt:
-            filtered_data.append(record)
-    if not filtered_data:
+
+def get_model_search(ts_id: str) -> dict:
+    if not TS_ID_RE.match(ts_id):
+        raise ValueError(f"Invalid ts_id: {ts_id}")
+    config = model_configs.load(ts_id)
+    status = search_jobs.status(ts_id)
+    if status is None:
+        # The search ran in another worker or before a restart; its result
+        # is the saved config.
+        if config is None:
+            raise LookupError(f"No model search has been run for {ts_id}")
+        status = {"ts_id": ts_id, "status": "done"}
+    status["config"] = config
+    return status
+
+
+def get_rollup(ts_id: str = 'caiso_carbon_intensity', resolution: str = 'month', start: str = '', end: str = '',
+               offset: int = 0, limit: int = 1000) -> dict:
+    if not 1 <= limit <= ROLLUP_MAX_BUCKETS:
+        raise ValueError(f"limit must be between 1 and {ROLLUP_MAX_BUCKETS}")
+    if offset < 0:
+        raise ValueError("offset must not be negative")
+    start_dt, end_dt = _parse_range(start, end)
+    series = _load_series(ts_id)
+    table = series.rollups[resolution]
+
+    first, last = table.range(to_epoch(start_dt), to_epoch(end_dt))
+    if first == last:
         raise ValueError("No data available for the given range")
+    # One page of buckets, so the response size is bounded by `limit`
+    # however long the range is.
+    lo, hi = min(first + offset, last), min(first + offset + limit, last)
+    counts = table["count"][lo:hi]
+    sums = table["sum"][lo:hi]
+    variances = np.full(hi - lo, np.nan)
+    many = counts > 1
+    variances[many] = (table["sumsq"][lo:hi][many] - sums[many] ** 2 / counts[many]) / (counts[many] - 1)
+    periods = table["bucket"][lo:hi].astype(table.unit)
+
+    buckets = [
+        {
+            "period": str(period),
+            "count": count,
+            "average": total / count,
+            "min": _as_number(low),
+            "max": _as_number(high),
+            "variance": None if np.isnan(variance) else max(0.0, variance),
+        }
+        for period, count, total, low, high, variance in zip(
+            periods, counts.tolist(), sums.tolist(), table["min"][lo:hi].tolist(),
+            table["max"][lo:hi].tolist(), variances.tolist())
+    ]
+    return {
+        "resolution": resolution,
+        "total": last - first,
+        "offset": offset,
+        "next_offset": hi - first if hi < last else None,
+        "buckets": buckets,
+    }
 
-    num_records = len(filtered_data)
-    mean_intensity = sum(record['carbon_intensity'] for record in filtered_data) / num_records
 
-    variance = sum((record['carbon_intensity'] - mean_intensity) ** 2 for record in filtered_data) / (num_records - 1)
-    
-    return variance
+def ingest_points(ts_id: str, records: List[Tuple[str, float]]) -> dict:
+    if not records:
+        raise ValueError("No records to ingest")
+    try:
+        timestamps = parse_timestamps([date for date, _ in records])
+    except ValueError as e:
+        raise ValueError("Invalid datetime format. Use ISO 8601 format.")
+    values = np.array([intensity for _, intensity in records], dtype=np.float64)
+    if not np.all(np.isfinite(values)):
+        raise ValueError("Intensities must be finite numbers")
+
+    series = registry.append(ts_id, timestamps, values)
+    registry.schedule_compaction(ts_id)
+    model_trainer.refresh(series)
+    return {"ts_id": ts_id, "accepted": len(records), "count": len(series), "version": series.version}
+
 
 def iso_to_datetime(date_str: str) -> Optional[datetime]:
     date_str = date_str.replace('Z', '+00:00')
@@ -174,60 +388,30 @@ def is_date_range_valid(start_date: Optional[datetime], end_date: Optional[datet
     return True
 
 
-def get_prompt_response(prompt: str):
-    command = ["python3", "prompt/prompt_processor.py"]
+def get_prompt_response(prompt: str, ts_id: Optional[str] = None):
+    ts_id = ts_id or prompt_engine.ts_id
+    result = prompt_engine.process(prompt, ts_id)
+    if not isinstance(result, tuple):
+        return result
 
-    os.environ['PROMPT_TEXT'] = prompt
-    current_directory = os.getcwd()
-    process = subprocess.Popen(command, stdout=PIPE, stderr=PIPE, text=True, env=os.environ)
-    stdout, stderr = process.communicate()
+    start_date_str, end_date_str, concept, last_available_date_str = result
 
-    stdout_str = stdout.strip()
-    data_tuple = ast.literal_eval(stdout_str)
-
-    start_date_str, end_date_str, concept, last_available_date_str = data_tuple
-
-    output = call_api(prompt, concept, "caiso_carbon_intensity", start_date_str, end_date_str, last_available_date_str)
-    
-    if process.returncode != 0:
-        print(f"Error: Command returned non-zero exit status {result.returncode}")
-        return {"error": f"Command failed with exit status {result.returncode}"}
+    output = call_api(prompt, concept, ts_id, start_date_str, end_date_str, last_available_date_str)
     return output
 
 
 def get_predict_least_carbon(ts_id: str = 'caiso_carbon_intensity') -> dict:
-    yearly_monthly_sums_counts = defaultdict(lambda: defaultdict(lambda: {'sum': 0, 'count': 0}))
-    data = load_data(f'data/{ts_id}')
-    
-    for record in data:
-        try:
-            date_str = record['datetime'].replace('Z', '+00:00')
-            date = datetime.fromisoformat(date_str)
-            year = date.year
-            month = date.month
-            intensity = record['carbon_intensity']
-            
-            if not isinstance(intensity, (int, float)):
-                print(f"Skipping record with non-integer intensity: {record}")
-                continue
+    monthly = get_series(ts_id).rollups["month"]
+    if not len(monthly):
+        raise ValueError("No data available for the given series")
 
-            yearly_monthly_sums_counts[year][month]['sum'] += intensity
-            yearly_monthly_sums_counts[year][month]['count'] += 1
-        except (ValueError, KeyError, TypeError) as e:
-            print(f"Error processing record {record}: {e}")
-            continue
-
-    monthly_averages = defaultdict(list)
-    for year, months in yearly_monthly_sums_counts.items():
-        for month, values in months.items():
-            if values['count'] > 0:
-                average = values['sum'] / values['count']
-                monthly_averages[month].append(average)
+    averages = monthly.means()
+    month_of_year = monthly["bucket"] % 12 + 1
 
     min_monthly_avg = {}
-    for month, averages in monthly_averages.items():
-        if averages:
-            min_monthly_avg[month] = min(averages)
+    for month, average in zip(month_of_year.tolist(), averages.tolist()):
+        if month not in min_monthly_avg or average < min_monthly_avg[month]:
+            min_monthly_avg[month] = average
 
     predicted_month = min(min_monthly_avg, key=min_monthly_avg.get)
     predicted_value = min_monthly_avg[predicted_month]
@@ -239,42 +423,24 @@ def get_predict_least_carbon(ts_id: str = 'caiso_carbon_intensity') -> dict:
         "predicted_value": round(predicted_value)
     }
 
-def get_predict_advanced_least_carbon(ts_id: str, start_date: str, end_date: str) -> dict:
-    def load_data_from_json(ts_id: str):
-        with open(f"data/{ts_id}.json", 'r') as file:
-            data = json.load(file)
-        df = pd.DataFrame(data["data"])
-        df['datetime'] = pd.to_datetime(df['datetime'])
-        return df
-    
-    def aggregate_monthly(data: pd.DataFrame):
-        data.set_index('datetime', inplace=True)
-        monthly_data = data.resample('M').mean()  # Use 'M' for monthly frequency
-        return monthly_data
-    
-    def fit_sarima_model(monthly_data: pd.DataFrame):
-        model = sm.tsa.SARIMAX(monthly_data, 
-                            order=(1, 1, 1), 
-                            seasonal_order=(1, 1, 1, 12))
-        results = model.fit(disp=False)
-        return results
-    
-    def forecast_future(model_results, periods: int):
+def forecast_future(model_results, periods: int):
+    with span("forecast"):
         forecast = model_results.get_forecast(steps=periods)
         forecast_df = forecast.summary_frame()
-        return forecast_df
-    
+    return forecast_df
+
+
+def get_predict_advanced_least_carbon(ts_id: str, start_date: str, end_date: str) -> dict:
     try:
         start_dt = datetime.fromisoformat(start_date.replace('Z', '+00:00'))
         end_dt = datetime.fromisoformat(end_date.replace('Z', '+00:00'))
     except ValueError:
         raise ValueError("Invalid date format. Use ISO 8601 format: YYYY-MM-DDTHH:MM:SSZ")
+    import pandas as pd
 
-    data = load_data_from_json(ts_id)
-
-    monthly_data = aggregate_monthly(data)
-
-    sarima_fit = fit_sarima_model(monthly_data)
+    order, seasonal_order = model_configs.orders(ts_id)
+    model = model_trainer.get(get_series(ts_id), order, seasonal_order)
+    sarima_fit = model.results
 
     forecast_periods = pd.date_range(start=start_dt, end=end_dt, freq='M').size
     forecast_df = forecast_future(sarima_fit, forecast_periods)
@@ -288,10 +454,58 @@ def get_predict_advanced_least_carbon(ts_id: str, start_date: str, end_date: str
     
     min_month = monthly_averages.idxmin()
     min_month_value = monthly_averages.min()
-    
-    print("Monthly forecast averages:", monthly_averages.to_dict())
-    print(f"Predicted month: {min_month}, Predicted value: {min_month_value}")
+
     return {
         "month": int(min_month),
-        "predicted_value": round(min_month_value) 
+        "predicted_value": round(min_month_value),
+        "model_version": model.version,
+        "model_age_seconds": round(model.age, 3)
     }
+
+
+def get_best_windows(ts_id: str, start: str, end: str, hours: int, k: int = 1, source: str = 'historical') -> dict:
+    if not 1 <= k <= MAX_WINDOWS:
+        raise ValueError(f"k must be between 1 and {MAX_WINDOWS}")
+    if hours < 1:
+        raise ValueError("hours must be at least 1")
+    start_dt, end_dt = _parse_range(start, end)
+    series = _load_series(ts_id)
+    hourly = series.rollups["hour"]
+    result = {"ts_id": ts_id, "source": source, "hours": hours}
+
+    if source == 'historical':
+        lo, hi = hourly.range(to_epoch(start_dt), to_epoch(end_dt))
+        keys = hourly["bucket"][lo:hi]
+        values = hourly["sum"][lo:hi] / hourly["count"][lo:hi]
+    elif source == 'forecast':
+        # The SARIMA model forecasts monthly levels; each hour gets its
+        # month's level plus the historical hour-of-day shape for that month.
+        last_month = int(series.rollups["month"]["bucket"][-1])
+        # Checked before building the hour keys, which could span centuries.
+        end_month = int(month_keys(np.array([to_epoch(end_dt) // HOUR - 1]))[0])
+        if end_month - last_month > MAX_FORECAST_MONTHS:
+            raise ValueError(f"Forecast windows must end within {MAX_FORECAST_MONTHS} months of the last month with data")
+        keys = hour_keys(to_epoch(start_dt), to_epoch(end_dt))
+        if not len(keys):
+            raise ValueError("No data available for the given range")
+        months = month_keys(keys)
+        if months[0] <= last_month:
+            raise ValueError("Forecast windows must start after the last month with data")
+        # The same model that serves /predict_advanced_least_carbon/.
+        model = model_trainer.get(series, *model_configs.orders(ts_id))
+        levels = np.asarray(model.results.get_forecast(steps=int(months[-1]) - last_month).predicted_mean)
+        values = levels[months - last_month - 1] + hourly_profile(hourly)[months % 12, keys % 24]
+        result["model_version"] = model.version
+        result["model_age_seconds"] = round(model.age, 3)
+    else:
+        raise ValueError(f"Unknown source: {source}. Use historical or forecast.")
+
+    starts, averages = window_averages(keys, values, hours)
+    windows = select_windows(keys, starts, averages, hours, k)
+    if not windows:
+        raise ValueError("No complete window of the requested length in the given range")
+    result["windows"] = [
+        {"start": format_epoch(key * HOUR), "end": format_epoch((key + hours) * HOUR), "average": average}
+        for key, average in windows
+    ]
+    return result
@@ -0,0 +1,58 @@
+import fcntl
+import os
+import shutil
+from typing import Callable, Dict
+
+import numpy as np
+
+from app.metrics import cache_lookup
+
+
+class SharedSeriesCache:
+    # Each series version is materialized once, by whichever worker gets the
+    # lock first, into a directory of .npy files that every worker maps
+    # read-only. The page cache then holds a single copy of the columns and
+    # index arrays however many uvicorn workers are running.
+    def __init__(self, root: str):
+        self.root = root
+
+    def path(self, ts_id: str, version: str) -> str:
+        return os.path.join(self.root, f"{ts_id}@{version}")
+
+    def load(self, ts_id: str, version: str, build: Callable[[], Dict[str, np.ndarray]]) -> Dict[str, np.ndarray]:
+        path = self.path(ts_id, version)
+        cache_lookup("shared_series", os.path.isdir(path))
+        if not os.path.isdir(path):
+            os.makedirs(self.root, exist_ok=True)
+            with open(os.path.join(self.root, f"{ts_id}.lock"), 'w') as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                try:
+                    if not os.path.isdir(path):
+                        self._write(path, build())
+                        self._prune(ts_id, keep=path)
+                finally:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+        return self._map(path)
+
+    def _write(self, path: str, arrays: Dict[str, np.ndarray]) -> None:
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        for name, array in arrays.items():
+            np.save(os.path.join(tmp_path, f"{name}.npy"), np.ascontiguousarray(array))
+        os.replace(tmp_path, path)
+
+    def _map(self, path: str) -> Dict[str, np.ndarray]:
+        return {
+            name[:-len(".npy")]: np.load(os.path.join(path, name), mmap_mode='r')
+            for name in os.listdir(path) if name.endswith(".npy")
+        }
+
+    def _prune(self, ts_id: str, keep: str) -> None:
+        # Workers still mapping an old version keep their pages; unlinking
+        # only drops the directory entry.
+        prefix = f"{ts_id}@"
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if name.startswith(prefix) and path != keep and os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
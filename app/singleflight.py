@@ -0,0 +1,62 @@
+import asyncio
+import threading
+import weakref
+from concurrent.futures import Future
+from typing import Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    # Concurrent calls with the same key run `fn` once; the other callers
+    # block on the leader's future and get its result or its exception.
+    def __init__(self):
+        self._calls: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable, *args):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = Future()
+        if not leader:
+            return call.result()
+
+        try:
+            result = fn(*args)
+        except BaseException as e:
+            call.set_exception(e)
+            raise
+        else:
+            call.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+
+class AsyncSingleFlight:
+    # The event-loop counterpart: identical requests await one task. The
+    # task is shielded, so a client that disconnects does not cancel the
+    # computation for everyone else waiting on it.
+    def __init__(self):
+        self._calls: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Hashable, asyncio.Future]]" = \
+            weakref.WeakKeyDictionary()
+
+    async def do(self, key: Hashable, compute: Callable[[], Awaitable]):
+        calls = self._calls.setdefault(asyncio.get_running_loop(), {})
+        task = calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(compute())
+            calls[key] = task
+
+            def forget(done: asyncio.Future):
+                if calls.get(key) is done:
+                    del calls[key]
+                if not done.cancelled():
+                    done.exception()
+
+            task.add_done_callback(forget)
+        return await asyncio.shield(task)
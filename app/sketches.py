@@ -0,0 +1,132 @@
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.indexes import GrowableArray
+
+# Every SKETCH_BLOCK points are summarized by SKETCH_POINTS evenly spaced
+# quantiles. Each coarser level covers SKETCH_FANOUT times as many
+# points and is summarized from the raw values, so errors never compound.
+SKETCH_BLOCK = 4096
+SKETCH_POINTS = 256
+SKETCH_FANOUT = 32
+# Blocks are sorted this many points at a time while building.
+SKETCH_BUILD_CHUNK = 1 << 22
+HISTOGRAM_MAX_BINS = 1000
+
+
+def block_size(level: int) -> int:
+    return SKETCH_BLOCK * SKETCH_FANOUT ** level
+
+
+def summarize(values: np.ndarray, size: int) -> np.ndarray:
+    # One row of SKETCH_POINTS quantiles per full block of `size`, taken at
+    # the centre rank of each equal-weight slice and interpolated the way
+    # np.percentile does.
+    ranks = (np.arange(SKETCH_POINTS) + 0.5) * size / SKETCH_POINTS - 0.5
+    below = np.floor(ranks).astype(np.int64)
+    fraction = ranks - below
+    blocks = max(1, SKETCH_BUILD_CHUNK // size)
+    rows = []
+    for start in range(0, len(values), blocks * size):
+        ordered = np.sort(values[start:start + blocks * size].reshape(-1, size), axis=1)
+        rows.append(ordered[:, below] + fraction * (ordered[:, below + 1] - ordered[:, below]))
+    return np.concatenate(rows) if rows else np.empty((0, SKETCH_POINTS))
+
+
+class QuantileSketches:
+    # Mergeable quantile summaries over the sorted series. A block summary
+    # stands in for its block with SKETCH_POINTS values of equal weight, which
+    # puts any rank within block / (2 * SKETCH_POINTS) of the truth;
+    # interpolating between neighbouring summary points can add up to half
+    # the heaviest one's weight, so quantiles are within
+    # summarized / (2 * SKETCH_POINTS) + heaviest / 2 points. A window
+    # merges the coarsest full blocks it covers, finer blocks towards its
+    # edges and the partial blocks exactly, so it reads at most a few
+    # thousand points however long it is.
+    def __init__(self, values: np.ndarray):
+        self.values = values
+        self.levels: List[GrowableArray] = []
+        self.update(values, 0)
+
+    @classmethod
+    def from_arrays(cls, values: np.ndarray, arrays: Dict[str, np.ndarray]) -> Optional["QuantileSketches"]:
+        layout = arrays.get("sketch_layout")
+        if layout is None or tuple(layout) != (SKETCH_BLOCK, SKETCH_POINTS, SKETCH_FANOUT):
+            return None
+        sketches = cls.__new__(cls)
+        sketches.values = values
+        sketches.levels = []
+        while f"sketch_{len(sketches.levels)}" in arrays:
+            sketches.levels.append(GrowableArray.wrap(arrays[f"sketch_{len(sketches.levels)}"]))
+        return sketches
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        arrays = {"sketch_layout": np.array([SKETCH_BLOCK, SKETCH_POINTS, SKETCH_FANOUT])}
+        for level, summaries in enumerate(self.levels):
+            arrays[f"sketch_{level}"] = summaries.view
+        return arrays
+
+    def fork(self) -> "QuantileSketches":
+        forked = QuantileSketches.__new__(QuantileSketches)
+        forked.values = self.values
+        forked.levels = [summaries.fork() for summaries in self.levels]
+        return forked
+
+    def update(self, values: np.ndarray, position: int) -> None:
+        # Blocks before the one holding `position` are unchanged; only full
+        # blocks get a summary, the trailing partial one is read exactly.
+        self.values = values
+        level = 0
+        while True:
+            size = block_size(level)
+            full = len(values) // size
+            if level == len(self.levels):
+                if not full:
+                    return
+                self.levels.append(GrowableArray(np.float64))
+            summaries = self.levels[level]
+            first = min(position // size, len(summaries) // SKETCH_POINTS)
+            summaries.truncate(first * SKETCH_POINTS)
+            if full > first:
+                summaries.extend(summarize(values[first * size:full * size], size).ravel())
+            level += 1
+
+    def _collect(self, lo: int, hi: int, level: int, parts: list) -> None:
+        while level >= 0:
+            size = block_size(level)
+            lo_block, hi_block = -(-lo // size), hi // size
+            if lo_block < hi_block:
+                summaries = self.levels[level].view[lo_block * SKETCH_POINTS:hi_block * SKETCH_POINTS]
+                parts.append((summaries, size / SKETCH_POINTS))
+                self._collect(lo, lo_block * size, level - 1, parts)
+                self._collect(hi_block * size, hi, level - 1, parts)
+                return
+            level -= 1
+        if lo < hi:
+            parts.append((self.values[lo:hi], 1.0))
+
+    def merge(self, lo: int, hi: int) -> Tuple[np.ndarray, np.ndarray, float]:
+        # Sorted points and weights standing for values[lo:hi], plus the
+        # worst-case rank error in points (0 when the window was read exactly).
+        parts = []
+        self._collect(lo, hi, len(self.levels) - 1, parts)
+        points = np.concatenate([np.asarray(values, dtype=np.float64) for values, _ in parts])
+        weights = np.concatenate([np.full(len(values), weight) for values, weight in parts])
+        summarized = sum(len(values) * weight for values, weight in parts if weight > 1)
+        heaviest = max((weight for _, weight in parts if weight > 1), default=0.0)
+        order = np.argsort(points, kind="stable")
+        return points[order], weights[order], summarized / (2 * SKETCH_POINTS) + heaviest / 2
+
+    def quantiles(self, lo: int, hi: int, q: np.ndarray) -> Tuple[np.ndarray, float]:
+        # Linear interpolation between rank centres, which matches
+        # np.percentile exactly when no summary is involved.
+        points, weights, rank_error = self.merge(lo, hi)
+        centres = np.cumsum(weights) - weights / 2
+        targets = np.asarray(q, dtype=np.float64) / 100 * (hi - lo - 1) + 0.5
+        return np.interp(targets, centres, points), rank_error
+
+    def histogram(self, lo: int, hi: int, bins: int, low: float, high: float) -> Tuple[np.ndarray, np.ndarray, float]:
+        points, weights, rank_error = self.merge(lo, hi)
+        counts, edges = np.histogram(points, bins=bins, range=(low, high), weights=weights)
+        return np.rint(counts).astype(np.int64), edges, rank_error
@@ -0,0 +1,229 @@
+import argparse
+import json
+import math
+import os
+import shutil
+from datetime import datetime, timezone
+from itertools import islice
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from app.indexes import GrowableArray
+
+NDJSON_CHUNK_SIZE = 65536
+
+
+def load_data(file_path: str) -> list:
+    file_path = file_path+".json"
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"File not found: {file_path}")
+
+    with open(file_path, 'r') as f:
+        try:
+            data = json.load(f)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Error decoding JSON: {e}")
+
+    records = data.get('data', [])
+
+    if not isinstance(records, list):
+        raise ValueError("Invalid format: 'data' must be a list")
+
+    for record in records:
+        if not isinstance(record, dict):
+            raise ValueError(f"Invalid record format: Each record must be a dictionary, found {type(record)}")
+        if 'datetime' not in record or 'carbon_intensity' not in record:
+            raise ValueError("Invalid record format: Each record must contain 'datetime' and 'carbon_intensity' keys")
+
+    return records
+
+
+def parse_datetime(value: str) -> datetime:
+    dt = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt
+
+
+def to_epoch(dt: datetime) -> int:
+    # Stored timestamps are whole seconds, so rounding a bound up keeps
+    # `start <= t` and `t < end` exact for any sub-second query bound.
+    return math.ceil(dt.timestamp())
+
+
+def from_epoch(ts: int) -> datetime:
+    return datetime.fromtimestamp(int(ts), tz=timezone.utc)
+
+
+def format_epoch(ts: int) -> str:
+    return from_epoch(ts).strftime('%Y-%m-%dT%H:%M:%S.000Z')
+
+
+def parse_timestamps(values: List[str]) -> np.ndarray:
+    if all(isinstance(v, str) and v.endswith('Z') for v in values):
+        try:
+            stamps = np.array([v[:-1] for v in values], dtype='datetime64[ms]')
+            return stamps.astype('datetime64[s]').astype(np.int64)
+        except ValueError:
+            pass
+    return np.array([to_epoch(parse_datetime(v)) for v in values], dtype=np.int64)
+
+
+def records_to_columns(records: list) -> Tuple[np.ndarray, np.ndarray]:
+    # Mirrors the old predictor, which skipped non-numeric intensities.
+    records = [
+        r for r in records
+        if isinstance(r['carbon_intensity'], (int, float)) and not isinstance(r['carbon_intensity'], bool)
+    ]
+    timestamps = parse_timestamps([r['datetime'] for r in records])
+    values = np.array([r['carbon_intensity'] for r in records], dtype=np.float64)
+    return sort_columns(timestamps, values)
+
+
+def sort_columns(timestamps: np.ndarray, values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    if len(timestamps) > 1 and np.any(timestamps[1:] < timestamps[:-1]):
+        order = np.argsort(timestamps, kind='stable')
+        timestamps = timestamps[order]
+        values = values[order]
+    return timestamps, values
+
+
+def _json_value(value: float):
+    return int(value) if float(value).is_integer() else float(value)
+
+
+class JsonFormat:
+    name = "json"
+    suffix = ".json"
+
+    def signature(self, path: str) -> Tuple[int, int]:
+        st = os.stat(path)
+        return st.st_mtime_ns, st.st_size
+
+    def read(self, path: str) -> Tuple[np.ndarray, np.ndarray]:
+        return records_to_columns(load_data(path[:-len(self.suffix)]))
+
+    def write(self, path: str, timestamps: np.ndarray, values: np.ndarray, schema: Optional[dict] = None) -> None:
+        records = [
+            {"datetime": format_epoch(ts), "carbon_intensity": _json_value(value)}
+            for ts, value in zip(timestamps.tolist(), values.tolist())
+        ]
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({"schema": schema or {}, "data": records}, f, indent=2)
+        os.replace(tmp_path, path)
+
+
+class NdjsonFormat:
+    name = "ndjson"
+    suffix = ".ndjson"
+
+    def signature(self, path: str) -> Tuple[int, int]:
+        st = os.stat(path)
+        return st.st_mtime_ns, st.st_size
+
+    def read(self, path: str) -> Tuple[np.ndarray, np.ndarray]:
+        timestamps = GrowableArray(np.int64)
+        values = GrowableArray(np.float64)
+        with open(path, 'r') as f:
+            # Only one chunk of decoded records is alive at a time.
+            while True:
+                lines = list(islice(f, NDJSON_CHUNK_SIZE))
+                if not lines:
+                    break
+                try:
+                    records = [json.loads(line) for line in lines if line.strip()]
+                except json.JSONDecodeError as e:
+                    raise ValueError(f"Error decoding JSON: {e}")
+                for record in records:
+                    if not isinstance(record, dict) or 'datetime' not in record or 'carbon_intensity' not in record:
+                        raise ValueError("Invalid record format: Each record must contain 'datetime' and 'carbon_intensity' keys")
+                chunk_timestamps, chunk_values = records_to_columns(records)
+                timestamps.extend(chunk_timestamps)
+                values.extend(chunk_values)
+        return sort_columns(timestamps.view, values.view)
+
+    def write(self, path: str, timestamps: np.ndarray, values: np.ndarray, schema: Optional[dict] = None) -> None:
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            for ts, value in zip(timestamps.tolist(), values.tolist()):
+                f.write(json.dumps({"datetime": format_epoch(ts), "carbon_intensity": _json_value(value)}))
+                f.write("\n")
+        os.replace(tmp_path, path)
+
+
+class ColumnarFormat:
+    # A directory of fixed-width .npy columns, opened as read-only memory maps
+    # so pages are only faulted in when a query touches them.
+    name = "columnar"
+    suffix = ".columns"
+    columns = ("timestamps.npy", "values.npy")
+
+    def signature(self, path: str) -> Tuple[int, int]:
+        stats = [os.stat(os.path.join(path, column)) for column in self.columns]
+        return max(st.st_mtime_ns for st in stats), sum(st.st_size for st in stats)
+
+    def read(self, path: str) -> Tuple[np.ndarray, np.ndarray]:
+        timestamps = np.load(os.path.join(path, "timestamps.npy"), mmap_mode='r')
+        values = np.load(os.path.join(path, "values.npy"), mmap_mode='r')
+        if timestamps.dtype != np.int64 or values.dtype != np.float64 or len(timestamps) != len(values):
+            raise ValueError(f"Invalid columnar series: {path}")
+        return timestamps, values
+
+    def write(self, path: str, timestamps: np.ndarray, values: np.ndarray, schema: Optional[dict] = None) -> None:
+        tmp_path = path + ".tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        np.save(os.path.join(tmp_path, "timestamps.npy"), np.ascontiguousarray(timestamps, dtype=np.int64))
+        np.save(os.path.join(tmp_path, "values.npy"), np.ascontiguousarray(values, dtype=np.float64))
+        with open(os.path.join(tmp_path, "schema.json"), 'w') as f:
+            json.dump(schema or {}, f)
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp_path, path)
+
+
+# Lookup order when several encodings of one ts_id exist.
+FORMATS = {fmt.name: fmt for fmt in (ColumnarFormat(), NdjsonFormat(), JsonFormat())}
+
+
+def find_source(data_dir: str, ts_id: str):
+    for fmt in FORMATS.values():
+        path = os.path.join(data_dir, ts_id + fmt.suffix)
+        if os.path.exists(path):
+            return fmt, path
+    raise FileNotFoundError(f"File not found: {os.path.join(data_dir, ts_id)}.json")
+
+
+def read_schema(data_dir: str, ts_id: str) -> dict:
+    fmt, path = find_source(data_dir, ts_id)
+    if fmt.name == "json":
+        with open(path, 'r') as f:
+            return json.load(f).get("schema", {})
+    if fmt.name == "columnar":
+        with open(os.path.join(path, "schema.json"), 'r') as f:
+            return json.load(f)
+    return {}
+
+
+def convert(data_dir: str, ts_id: str, target: str) -> str:
+    if target not in FORMATS:
+        raise ValueError(f"Unknown format: {target}. Use any of {', '.join(FORMATS)}.")
+    fmt, path = find_source(data_dir, ts_id)
+    timestamps, values = fmt.read(path)
+    schema = read_schema(data_dir, ts_id)
+    target_fmt = FORMATS[target]
+    target_path = os.path.join(data_dir, ts_id + target_fmt.suffix)
+    target_fmt.write(target_path, timestamps, values, schema)
+    return target_path
+
+
+if __name__ == "__main__":
+    DATA_DIR = os.getenv("DATA_DIR", "data")
+
+    parser = argparse.ArgumentParser(description="Convert a series to another storage format.")
+    parser.add_argument("ts_id")
+    parser.add_argument("--to", dest="target", default="columnar", choices=list(FORMATS))
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    args = parser.parse_args()
+    print(convert(args.data_dir, args.ts_id, args.target))
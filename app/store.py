@@ -0,0 +1,330 @@
+import copy
+import logging
+import os
+import re
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.indexes import AggregateIndex, GrowableArray
+from app.metrics import cache_lookup, metrics, span
+from app.rollups import Rollups
+from app.sketches import QuantileSketches
+from app.segments import COMPACT_BYTES, COMPACT_DELAY, SegmentLog
+from app.shared import SharedSeriesCache
+from app.singleflight import SingleFlight
+from app.storage import (
+    FORMATS, find_source, format_epoch, from_epoch, load_data, parse_datetime, parse_timestamps,
+    read_schema, records_to_columns, sort_columns, to_epoch,
+)
+
+DATA_DIR = os.getenv("DATA_DIR", "data")
+TS_ID_RE = re.compile(r"^[A-Za-z0-9_-][A-Za-z0-9_.-]*$")
+
+COMPACTION_FAILURES = metrics.counter(
+    "prediction_compaction_failures_total", "Background segment compactions that failed.", ("ts_id",))
+logger = logging.getLogger(__name__)
+
+
+class Series:
+    def __init__(self, ts_id: str, timestamps: np.ndarray, values: np.ndarray, version: str,
+                 index: Optional[AggregateIndex] = None, rollups: Optional[Rollups] = None,
+                 sketches: Optional[QuantileSketches] = None):
+        self.ts_id = ts_id
+        self._timestamps = GrowableArray.wrap(timestamps)
+        self._values = GrowableArray.wrap(values)
+        self.timestamps = timestamps
+        self.values = values
+        self.version = version
+        self.index = index if index is not None else AggregateIndex(values)
+        self.rollups = rollups if rollups is not None else Rollups(timestamps, values)
+        self.sketches = sketches if sketches is not None else QuantileSketches(values)
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def range_indices(self, start: int, end: int) -> Tuple[int, int]:
+        lo = int(np.searchsorted(self.timestamps, start, side='left'))
+        hi = int(np.searchsorted(self.timestamps, end, side='left'))
+        return lo, max(lo, hi)
+
+    def slice(self, start: int, end: int) -> Tuple[np.ndarray, np.ndarray]:
+        lo, hi = self.range_indices(start, end)
+        return self.timestamps[lo:hi], self.values[lo:hi]
+
+    def fork(self) -> "Series":
+        # The next version of the series, sharing buffers with this one until
+        # it needs to change something this one's readers can see.
+        forked = copy.copy(self)
+        forked._timestamps = self._timestamps.fork()
+        forked._values = self._values.fork()
+        forked.index = self.index.fork()
+        forked.rollups = self.rollups.fork()
+        forked.sketches = self.sketches.fork()
+        return forked
+
+    def append(self, timestamps: np.ndarray, values: np.ndarray) -> int:
+        # Points replace any existing point with the same timestamp; within
+        # the batch the last one wins. In-order batches extend the columns in
+        # place, so views held by running queries stay valid and the indexes
+        # only process the new tail. Late points re-sort the tail from the
+        # earliest of them onwards. Returns the first changed position.
+        timestamps, values = sort_columns(np.asarray(timestamps, dtype=np.int64), np.asarray(values, dtype=np.float64))
+        if not len(timestamps):
+            return len(self)
+        last = np.append(timestamps[1:] != timestamps[:-1], True)
+        timestamps, values = timestamps[last], values[last]
+
+        if not len(self) or timestamps[0] > self.timestamps[-1]:
+            position = len(self)
+            self._timestamps.extend(timestamps)
+            self._values.extend(values)
+        else:
+            position = int(np.searchsorted(self.timestamps, timestamps[0], side='left'))
+            tail_timestamps = self.timestamps[position:]
+            keep = ~np.isin(tail_timestamps, timestamps)
+            merged_timestamps, merged_values = sort_columns(
+                np.concatenate((tail_timestamps[keep], timestamps)),
+                np.concatenate((self.values[position:][keep], values)),
+            )
+            rebuilt_timestamps = GrowableArray(np.int64, position + len(merged_timestamps))
+            rebuilt_values = GrowableArray(np.float64, position + len(merged_values))
+            rebuilt_timestamps.extend(self.timestamps[:position])
+            rebuilt_timestamps.extend(merged_timestamps)
+            rebuilt_values.extend(self.values[:position])
+            rebuilt_values.extend(merged_values)
+            self._timestamps, self._values = rebuilt_timestamps, rebuilt_values
+
+        self.timestamps = self._timestamps.view
+        self.values = self._values.view
+        self.index.update(self.values, position)
+        self.rollups.update(self.timestamps, self.values, position)
+        self.sketches.update(self.values, position)
+        return position
+
+    @property
+    def first_timestamp(self) -> Optional[int]:
+        return int(self.timestamps[0]) if len(self) else None
+
+    @property
+    def last_timestamp(self) -> Optional[int]:
+        return int(self.timestamps[-1]) if len(self) else None
+
+
+class SeriesRegistry:
+    def __init__(self, data_dir: str = DATA_DIR, shared_dir: Optional[str] = None):
+        self.data_dir = data_dir
+        if shared_dir is None:
+            shared_dir = os.getenv("SHARED_CACHE_DIR", os.path.join(data_dir, ".shared"))
+        self.shared = SharedSeriesCache(shared_dir) if shared_dir else None
+        self.segments = SegmentLog(data_dir)
+        self._series: Dict[str, Tuple[tuple, Series]] = {}
+        self._lock = threading.Lock()
+        self._loads = SingleFlight()
+        self._compacting = set()
+
+    def _signature(self, ts_id: str):
+        if not TS_ID_RE.match(ts_id):
+            raise ValueError(f"Invalid ts_id: {ts_id}")
+        fmt, path = find_source(self.data_dir, ts_id)
+        try:
+            return fmt, path, (fmt.name,) + fmt.signature(path) + (self.segments.signature(ts_id),)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"File not found: {path}")
+
+    @staticmethod
+    def _version(signature: tuple) -> str:
+        version = "{}-{:x}-{:x}".format(*signature[:3])
+        segments = signature[3]
+        if segments:
+            version += "+{:x}-{:x}".format(len(segments), sum(size for _, size in segments))
+        return version
+
+    def get(self, ts_id: str) -> Series:
+        fmt, path, signature = self._signature(ts_id)
+        cached = self._series.get(ts_id)
+        if cached is not None and cached[0] == signature:
+            cache_lookup("series", True)
+            return cached[1]
+
+        cache_lookup("series", False)
+        # Loads of different series run in parallel; concurrent requests
+        # for the same version share one load.
+        return self._loads.do((ts_id, signature), self._load_latest, ts_id, fmt, path, signature)
+
+    def _load_latest(self, ts_id: str, fmt, path: str, signature: tuple) -> Series:
+        previous = self._series.get(ts_id)
+        if previous is not None and previous[0] == signature:
+            return previous[1]
+        with span("series_load"):
+            series = self._load(ts_id, fmt, path, signature)
+        with self._lock:
+            # An append may have advanced the entry while this load ran.
+            if self._series.get(ts_id) is previous:
+                self._series[ts_id] = (signature, series)
+        return series
+
+    def version(self, ts_id: str) -> str:
+        # The version `get` would return, without loading the series.
+        _, _, signature = self._signature(ts_id)
+        cached = self._series.get(ts_id)
+        if cached is not None and cached[0] == signature:
+            return cached[1].version
+        return self._version(signature)
+
+    def _load(self, ts_id: str, fmt, path: str, signature: tuple) -> Series:
+        series = self._load_base(ts_id, fmt, path, "{}-{:x}-{:x}".format(*signature[:3]))
+        names = [name for name, _ in signature[3]]
+        if names:
+            series.append(*self.segments.read(ts_id, names))
+        series.version = self._version(signature)
+        return series
+
+    def _load_base(self, ts_id: str, fmt, path: str, version: str) -> Series:
+        # The shared cache is keyed by the base file alone; appended segments
+        # are replayed on top, so ingest never invalidates it.
+        if self.shared is None:
+            timestamps, values = fmt.read(path)
+            return Series(ts_id, timestamps, values, version)
+
+        def build():
+            timestamps, values = fmt.read(path)
+            arrays = AggregateIndex(values).arrays()
+            arrays.update(Rollups(timestamps, values).arrays())
+            arrays.update(QuantileSketches(values).arrays())
+            if fmt.name != "columnar":
+                arrays.update(timestamps=timestamps, values=values)
+            return arrays
+
+        try:
+            arrays = self.shared.load(ts_id, version, build)
+        except OSError:
+            timestamps, values = fmt.read(path)
+            return Series(ts_id, timestamps, values, version)
+        if fmt.name == "columnar":
+            timestamps, values = fmt.read(path)
+        else:
+            timestamps, values = arrays["timestamps"], arrays["values"]
+        return Series(ts_id, timestamps, values, version,
+                      AggregateIndex.from_arrays(values, arrays), Rollups.from_arrays(arrays),
+                      QuantileSketches.from_arrays(values, arrays))
+
+    def append(self, ts_id: str, timestamps: np.ndarray, values: np.ndarray) -> Series:
+        try:
+            self._signature(ts_id)
+        except FileNotFoundError:
+            FORMATS["ndjson"].write(os.path.join(self.data_dir, ts_id + FORMATS["ndjson"].suffix),
+                                    np.empty(0, dtype=np.int64), np.empty(0))
+        self.get(ts_id)
+
+        with self.segments.locked(ts_id):
+            _, _, before = self._signature(ts_id)
+            self.segments.append(ts_id, timestamps, values)
+            _, _, after = self._signature(ts_id)
+            with self._lock:
+                cached = self._series.get(ts_id)
+                if cached is not None and cached[0] == before:
+                    # Queries keep the published series untouched; the next
+                    # version is built on a fork and swapped in whole.
+                    series = cached[1].fork()
+                    series.append(timestamps, values)
+                    series.version = self._version(after)
+                    self._series[ts_id] = (after, series)
+                else:
+                    # Another worker wrote in between: reload everything.
+                    self._series.pop(ts_id, None)
+        return self.get(ts_id)
+
+    def compact(self, ts_id: str) -> None:
+        # Folds the segments into a rewritten base file, in the same format.
+        with self.segments.locked(ts_id):
+            fmt, path, signature = self._signature(ts_id)
+            names = [name for name, _ in signature[3]]
+            if not names:
+                return
+            with self._lock:
+                cached = self._series.get(ts_id)
+            series = cached[1] if cached is not None and cached[0] == signature else self._load(ts_id, fmt, path, signature)
+            fmt.write(path, series.timestamps, series.values, read_schema(self.data_dir, ts_id))
+            self.segments.remove(ts_id, names)
+            _, _, compacted = self._signature(ts_id)
+            # Replaying segments left this worker with private heap copies of
+            # the columns and indexes; the rewritten file is materialized in
+            # the shared cache and mapped again, as every other worker will.
+            republished = self._load_base(ts_id, fmt, path, "{}-{:x}-{:x}".format(*compacted[:3]))
+            # Same points, so the version (and every cache keyed on it) stays
+            # as it was in this worker.
+            republished.version = series.version
+            with self._lock:
+                cached = self._series.get(ts_id)
+                if cached is not None and cached[1] is series:
+                    self._series[ts_id] = (compacted, republished)
+
+    def schedule_compaction(self, ts_id: str, min_bytes: int = COMPACT_BYTES, delay: float = COMPACT_DELAY) -> bool:
+        # Segments of at least `min_bytes` are compacted right away, smaller
+        # ones after `delay` seconds, so workers share one mapped copy of the
+        # series again soon after ingest goes quiet. Batches arriving in the
+        # meantime are folded into the same compaction.
+        total = self.segments.total_bytes(ts_id)
+        if not total:
+            return False
+        with self._lock:
+            if ts_id in self._compacting:
+                return False
+            self._compacting.add(ts_id)
+
+        def run():
+            compacted = False
+            try:
+                if total < min_bytes:
+                    time.sleep(delay)
+                self.compact(ts_id)
+                compacted = True
+            except Exception:
+                COMPACTION_FAILURES.inc(ts_id=ts_id)
+                logger.exception("Compaction of %s failed", ts_id)
+            finally:
+                with self._lock:
+                    self._compacting.discard(ts_id)
+            if compacted:
+                # Batches written while the compaction ran.
+                self.schedule_compaction(ts_id, min_bytes, delay)
+
+        threading.Thread(target=run, name=f"compact-{ts_id}", daemon=True).start()
+        return True
+
+    def series_ids(self) -> List[str]:
+        ids = set()
+        for name in os.listdir(self.data_dir):
+            for fmt in FORMATS.values():
+                if name.endswith(fmt.suffix) and TS_ID_RE.match(name[:-len(fmt.suffix)]):
+                    ids.add(name[:-len(fmt.suffix)])
+        return sorted(ids)
+
+    def is_loaded(self, ts_id: str) -> bool:
+        # True only when `get` would return the cached series without
+        # reloading, e.g. not after another worker has ingested.
+        cached = self._series.get(ts_id)
+        if cached is None:
+            return False
+        try:
+            _, _, signature = self._signature(ts_id)
+        except (OSError, ValueError):
+            return False
+        return cached[0] == signature
+
+    def invalidate(self, ts_id: Optional[str] = None) -> None:
+        with self._lock:
+            if ts_id is None:
+                self._series.clear()
+            else:
+                self._series.pop(ts_id, None)
+
+
+registry = SeriesRegistry()
+
+
+def get_series(ts_id: str) -> Series:
+    return registry.get(ts_id)
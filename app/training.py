@@ -0,0 +1,191 @@
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+
+import numpy as np
+
+from app.forecasting import (
+    SARIMA_ORDER, SARIMA_SEASONAL_ORDER, ModelCache, aggregate_monthly, build_sarima,
+    fit_sarima_model, model_cache, model_key,
+)
+from app.executors import PROCESS_CONTEXT
+from app.metrics import metrics, observe_since
+from app.singleflight import SingleFlight
+from app.store import Series
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+TRAINING_WORKERS = int(os.getenv("TRAINING_WORKERS", "1"))
+
+
+def _fit_params(monthly_data: "pd.DataFrame", order: Tuple[int, ...], seasonal_order: Tuple[int, ...],
+                start_params: Optional[np.ndarray]) -> np.ndarray:
+    # Runs in a pool process; only the small monthly frame and the parameter
+    # vector cross the process boundary.
+    results = fit_sarima_model(monthly_data, order, seasonal_order, start_params)
+    return np.asarray(results.params)
+
+
+class TrainedModel:
+    def __init__(self, results, version: str, fitted_at: float, sequence: int = 0):
+        self.results = results
+        self.version = version
+        self.fitted_at = fitted_at
+        self.sequence = sequence
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.fitted_at
+
+
+class ModelTrainer:
+    # Serves the newest fitted model per (ts_id, orders). When the series
+    # version moves on, the previous model keeps answering while a refit,
+    # warm-started from its parameters, runs in a process pool; the new
+    # model replaces it in one assignment when the fit completes.
+    def __init__(self, cache: ModelCache = model_cache, max_workers: int = TRAINING_WORKERS):
+        self.cache = cache
+        self.max_workers = max_workers
+        self._executor = None
+        self._running: Dict[tuple, Tuple[tuple, Future]] = {}
+        self._wanted: Dict[tuple, Tuple[Series, Future]] = {}
+        self._latest: Dict[tuple, TrainedModel] = {}
+        self._sequence = 0
+        self._lock = threading.Lock()
+        self._restores = SingleFlight()
+
+    def _next_sequence(self) -> int:
+        with self._lock:
+            self._sequence += 1
+            return self._sequence
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=PROCESS_CONTEXT)
+        return self._executor
+
+    def get(self, series: Series, order: Tuple[int, ...] = SARIMA_ORDER,
+            seasonal_order: Tuple[int, ...] = SARIMA_SEASONAL_ORDER) -> TrainedModel:
+        family = (series.ts_id, tuple(order), tuple(seasonal_order))
+        current = self._latest.get(family)
+        if current is not None and current.version == series.version:
+            return current
+
+        results = self._restores.do(model_key(series, order, seasonal_order), self.cache.restore,
+                                    series, order, seasonal_order)
+        if results is not None:
+            model = TrainedModel(results, series.version, time.time(), self._next_sequence())
+            self._publish(family, model)
+            return model
+
+        pending = self.schedule(series, order, seasonal_order)
+        if current is not None:
+            return current
+        return pending.result()
+
+    def schedule(self, series: Series, order: Tuple[int, ...] = SARIMA_ORDER,
+                 seasonal_order: Tuple[int, ...] = SARIMA_SEASONAL_ORDER) -> Future:
+        # At most one fit per family runs at a time. Versions that arrive
+        # meanwhile share a single queued slot holding the newest one, so a
+        # steady ingest stream costs one refit after the running one instead
+        # of one per version; their futures resolve with that newer model.
+        key = model_key(series, order, seasonal_order)
+        family = key[:1] + key[2:]
+        with self._lock:
+            running = self._running.get(family)
+            if running is not None:
+                if running[0] == key:
+                    return running[1]
+                wanted = self._wanted.get(family)
+                outcome = wanted[1] if wanted is not None else Future()
+                self._wanted[family] = (series, outcome)
+                return outcome
+            outcome = Future()
+            self._running[family] = (key, outcome)
+        self._start(series, key, family, outcome)
+        return outcome
+
+    def _start(self, series: Series, key: tuple, family: tuple, outcome: Future) -> None:
+        _, order, seasonal_order = family
+        with self._lock:
+            current = self._latest.get(family)
+            self._sequence += 1
+            sequence = self._sequence
+        if current is not None:
+            start_params = np.asarray(current.results.params)
+        else:
+            start_params = self.cache.latest_params(series.ts_id, order, seasonal_order)
+
+        def finish(fit: Future):
+            observe_since("model_fit", submitted)
+            try:
+                params = fit.result()
+                results = build_sarima(monthly_data, order, seasonal_order).filter(params)
+                self.cache.save_params(key, params)
+                self.cache.store(key, results)
+                model = TrainedModel(results, series.version, time.time(), sequence)
+                self._publish(family, model)
+                outcome.set_result(model)
+            except Exception as e:
+                outcome.set_exception(e)
+            finally:
+                self._advance(family)
+
+        submitted = time.perf_counter()
+        try:
+            monthly_data = aggregate_monthly(series)
+            fit = self._pool().submit(_fit_params, monthly_data, order, seasonal_order, start_params)
+        except Exception as e:
+            outcome.set_exception(e)
+            self._advance(family)
+            return
+        fit.add_done_callback(finish)
+
+    def _advance(self, family: tuple) -> None:
+        # The running fit is done; start the queued one, if any.
+        _, order, seasonal_order = family
+        with self._lock:
+            self._running.pop(family, None)
+            wanted = self._wanted.pop(family, None)
+            if wanted is None:
+                return
+            series, outcome = wanted
+            key = model_key(series, order, seasonal_order)
+            self._running[family] = (key, outcome)
+        self._start(series, key, family, outcome)
+
+    def refresh(self, series: Series) -> None:
+        # Starts background refits for every model already served for this
+        # series, e.g. right after new points are ingested.
+        families = [family for family in list(self._latest) if family[0] == series.ts_id]
+        for _, order, seasonal_order in families:
+            self.schedule(series, order, seasonal_order)
+
+    def _publish(self, family: tuple, model: TrainedModel) -> None:
+        with self._lock:
+            current = self._latest.get(family)
+            # A slower refit of an older version must not replace a newer one.
+            if current is None or current.sequence < model.sequence:
+                self._latest[family] = model
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._running) + len(self._wanted)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._latest.clear()
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+model_trainer = ModelTrainer()
+
+metrics.gauge("prediction_model_fits_pending", "SARIMA refits queued or running in the training pool.", (),
+              lambda: {(): model_trainer.pending()})
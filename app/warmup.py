@@ -0,0 +1,80 @@
+import importlib
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+from app.forecasting import MODELING_MODULES
+from app.metrics import span
+from app.store import SeriesRegistry, registry
+
+# Comma-separated ts_ids to load and index at startup, or "*" for every
+# series in the data directory.
+PRELOAD_SERIES = os.getenv("PRELOAD_SERIES", "")
+PRELOAD_MODELING = os.getenv("PRELOAD_MODELING", "1") == "1"
+
+
+class Warmup:
+    # Runs on a daemon thread after startup. The replica reports ready once
+    # the configured series are loaded (mapped from the shared cache when
+    # another worker already built it); the modeling stack is imported
+    # afterwards so it never delays readiness.
+    def __init__(self, series: str = PRELOAD_SERIES, modeling: bool = PRELOAD_MODELING,
+                 series_registry: SeriesRegistry = registry):
+        self.series = series
+        self.modeling = modeling
+        self.registry = series_registry
+        self.loaded: List[str] = []
+        self.errors: Dict[str, str] = {}
+        self.modeling_loaded = False
+        self.started_at: Optional[float] = None
+        self.ready_at: Optional[float] = None
+        self._ready = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def series_ids(self) -> List[str]:
+        if self.series.strip() == "*":
+            return self.registry.series_ids()
+        return [ts_id.strip() for ts_id in self.series.split(",") if ts_id.strip()]
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self.started_at = time.time()
+        self._thread = threading.Thread(target=self.run, name="warmup", daemon=True)
+        self._thread.start()
+
+    def run(self) -> None:
+        for ts_id in self.series_ids():
+            try:
+                with span("preload"):
+                    self.registry.get(ts_id)
+                self.loaded.append(ts_id)
+            except Exception as e:
+                self.errors[ts_id] = str(e)
+        self.ready_at = time.time()
+        self._ready.set()
+
+        if self.modeling:
+            with span("preload_modeling"):
+                for module in MODELING_MODULES:
+                    importlib.import_module(module)
+            self.modeling_loaded = True
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._ready.wait(timeout)
+
+    def status(self) -> dict:
+        status = {"ready": self.ready, "series": self.loaded, "modeling_loaded": self.modeling_loaded}
+        if self.errors:
+            status["errors"] = self.errors
+        if self.ready_at is not None and self.started_at is not None:
+            status["warmup_seconds"] = round(self.ready_at - self.started_at, 3)
+        return status
+
+
+warmup = Warmup()
@@ -0,0 +1,51 @@
+import argparse
+import json
+import sys
+
+METRICS = ("p50_ms", "p95_ms", "p99_ms", "throughput_per_s")
+
+
+def load(path: str) -> dict:
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def compare(baseline: dict, candidate: dict, threshold: float) -> list:
+    # Rows of (name, kind, metric, old, new, ratio, regressed). Latencies
+    # regress when they grow past the threshold, throughput when it shrinks.
+    previous = {(result["name"], result["kind"]): result for result in baseline["results"]}
+    rows = []
+    for result in candidate["results"]:
+        old = previous.get((result["name"], result["kind"]))
+        if old is None:
+            continue
+        for metric in METRICS:
+            if not old.get(metric) or result.get(metric) is None:
+                continue
+            ratio = result[metric] / old[metric]
+            if metric == "throughput_per_s":
+                regressed = ratio < 1 / threshold
+            else:
+                regressed = ratio > threshold
+            rows.append((result["name"], result["kind"], metric, old[metric], result[metric], ratio, regressed))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare two benchmark reports.")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=1.2, help="ratio that counts as a regression")
+    args = parser.parse_args(argv)
+
+    baseline, candidate = load(args.baseline), load(args.candidate)
+    rows = compare(baseline, candidate, args.threshold)
+    print(f"{baseline.get('commit')} -> {candidate.get('commit')}")
+    for name, kind, metric, old, new, ratio, regressed in rows:
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{name:<40} {kind:<5} {metric:<17} {old:>12.3f} {new:>12.3f} {ratio:>7.2f}x{flag}")
+    return 1 if any(row[-1] for row in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,240 @@
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+import numpy as np
+
+TS_ID = "bench"
+SERVICE_FUNCTIONS = ("get_max", "get_min", "get_avg", "get_var", "get_predict_least_carbon",
+                     "get_predict_advanced_least_carbon")
+HTTP_ENDPOINTS = ("/max/", "/min/", "/average/", "/variance/", "/predict_least_carbon/",
+                  "/predict_advanced_least_carbon/")
+
+
+def generate_series(points: int, years: float, seed: int):
+    # Daily and yearly cycles plus noise, spread evenly over `years` so even
+    # small series cover enough months for the seasonal SARIMA model.
+    rng = np.random.default_rng(seed)
+    start = 1546300800  # 2019-01-01
+    step = max(1, int(years * 365.25 * 86400 / points))
+    timestamps = start + step * np.arange(points, dtype=np.int64)
+    day = 2 * np.pi * (timestamps % 86400) / 86400
+    year = 2 * np.pi * (timestamps % 31557600) / 31557600
+    values = 250 + 80 * np.sin(day) + 60 * np.cos(year) + rng.normal(0, 25, points)
+    return timestamps, np.round(np.maximum(values, 1.0))
+
+
+def random_windows(timestamps: np.ndarray, count: int, seed: int) -> List[tuple]:
+    from app.store import format_epoch
+
+    rng = np.random.default_rng(seed)
+    first, last = int(timestamps[0]), int(timestamps[-1])
+    starts = rng.integers(first, last, count)
+    ends = np.minimum(starts + rng.integers(86400, 366 * 86400, count), last)
+    return [(format_epoch(int(start)), format_epoch(int(end))) for start, end in zip(starts, ends)]
+
+
+def summarize(name: str, kind: str, latencies: List[float], elapsed: float, errors: int = 0) -> dict:
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "name": name,
+        "kind": kind,
+        "count": len(latencies),
+        "errors": errors,
+        "throughput_per_s": len(latencies) / elapsed if elapsed > 0 else None,
+        "mean_ms": float(latencies_ms.mean()),
+        "p50_ms": float(np.percentile(latencies_ms, 50)),
+        "p95_ms": float(np.percentile(latencies_ms, 95)),
+        "p99_ms": float(np.percentile(latencies_ms, 99)),
+    }
+
+
+def reset_caches(dirs: Dict[str, str]) -> None:
+    from app.cache import response_cache
+    from app.forecasting import model_cache
+    from app.store import registry
+    from app.training import model_trainer
+
+    registry.invalidate()
+    response_cache.clear()
+    model_cache.clear()
+    model_trainer.clear()
+    for key in ("shared", "models"):
+        shutil.rmtree(dirs[key], ignore_errors=True)
+
+
+def service_calls(windows: List[tuple]) -> Dict[str, Callable[[int], object]]:
+    from app import services
+
+    def stat(fn):
+        return lambda i: fn(TS_ID, *windows[i % len(windows)])
+
+    return {
+        "get_max": stat(services.get_max),
+        "get_min": stat(services.get_min),
+        "get_avg": stat(services.get_avg),
+        "get_var": stat(services.get_var),
+        "get_predict_least_carbon": lambda i: services.get_predict_least_carbon(TS_ID),
+        "get_predict_advanced_least_carbon": lambda i: services.get_predict_advanced_least_carbon(
+            TS_ID, "2025-01-01T00:00:00Z", "2025-12-31T00:00:00Z"),
+    }
+
+
+def bench_services(names: List[str], windows: List[tuple], repeat: int, dirs: Dict[str, str]) -> List[dict]:
+    calls = service_calls(windows)
+    results = []
+    for name in names:
+        call = calls[name]
+        reset_caches(dirs)
+        started = time.perf_counter()
+        call(0)
+        cold = time.perf_counter() - started
+        results.append(summarize(name, "cold", [cold], cold))
+
+        latencies = []
+        started = time.perf_counter()
+        for i in range(repeat):
+            began = time.perf_counter()
+            call(i)
+            latencies.append(time.perf_counter() - began)
+        results.append(summarize(name, "warm", latencies, time.perf_counter() - started))
+    return results
+
+
+def endpoint_params(endpoint: str, windows: List[tuple], i: int) -> dict:
+    if endpoint == "/predict_least_carbon/":
+        return {"ts_id": TS_ID}
+    if endpoint == "/predict_advanced_least_carbon/":
+        return {"ts_id": TS_ID, "start_date": "2025-01-01T00:00:00Z", "end_date": "2025-12-31T00:00:00Z"}
+    start, end = windows[i % len(windows)]
+    return {"ts_id": TS_ID, "start": start, "end": end}
+
+
+async def load_test(endpoint: str, windows: List[tuple], requests: int, concurrency: int) -> dict:
+    import httpx
+
+    from app.main import app
+
+    latencies, errors = [], 0
+    semaphore = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        async def one(i: int):
+            nonlocal errors
+            async with semaphore:
+                began = time.perf_counter()
+                response = await client.get(endpoint, params=endpoint_params(endpoint, windows, i))
+                latencies.append(time.perf_counter() - began)
+                if response.status_code != 200:
+                    errors += 1
+
+        await one(0)  # warm up: load the series and fit models before timing
+        latencies.clear()
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(requests)))
+        elapsed = time.perf_counter() - started
+    result = summarize(endpoint, "http", latencies, elapsed, errors)
+    result["concurrency"] = concurrency
+    return result
+
+
+def peak_rss_mb() -> Dict[str, float]:
+    # ru_maxrss is in KiB on Linux and bytes on macOS.
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return {
+        "self": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale,
+        "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale,
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run(args, dirs: Dict[str, str]) -> List[dict]:
+    from app import executors
+    from app.storage import FORMATS
+    from app.training import model_trainer
+
+    timestamps, values = generate_series(int(args.points), args.years, args.seed)
+    fmt = FORMATS[args.format]
+    fmt.write(os.path.join(dirs["data"], TS_ID + fmt.suffix), timestamps, values)
+    windows = random_windows(timestamps, max(args.repeat, args.requests), args.seed)
+
+    selected = set(args.only) if args.only else None
+    try:
+        results = bench_services([name for name in SERVICE_FUNCTIONS if not selected or name in selected],
+                                 windows, args.repeat, dirs)
+        if not args.skip_http:
+            for endpoint in HTTP_ENDPOINTS:
+                if not selected or endpoint in selected:
+                    results.append(asyncio.run(load_test(endpoint, windows, args.requests, args.concurrency)))
+    finally:
+        executors.shutdown()
+        model_trainer.shutdown()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the service layer and HTTP endpoints.")
+    parser.add_argument("--points", type=float, default=1e5, help="synthetic series size (1e4 - 1e8)")
+    parser.add_argument("--years", type=float, default=5.0, help="time span covered by the series")
+    parser.add_argument("--format", choices=("columnar", "ndjson", "json"), default="columnar")
+    parser.add_argument("--repeat", type=int, default=200, help="warm calls per service function")
+    parser.add_argument("--requests", type=int, default=500, help="HTTP requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--only", nargs="*", help="restrict to these service functions / endpoints")
+    parser.add_argument("--skip-http", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    root = tempfile.mkdtemp(prefix="prediction-bench-")
+    dirs = {"data": root, "shared": os.path.join(root, ".shared"), "models": os.path.join(root, ".models")}
+    # Must be set before the app modules are imported; they read their
+    # configuration at import time.
+    os.environ.update(DATA_DIR=dirs["data"], SHARED_CACHE_DIR=dirs["shared"], MODEL_CACHE_DIR=dirs["models"],
+                      INTENT_CACHE_PATH=os.path.join(root, ".intent_cache.jsonl"))
+    try:
+        # stdout is reserved for the report; anything the app prints goes to stderr.
+        with contextlib.redirect_stdout(sys.stderr):
+            results = run(args, dirs)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    report = {
+        "commit": git_commit(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "cpu_count": os.cpu_count(),
+        "config": {"points": int(args.points), "years": args.years, "format": args.format, "repeat": args.repeat,
+                   "requests": args.requests, "concurrency": args.concurrency, "seed": args.seed},
+        "results": results,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return report
+
+
+if __name__ == "__main__":
+    main()
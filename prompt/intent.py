@@ -0,0 +1,170 @@
+import calendar
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from datetime import date
+from typing import Optional, Tuple
+
+from app.metrics import cache_lookup
+
+Intent = Tuple[str, str, str]
+
+INTENT_CACHE_SIZE = int(os.getenv("INTENT_CACHE_SIZE", "1024"))
+INTENT_CACHE_PATH = os.getenv("INTENT_CACHE_PATH", os.path.join(os.getenv("DATA_DIR", "data"), ".intent_cache.jsonl"))
+
+MONTHS = {}
+for number in range(1, 13):
+    MONTHS[calendar.month_name[number].lower()] = number
+    MONTHS[calendar.month_abbr[number].lower()] = number
+MONTHS["sept"] = 9
+
+# Checked in order: "predict the least carbon" is a forecast, not a minimum.
+CONCEPT_KEYWORDS = (
+    ("predict_least_carbon", ("predict", "forecast", "upcoming", "future")),
+    ("average_carbon_intensity", ("average", "mean", "typical")),
+    ("maximum_carbon_intensity", ("most", "highest", "maximum", "max", "peak", "producing")),
+    ("minimum_carbon_intensity", ("least", "lowest", "minimum", "min", "cleanest")),
+)
+
+MONTH_PATTERN = "|".join(sorted(MONTHS, key=len, reverse=True))
+# Only 19xx and 20xx read as years, so "the 5000 km trip" is not one.
+PERIOD = rf"(?:(?P<{{0}}month>{MONTH_PATTERN})\.?\s+)?(?P<{{0}}year>(?:19|20)\d\d)"
+RANGE_RE = re.compile(
+    r"\b(?:from\s+|between\s+)?" + PERIOD.format("a_") + r"\s*(?:to|until|through|thru|-|and)\s*" + PERIOD.format("b_") + r"\b"
+)
+SINGLE_RE = re.compile(r"\b" + PERIOD.format("") + r"\b")
+RELATIVE_RE = re.compile(r"\b(this|current|next|upcoming|coming)\s+year\b")
+# Month names or numbers the matched span did not use, as in "between March
+# and June 2023" or "the last 6 months", mean the grammar misread the prompt.
+LEFTOVER_RE = re.compile(rf"\b(?:{MONTH_PATTERN}|\d+)\b")
+
+
+def normalize_prompt(prompt: str) -> str:
+    return " ".join(re.sub(r"[^\w\s-]", " ", prompt.lower()).split())
+
+
+def _period(year: int, month: Optional[int]) -> Tuple[date, date]:
+    if month is None:
+        return date(year, 1, 1), date(year, 12, 31)
+    return date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1])
+
+
+def _format(start: date, end: date) -> Tuple[str, str]:
+    return start.strftime("%Y-%m-%dT00:00:00.000Z"), end.strftime("%Y-%m-%dT23:59:59.999Z")
+
+
+def _match_period(match, prefix: str) -> Tuple[date, date]:
+    month = match.group(prefix + "month")
+    return _period(int(match.group(prefix + "year")), MONTHS[month] if month else None)
+
+
+def _unused(text: str, match=None) -> bool:
+    if match is not None:
+        text = text[:match.start()] + " " + text[match.end():]
+    return LEFTOVER_RE.search(text) is not None
+
+
+def _match_span(text: str, concept: str, today: date) -> Optional[Tuple[date, date]]:
+    match = RANGE_RE.search(text)
+    if match:
+        if _unused(text, match):
+            return None
+        return _match_period(match, "a_")[0], _match_period(match, "b_")[1]
+    match = SINGLE_RE.search(text)
+    if match:
+        if _unused(text, match):
+            return None
+        return _match_period(match, "")
+    if _unused(text):
+        return None
+    match = RELATIVE_RE.search(text)
+    if match:
+        year = today.year if match.group(1) in ("this", "current") else today.year + 1
+        return _period(year, None)
+    if concept == "predict_least_carbon":
+        return _period(today.year + 1, None)
+    return None
+
+
+def parse_intent(prompt: str, today: Optional[date] = None) -> Optional[Intent]:
+    # Grammar for the common phrasings: a concept keyword plus a month/year,
+    # a "<period> to <period>" range, or "this/next year". Anything else,
+    # including a prompt with dates the match did not use, is left to the LLM.
+    today = today or date.today()
+    text = normalize_prompt(prompt)
+    words = set(text.split())
+
+    concept = next((name for name, keywords in CONCEPT_KEYWORDS if words & set(keywords)), None)
+    if concept is None:
+        return None
+
+    try:
+        span = _match_span(text, concept, today)
+    except ValueError:
+        return None
+    if span is None or span[0] > span[1]:
+        return None
+
+    start, end = _format(*span)
+    return start, end, concept
+
+
+class IntentCache:
+    # LRU of normalized prompt -> extraction, backed by an append-only JSON
+    # lines file shared by every worker. The key includes the current year
+    # because LLM answers to relative phrasings are only valid that year.
+    def __init__(self, maxsize: int = INTENT_CACHE_SIZE, path: Optional[str] = INTENT_CACHE_PATH):
+        self.maxsize = maxsize
+        self.path = path
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def _key(self, prompt: str) -> str:
+        return f"{date.today().year}:{normalize_prompt(prompt)}"
+
+    def _load(self) -> None:
+        self._loaded = True
+        if not self.path or not os.path.exists(self.path):
+            return
+        with open(self.path, 'r') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    self._remember(entry["key"], tuple(entry["intent"]))
+                except (ValueError, KeyError, TypeError):
+                    continue
+
+    def _remember(self, key: str, intent: Intent) -> None:
+        self._entries[key] = intent
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def get(self, prompt: str) -> Optional[Intent]:
+        key = self._key(prompt)
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            intent = self._entries.get(key)
+            cache_lookup("intent", intent is not None)
+            if intent is not None:
+                self._entries.move_to_end(key)
+            return intent
+
+    def put(self, prompt: str, intent: Intent) -> None:
+        key = self._key(prompt)
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            self._remember(key, intent)
+            if not self.path:
+                return
+            try:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                with open(self.path, 'a') as f:
+                    f.write(json.dumps({"key": key, "intent": list(intent)}) + "\n")
+            except OSError:
+                pass
@@ -1,74 +1,125 @@
 import json
 import argparse
-import requests
 from datetime import datetime, timezone
 from typing import Optional
-from langchain_community.chat_models import ChatOllama
-from langchain_core.messages import HumanMessage
-from langchain_core.output_parsers import StrOutputParser
-from langchain_core.prompts import ChatPromptTemplate
 import re
 import os
+import sys
+import threading
+
+if __package__ in (None, ""):
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.metrics import span
+from app.store import from_epoch, get_series
+from prompt.intent import IntentCache, parse_intent
+
+
+EXTRACTION_INSTRUCTIONS = (
+    "Extract the start and end dates and concept from this prompt: '{prompt_text}'.\n" +
+    "Follow these rules:\n" +
+    "The concept should be one of: 'average_carbon_intensity', 'maximum_carbon_intensity', 'minimum_carbon_intensity', or 'predict_least_carbon'. The concept is based on the content of the prompt. For example, if the prompt is about finding the most carbon emissions or highest carbon emissions or producing, USE ONLY 'maximum_carbon_intensity'. If the prompt is about finding the average level of emissions, it should be 'average_carbon_intensity'.For lowest or minimum it should be minimum_carbon_intensity.'\n" +
+    "1. For specific dates like 'April 2022', assume start and end dates as the first and last day of that month.\n" +
+    "2. For month and year, use the first and last day of the month.\n" +
+    "3. For only a year, use January 1st and December 31st of that year.\n" +
+    "4. For relative terms like 'this year', use the current year’s start and end dates.\n" +
+    "5. For 'next year', use the start and end dates of the upcoming year.\n" +
+    "6. Ensure dates are formatted as YYYY-MM-DDTHH:MM:SS.SSSZ." +
+    "7. Identify the concept as one of average_carbon_intensity, maximum_carbon_intensity, minimum_carbon_intensity, or predict_least_carbon.\n" +
+    "Provide the response strictly in the format with 1 line and no precusor saying 'Here is the extracted information':\n" +
+    "Start Date: YYYY-MM-DDTHH:MM:SS.SSSZ End Date: YYYY-MM-DDTHH:MM:SS.SSSZ Concept: [concept]"
+)
+
+EXTRACTION_PATTERN = re.compile(
+    r"Start Date:\s*(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}\.\d{3}Z)\s*End Date:\s*(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}\.\d{3}Z)\s*Concept:\s*(\w+)"
+)
+
+
+class PromptEngine:
+    # Long-lived extractor: the langchain imports, the ChatOllama client and
+    # the prompt template are set up once and reused, so a request only pays
+    # for the LLM call itself.
+    def __init__(self, model: str = "llama3", ts_id: str = "caiso_carbon_intensity",
+                 cache: Optional[IntentCache] = None):
+        self.model = model
+        self.ts_id = ts_id
+        self.cache = cache if cache is not None else IntentCache()
+        self._chain = None
+        self._lock = threading.Lock()
+
+    def chain(self):
+        if self._chain is None:
+            with self._lock:
+                if self._chain is None:
+                    from langchain_community.chat_models import ChatOllama
+                    from langchain_core.output_parsers import StrOutputParser
+                    from langchain_core.prompts import ChatPromptTemplate
+
+                    prompt = ChatPromptTemplate.from_messages([("human", EXTRACTION_INSTRUCTIONS)])
+                    self._chain = prompt | ChatOllama(model=self.model) | StrOutputParser()
+        return self._chain
+
+    def extract(self, prompt_text: str):
+        # Deterministic grammar first, then previously resolved prompts; the
+        # LLM is only consulted when both miss.
+        with span("intent_parse"):
+            intent = parse_intent(prompt_text)
+        if intent is not None:
+            return intent
+        intent = self.cache.get(prompt_text)
+        if intent is not None:
+            return intent
+
+        intent = self.extract_with_llm(prompt_text)
+        if all(intent):
+            self.cache.put(prompt_text, intent)
+        return intent
+
+    def extract_with_llm(self, prompt_text: str):
+        with span("llm_call"):
+            response = self.chain().invoke({"prompt_text": prompt_text})
+        result = EXTRACTION_PATTERN.search(response)
+        if result:
+            start_date = result.group(1)
+            end_date = result.group(2)
+            concept = result.group(3)
+            return start_date, end_date, concept
+        else:
+            return None, None, None
+
+    def process(self, prompt: str, ts_id: Optional[str] = None):
+        ts_id = ts_id or self.ts_id
+        last_available_date = load_last_available_date(ts_id)
+
+        start_date, end_date, closest_concept = self.extract(prompt)
+
+        if not start_date or not end_date or not closest_concept:
+            return "Could not process the prompt."
+
+        start_date = datetime.fromisoformat(start_date.replace('Z', '+00:00')).replace(tzinfo=None)
+        end_date = datetime.fromisoformat(end_date.replace('Z', '+00:00')).replace(tzinfo=None)
+
+        start_str = start_date.replace(tzinfo=timezone.utc).isoformat() if start_date else None
+        end_str = end_date.replace(tzinfo=timezone.utc).isoformat() if end_date else None
+        last_available_str = last_available_date.replace(tzinfo=timezone.utc).isoformat() if last_available_date else None
+        return start_str, end_str, closest_concept, last_available_str
+
+
+prompt_engine = PromptEngine()
 
 
 def main(prompt_text):
-    llm = ChatOllama(model="llama3")
-
-    messages = [
-        HumanMessage(content=f"Extract the start and end dates and concept from this prompt: '{prompt_text}'.\n" +
-        "Follow these rules:\n" +
-        "The concept should be one of: 'average_carbon_intensity', 'maximum_carbon_intensity', 'minimum_carbon_intensity', or 'predict_least_carbon'. The concept is based on the content of the prompt. For example, if the prompt is about finding the most carbon emissions or highest carbon emissions or producing, USE ONLY 'maximum_carbon_intensity'. If the prompt is about finding the average level of emissions, it should be 'average_carbon_intensity'.For lowest or minimum it should be minimum_carbon_intensity.'\n" +
-        "1. For specific dates like 'April 2022', assume start and end dates as the first and last day of that month.\n" +
-        "2. For month and year, use the first and last day of the month.\n" +
-        "3. For only a year, use January 1st and December 31st of that year.\n" +
-        "4. For relative terms like 'this year', use the current year’s start and end dates.\n" +
-        "5. For 'next year', use the start and end dates of the upcoming year.\n" +
-        "6. Ensure dates are formatted as YYYY-MM-DDTHH:MM:SS.SSSZ." +
-        "7. Identify the concept as one of average_carbon_intensity, maximum_carbon_intensity, minimum_carbon_intensity, or predict_least_carbon.\n" +
-        "Provide the response strictly in the format with 1 line and no precusor saying 'Here is the extracted information':\n" +
-        "Start Date: YYYY-MM-DDTHH:MM:SS.SSSZ End Date: YYYY-MM-DDTHH:MM:SS.SSSZ Concept: [concept]")
-    ]
-
-    prompt = ChatPromptTemplate.from_messages(messages)
-
-    chain = prompt | llm | StrOutputParser()
-    input_data = {}
-
-    response = chain.invoke(input_data)
-    result = re.search(
-    r"Start Date:\s*(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}\.\d{3}Z)\s*End Date:\s*(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}\.\d{3}Z)\s*Concept:\s*(\w+)",
-    response
-    )
-    if result:
-        start_date = result.group(1)
-        end_date = result.group(2)
-        concept = result.group(3)
-        return start_date, end_date, concept
-    else:
-        print("Could not extract dates and concept.")
-        return None, None, None
+    return prompt_engine.extract(prompt_text)
 
 
 def is_date_range_valid(start_date: Optional[datetime], end_date: Optional[datetime], last_available_date: datetime) -> bool:
     if end_date:
         return end_date <= last_available_date
     return True 
-def load_last_available_date(file_path: str) -> datetime:
-    with open(file_path, 'r') as f:
-        data = json.load(f)
-
-        data_entries = data.get('data', [])
-        
-        if not data_entries:
-            raise ValueError("No data entries found in the JSON file.")
-
-        datetime_strings = [entry['datetime'] for entry in data_entries]
-        
-        datetime_objects = [datetime.fromisoformat(dt.replace('Z', '+00:00')).replace(tzinfo=None) for dt in datetime_strings]
-        
-        last_available_date = max(datetime_objects)
-        
-        return last_available_date
+def load_last_available_date(ts_id: str) -> datetime:
+    series = get_series(ts_id)
+    if not len(series):
+        raise ValueError("No data entries found for the series.")
+    return from_epoch(series.last_timestamp).replace(tzinfo=None)
 
 def call_api(closest_concept: str, ts_id: str, start_str: str, end_str: str, last_available_date: datetime):
     if not is_date_range_valid(start_date, end_date, last_available_date):
@@ -91,6 +142,8 @@ def call_api(closest_concept: str, ts_id: str, start_str: str, end_str: str, las
         else:
             raise ValueError("Unknown concept")
     
+    import requests
+
     url = f"http://localhost:8000{endpoint}"
     
     response = requests.get(url, params=params)
@@ -112,22 +165,8 @@ def format_output(prompt: str, result: dict) -> str:
     else:
         return "No data available."
 
-def process_prompt(prompt: str) -> str:
-    last_available_date = load_last_available_date('data/caiso_carbon_intensity.json')
-    
-    start_date, end_date, closest_concept = main(prompt)
-    ts_id = "caiso_carbon_intensity"
-    
-    if not start_date or not end_date or not closest_concept:
-        return "Could not process the prompt."
-
-    start_date = datetime.fromisoformat(start_date.replace('Z', '+00:00')).replace(tzinfo=None)
-    end_date = datetime.fromisoformat(end_date.replace('Z', '+00:00')).replace(tzinfo=None)
-    
-    start_str = start_date.replace(tzinfo=timezone.utc).isoformat() if start_date else None
-    end_str = end_date.replace(tzinfo=timezone.utc).isoformat() if end_date else None
-    last_available_str = last_available_date.replace(tzinfo=timezone.utc).isoformat() if last_available_date else None
-    return start_str, end_str, closest_concept, last_available_str
+def process_prompt(prompt: str, ts_id: Optional[str] = None) -> str:
+    return prompt_engine.process(prompt, ts_id)
 
 if __name__ == "__main__":
     prompt_text = os.getenv('PROMPT_TEXT', '')
@@ -0,0 +1,14 @@
+import atexit
+import os
+import shutil
+import tempfile
+
+# Module-level stores read these when app is first imported, so they must
+# be set before any test module imports it; otherwise a test run writes
+# into data/ next to the real series.
+_scratch = tempfile.mkdtemp(prefix="prediction-tests-")
+atexit.register(shutil.rmtree, _scratch, ignore_errors=True)
+os.environ["PREFERENCES_DB"] = os.path.join(_scratch, "preferences.sqlite3")
+os.environ["SHARED_CACHE_DIR"] = os.path.join(_scratch, "shared")
+os.environ["MODEL_CACHE_DIR"] = os.path.join(_scratch, "models")
+os.environ["INTENT_CACHE_PATH"] = os.path.join(_scratch, "intent_cache.jsonl")
@@ -0,0 +1,27 @@
+import json
+import subprocess
+import sys
+
+from benchmarks.compare import compare
+
+
+def test_benchmark_harness_emits_report():
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.run", "--points", "1e4", "--repeat", "3", "--requests", "4",
+         "--concurrency", "2", "--only", "get_max", "get_var", "/average/"],
+        capture_output=True, text=True, check=True,
+    ).stdout
+    report = json.loads(output)
+    assert [(result["name"], result["kind"]) for result in report["results"]] == [
+        ("get_max", "cold"), ("get_max", "warm"), ("get_var", "cold"), ("get_var", "warm"), ("/average/", "http"),
+    ]
+    assert report["results"][-1]["errors"] == 0
+    assert report["peak_rss_mb"]["self"] > 0
+
+
+def test_compare_flags_regressions():
+    baseline = {"results": [{"name": "get_max", "kind": "warm", "p50_ms": 1.0, "throughput_per_s": 100.0}]}
+    candidate = {"results": [{"name": "get_max", "kind": "warm", "p50_ms": 2.0, "throughput_per_s": 95.0}]}
+    rows = {row[2]: row for row in compare(baseline, candidate, 1.2)}
+    assert rows["p50_ms"][-1] is True
+    assert rows["throughput_per_s"][-1] is False
@@ -0,0 +1,34 @@
+from app.cache import ResponseCache, etag_for, etag_matches
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_response_cache_evicts_lru_and_expired():
+    clock = FakeClock()
+    cache = ResponseCache(maxsize=2, ttl=10, clock=clock)
+    cache.put(("a",), b"1")
+    cache.put(("b",), b"2")
+    assert cache.get(("a",)) == b"1"
+    cache.put(("c",), b"3")
+    assert cache.get(("b",)) is None
+    assert cache.get(("a",)) == b"1"
+
+    clock.now = 11
+    assert cache.get(("a",)) is None
+    assert len(cache) == 1
+
+
+def test_etag_matching():
+    etag = etag_for(("max", "caiso", "v1", 0, 10))
+    assert etag != etag_for(("max", "caiso", "v2", 0, 10))
+    assert etag_matches(etag, etag)
+    assert etag_matches(f'"other", W/{etag}', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches(None, etag)
+    assert not etag_matches('"other"', etag)
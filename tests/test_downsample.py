@@ -0,0 +1,42 @@
+import numpy as np
+
+from app.downsample import OVERSAMPLE, Pyramid, lttb_indices, minmax_indices
+
+
+def series(count, seed=0):
+    rng = np.random.default_rng(seed)
+    return 3600 * np.arange(count, dtype=np.int64), rng.normal(300, 50, count)
+
+
+def test_minmax_keeps_every_bucket_extreme():
+    _, values = series(1000)
+    keep = minmax_indices(values, 10)
+    assert np.all(np.diff(keep) > 0)
+    for bucket in values.reshape(10, 100):
+        assert bucket.min() in values[keep] and bucket.max() in values[keep]
+
+
+def test_lttb_picks_endpoints_and_one_point_per_bucket():
+    timestamps, values = series(5000)
+    values[2500] = 10000
+    keep = lttb_indices(timestamps, values, 100)
+    assert len(keep) == 100
+    assert keep[0] == 0 and keep[-1] == 4999
+    assert np.all(np.diff(keep) > 0)
+    assert 2500 in keep
+    assert lttb_indices(timestamps[:50], values[:50], 100).tolist() == list(range(50))
+
+
+def test_pyramid_levels_preserve_extremes_and_bound_work():
+    timestamps, values = series(200000, 1)
+    pyramid = Pyramid(timestamps, values)
+    assert len(pyramid.levels) > 3
+    for level_timestamps, level_values in pyramid.levels:
+        assert level_values.max() == values.max() and level_values.min() == values.min()
+        assert np.all(np.diff(level_timestamps) >= 0)
+
+    level, selected, _ = pyramid.select(0, int(timestamps[-1]) + 1, 500)
+    assert level > 0
+    assert OVERSAMPLE * 500 <= len(selected) < OVERSAMPLE * 500 * 4
+    level, selected, _ = pyramid.select(0, 3600 * 100, 500)
+    assert level == 0 and len(selected) == 100
@@ -0,0 +1,40 @@
+import asyncio
+import threading
+import time
+
+from app import executors
+
+
+def test_endpoint_limit_bounds_concurrency(monkeypatch):
+    monkeypatch.setitem(executors.ENDPOINT_LIMITS, "slow", 2)
+    lock = threading.Lock()
+    state = {"running": 0, "peak": 0}
+
+    def work():
+        with lock:
+            state["running"] += 1
+            state["peak"] = max(state["peak"], state["running"])
+        time.sleep(0.05)
+        with lock:
+            state["running"] -= 1
+
+    async def main():
+        slow = [executors.run_in_thread("slow", work) for _ in range(6)]
+        await asyncio.gather(*slow)
+
+    asyncio.run(main())
+    assert state["peak"] == 2
+
+
+def test_unlimited_endpoint_is_not_queued_behind_limited_one(monkeypatch):
+    monkeypatch.setitem(executors.ENDPOINT_LIMITS, "slow", 1)
+    release = threading.Event()
+
+    async def main():
+        blocked = asyncio.ensure_future(executors.run_in_thread("slow", release.wait, 5))
+        fast = await asyncio.wait_for(executors.run_in_thread("stats", lambda: "done"), timeout=2)
+        release.set()
+        await blocked
+        return fast
+
+    assert asyncio.run(main()) == "done"
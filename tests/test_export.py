@@ -0,0 +1,47 @@
+import json
+
+import numpy as np
+import pytest
+
+from app import services, store
+from app.export import export_chunks
+from app.store import Series, SeriesRegistry
+
+
+def make_series():
+    timestamps = 1577836800 + 3600 * np.arange(10, dtype=np.int64)
+    values = np.array([100, 101.5, 102, 103, 104, 105, 106, 107, 108, 109], dtype=np.float64)
+    return Series("ts", timestamps, values, "v1")
+
+
+def test_export_streams_fixed_size_chunks():
+    series = make_series()
+    chunks = list(export_chunks(series.timestamps[1:8], series.values[1:8], "ndjson", chunk_size=3))
+    assert len(chunks) == 3
+    records = [json.loads(line) for line in b"".join(chunks).decode().splitlines()]
+    assert records[0] == {"datetime": "2020-01-01T01:00:00.000Z", "carbon_intensity": 101.5}
+    assert [record["carbon_intensity"] for record in records] == [101.5, 102, 103, 104, 105, 106, 107]
+    assert b"".join(chunks) == b"".join(
+        export_chunks(series.timestamps[1:8], series.values[1:8], "ndjson", chunk_size=1000))
+
+
+def test_export_csv_and_unknown_format():
+    series = make_series()
+    lines = b"".join(export_chunks(series.timestamps[:2], series.values[:2], "csv")).decode().splitlines()
+    assert lines == ["datetime,carbon_intensity", "2020-01-01T00:00:00.000Z,100", "2020-01-01T01:00:00.000Z,101.5"]
+    with pytest.raises(ValueError):
+        list(export_chunks(series.timestamps[:2], series.values[:2], "xml"))
+
+
+def test_export_streams_the_range_resolved_before_later_appends(tmp_path, monkeypatch):
+    registry = SeriesRegistry(str(tmp_path))
+    monkeypatch.setattr(store, "registry", registry)
+    registry.append("ts", make_series().timestamps[:6], make_series().values[:6])
+    _, count, chunks = services.prepare_export("ts")
+    first = next(chunks)
+
+    registry.append("ts", np.array([1577836800 + 3600 * 10]), np.array([500.0]))
+    registry.append("ts", np.array([1577836800 + 3600 * 2]), np.array([-1.0]))
+    records = [json.loads(line) for line in (first + b"".join(chunks)).decode().splitlines()]
+    assert count == len(records) == 6
+    assert [record["carbon_intensity"] for record in records] == [100, 101.5, 102, 103, 104, 105]
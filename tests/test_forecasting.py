@@ -0,0 +1,40 @@
+import numpy as np
+
+from app.forecasting import ModelCache
+from app.store import get_series
+
+
+def test_model_cache_reuses_fit_and_restores_from_disk(tmp_path):
+    series = get_series("caiso_carbon_intensity")
+    cache = ModelCache(cache_dir=str(tmp_path))
+    fitted = cache.get(series)
+    assert cache.get(series) is fitted
+    assert len(list(tmp_path.glob("caiso_carbon_intensity@*.npy"))) == 1
+
+    restored = ModelCache(cache_dir=str(tmp_path)).get(series)
+    assert restored is not fitted
+    assert np.allclose(restored.params, fitted.params)
+    assert np.allclose(restored.get_forecast(steps=6).predicted_mean, fitted.get_forecast(steps=6).predicted_mean)
+
+
+def test_model_cache_evicts_least_recently_used():
+    cache = ModelCache(maxsize=1, cache_dir=None)
+    cache.store(("a",), "first")
+    cache.store(("b",), "second")
+    assert cache.lookup(("a",)) is None
+    assert cache.lookup(("b",)) == "second"
+
+
+def test_saving_params_prunes_older_versions(tmp_path):
+    cache = ModelCache(cache_dir=str(tmp_path))
+    order, seasonal_order = (1, 1, 1), (0, 0, 0, 0)
+    other = (2, 1, 1)
+    cache.save_params(("a", 1, order, seasonal_order), np.array([1.0]))
+    cache.save_params(("a", 1, other, seasonal_order), np.array([5.0]))
+    cache.save_params(("b", 1, order, seasonal_order), np.array([7.0]))
+    cache.save_params(("a", 2, order, seasonal_order), np.array([2.0]))
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "a@1@2-1-1-0-0-0-0.npy", "a@2@1-1-1-0-0-0-0.npy", "b@1@1-1-1-0-0-0-0.npy"]
+    assert cache.latest_params("a", order, seasonal_order).tolist() == [2.0]
+    assert cache.latest_params("a", other, seasonal_order).tolist() == [5.0]
@@ -0,0 +1,49 @@
+import numpy as np
+
+from app.indexes import AggregateIndex
+
+
+def check_windows(index, values, rng, trials=500):
+    for _ in range(trials):
+        lo, hi = sorted(int(x) for x in rng.integers(0, len(values) + 1, 2))
+        if hi - lo < 2:
+            continue
+        window = values[lo:hi]
+        assert index.min(lo, hi) == window.min()
+        assert index.max(lo, hi) == window.max()
+        assert np.isclose(index.mean(lo, hi), window.mean())
+        assert np.isclose(index.variance(lo, hi), window.var(ddof=1))
+
+
+def test_index_matches_direct_reductions():
+    rng = np.random.default_rng(0)
+    values = rng.normal(250, 60, 20000).round()
+    check_windows(AggregateIndex(values), values, rng)
+
+
+def test_index_updates_incrementally():
+    rng = np.random.default_rng(1)
+    values = rng.normal(250, 60, 12000).round()
+    index = AggregateIndex(values[:5000])
+    for size in range(5000, 12001, 700):
+        index.extend(values[:size])
+    index.extend(values)
+    check_windows(index, values, rng)
+
+    rewritten = values.copy()
+    rewritten[7000:] -= 40
+    index.update(rewritten, 7000)
+    check_windows(index, rewritten, rng)
+
+
+def test_fork_leaves_the_original_untouched():
+    rng = np.random.default_rng(2)
+    values = rng.normal(250, 60, 3000).round()
+    index = AggregateIndex(values[:1000])
+    grown = index.fork()
+    grown.extend(values[:2000])
+    rewritten = values.copy()
+    rewritten[500:] += 30
+    grown.update(rewritten, 500)
+    check_windows(index, values[:1000], rng)
+    check_windows(grown, rewritten, rng)
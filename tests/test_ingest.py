@@ -0,0 +1,175 @@
+import asyncio
+import json
+import os
+import threading
+
+import numpy as np
+from fastapi.testclient import TestClient
+
+from app import routes, services
+from app.indexes import AggregateIndex
+from app.main import app
+from app.rollups import Rollups
+from app.store import COMPACTION_FAILURES, SeriesRegistry
+
+HOUR = 3600
+BASE = 1577836800
+
+
+def write_series(path, hours):
+    records = [
+        {"datetime": f"2020-01-01T{h:02d}:00:00.000Z", "carbon_intensity": 100 + h} for h in range(hours)
+    ]
+    with open(path, 'w') as f:
+        json.dump({"schema": {}, "data": records}, f)
+
+
+def assert_consistent(series):
+    fresh_index = AggregateIndex(np.array(series.values))
+    assert series.index.max(0, len(series)) == fresh_index.max(0, len(series))
+    assert series.index.mean(0, len(series)) == fresh_index.mean(0, len(series))
+    fresh_rollups = Rollups(np.array(series.timestamps), np.array(series.values))
+    assert np.array_equal(series.rollups["hour"]["sum"], fresh_rollups["hour"]["sum"])
+
+
+def test_append_in_order_late_and_duplicate_points(tmp_path):
+    write_series(tmp_path / "ts.json", 10)
+    registry = SeriesRegistry(str(tmp_path))
+    series = registry.get("ts")
+    version = series.version
+
+    registry.append("ts", np.array([BASE + 11 * HOUR, BASE + 10 * HOUR]), np.array([500.0, 400.0]))
+    previous, series = series, registry.get("ts")
+    assert series.version != version
+    assert series.values[-2:].tolist() == [400.0, 500.0]
+    # The published snapshot is never modified.
+    assert previous.version == version and len(previous) == 10
+    assert_consistent(previous)
+
+    registry.append("ts", np.array([BASE + 2 * HOUR, BASE + 2 * HOUR, BASE + 3 * HOUR + 1]), np.array([1.0, 2.0, 3.0]))
+    series = registry.get("ts")
+    assert len(series) == 13
+    assert series.values[2:5].tolist() == [2.0, 103.0, 3.0]
+    assert_consistent(series)
+
+
+def test_queries_never_see_a_half_applied_append(tmp_path):
+    write_series(tmp_path / "ts.json", 1)
+    registry = SeriesRegistry(str(tmp_path))
+    registry.get("ts")
+    errors = []
+
+    def ingest():
+        for batch in range(100):
+            timestamps = BASE + HOUR * (1 + 50 * batch + np.arange(50))
+            registry.append("ts", timestamps, np.arange(50, dtype=np.float64) + batch)
+
+    writer = threading.Thread(target=ingest)
+    writer.start()
+    while writer.is_alive():
+        series = registry.get("ts")
+        try:
+            count = len(series)
+            assert series.index.max(0, count) == series.values.max()
+            assert series.index.mean(0, count) == series.values.sum() / count
+            assert series.rollups["day"]["count"].sum() == count
+        except Exception as e:
+            errors.append(e)
+            break
+    writer.join()
+    assert not errors
+    assert len(registry.get("ts")) == 5001
+    assert_consistent(registry.get("ts"))
+
+
+def test_other_workers_replay_segments_and_compaction(tmp_path):
+    write_series(tmp_path / "ts.json", 4)
+    writer = SeriesRegistry(str(tmp_path))
+    writer.append("ts", np.array([BASE + 5 * HOUR]), np.array([7.0]))
+
+    reader = SeriesRegistry(str(tmp_path)).get("ts")
+    assert reader.values.tolist() == [100.0, 101.0, 102.0, 103.0, 7.0]
+
+    writer.compact("ts")
+    assert writer.segments.names("ts") == []
+    with open(tmp_path / "ts.json") as f:
+        assert len(json.load(f)["data"]) == 5
+    assert SeriesRegistry(str(tmp_path)).get("ts").values.tolist() == reader.values.tolist()
+
+
+def test_foreign_ingest_sends_stats_to_a_thread(tmp_path, monkeypatch):
+    write_series(tmp_path / "ts.json", 4)
+    registry = SeriesRegistry(str(tmp_path))
+    registry.get("ts")
+    assert registry.is_loaded("ts")
+    monkeypatch.setattr(routes, "registry", registry)
+    dispatched = []
+
+    async def run_in_thread(endpoint, fn, *args):
+        dispatched.append(endpoint)
+        return fn(*args)
+
+    monkeypatch.setattr(routes, "run_in_thread", run_in_thread)
+    asyncio.run(routes.run_stat(lambda ts_id: registry.get(ts_id), "ts"))
+    assert dispatched == []
+
+    # Another worker's ingest changes the files behind this registry.
+    SeriesRegistry(str(tmp_path)).append("ts", np.array([BASE + 5 * HOUR]), np.array([7.0]))
+    assert not registry.is_loaded("ts")
+    series = asyncio.run(routes.run_stat(lambda ts_id: registry.get(ts_id), "ts"))
+    assert dispatched == ["stats"]
+    assert len(series) == 5 and registry.is_loaded("ts")
+    assert not registry.is_loaded("../escape")
+
+
+def test_ingest_route_creates_series(tmp_path, monkeypatch):
+    monkeypatch.setattr(services, "registry", SeriesRegistry(str(tmp_path)))
+    client = TestClient(app)
+    response = client.post("/ingest/", params={"ts_id": "new_region"}, json=[
+        {"date": "2024-01-01T01:00:00Z", "intensity": 210},
+        {"date": "2024-01-01T00:00:00Z", "intensity": 200},
+    ])
+    assert response.status_code == 200
+    assert response.json()["count"] == 2
+    assert os.path.exists(tmp_path / "new_region.segments")
+
+    response = client.post("/ingest/", params={"ts_id": "../escape"}, json=[{"date": "2024-01-01T00:00:00Z", "intensity": 1}])
+    assert response.status_code == 400
+
+
+def test_failed_compaction_is_counted(tmp_path, monkeypatch, caplog):
+    write_series(tmp_path / "ts.json", 2)
+    registry = SeriesRegistry(str(tmp_path))
+    registry.append("ts", np.array([BASE + 3 * HOUR]), np.array([1.0]))
+
+    def fail(ts_id):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(registry, "compact", fail)
+    failures = COMPACTION_FAILURES.value(ts_id="ts")
+    assert registry.schedule_compaction("ts", min_bytes=0)
+    for thread in threading.enumerate():
+        if thread.name == "compact-ts":
+            thread.join()
+    assert COMPACTION_FAILURES.value(ts_id="ts") == failures + 1
+    assert "Compaction of ts failed" in caplog.text
+
+
+def test_quiet_ingest_is_compacted_and_mapped_again(tmp_path):
+    write_series(tmp_path / "ts.json", 3)
+    registry = SeriesRegistry(str(tmp_path), shared_dir=str(tmp_path / "shared"))
+    assert not registry.get("ts").values.flags.writeable
+    registry.append("ts", np.array([BASE + 4 * HOUR]), np.array([9.0]))
+    appended = registry.get("ts")
+    assert appended.values.flags.writeable
+
+    assert registry.schedule_compaction("ts", min_bytes=1 << 30, delay=0.05)
+    for thread in threading.enumerate():
+        if thread.name == "compact-ts":
+            thread.join()
+    assert registry.segments.names("ts") == []
+    republished = registry.get("ts")
+    assert republished.version == appended.version
+    assert republished.values.tolist() == [100.0, 101.0, 102.0, 9.0]
+    assert not republished.values.flags.writeable
+    assert not registry.schedule_compaction("ts")
@@ -0,0 +1,71 @@
+from datetime import date
+
+import pytest
+
+from prompt.intent import IntentCache, parse_intent
+from prompt.prompt_processor import PromptEngine
+
+TODAY = date(2024, 6, 15)
+
+
+def test_parse_month_year():
+    assert parse_intent("What is the average carbon intensity for May 2020?", TODAY) == (
+        "2020-05-01T00:00:00.000Z", "2020-05-31T23:59:59.999Z", "average_carbon_intensity")
+
+
+def test_parse_range_and_year():
+    assert parse_intent("Tell me about the most carbon producing on Jan 2021 to May 2021", TODAY) == (
+        "2021-01-01T00:00:00.000Z", "2021-05-31T23:59:59.999Z", "maximum_carbon_intensity")
+    assert parse_intent("lowest intensity in 2022", TODAY) == (
+        "2022-01-01T00:00:00.000Z", "2022-12-31T23:59:59.999Z", "minimum_carbon_intensity")
+
+
+def test_parse_relative_years():
+    assert parse_intent("Predict the least carbon intensity for the upcoming year", TODAY) == (
+        "2025-01-01T00:00:00.000Z", "2025-12-31T23:59:59.999Z", "predict_least_carbon")
+    assert parse_intent("average intensity this year", TODAY)[:2] == (
+        "2024-01-01T00:00:00.000Z", "2024-12-31T23:59:59.999Z")
+
+
+def test_unparseable_prompts_fall_through():
+    assert parse_intent("How dirty was the grid?", TODAY) is None
+    assert parse_intent("average intensity last spring", TODAY) is None
+    assert parse_intent("average carbon in 0000", TODAY) is None
+    assert parse_intent("average emissions for the 5000 km trip", TODAY) is None
+
+
+@pytest.mark.parametrize("prompt", [
+    "average intensity between March and June 2023",
+    "average intensity from March to June 2023",
+    "predict the least carbon for the last 6 months",
+    "predict the cleanest hours in the next 3 months",
+    "highest intensity in May 23",
+    "predict the least carbon for 2150",
+    "lowest intensity for 2023-05",
+])
+def test_prompts_with_unused_dates_fall_through(prompt):
+    assert parse_intent(prompt, TODAY) is None
+
+
+@pytest.mark.parametrize("prompt, expected", [
+    ("average co2 intensity for May 2020", ("2020-05-01T00:00:00.000Z", "2020-05-31T23:59:59.999Z")),
+    ("maximum intensity from March 2021 through June 2021", ("2021-03-01T00:00:00.000Z", "2021-06-30T23:59:59.999Z")),
+    ("average intensity in 2021 and 2022", ("2021-01-01T00:00:00.000Z", "2022-12-31T23:59:59.999Z")),
+    ("forecast the cleanest period next year", ("2025-01-01T00:00:00.000Z", "2025-12-31T23:59:59.999Z")),
+])
+def test_prompts_whose_dates_are_all_used_still_parse(prompt, expected):
+    assert parse_intent(prompt, TODAY)[:2] == expected
+
+
+def test_cache_persists_llm_extractions(tmp_path):
+    path = str(tmp_path / "intents.jsonl")
+    intent = ("2020-03-01T00:00:00.000Z", "2020-05-31T23:59:59.999Z", "average_carbon_intensity")
+    calls = []
+
+    engine = PromptEngine(cache=IntentCache(path=path))
+    engine.extract_with_llm = lambda prompt: calls.append(prompt) or intent
+    assert engine.extract("Average intensity last spring!") == intent
+    assert engine.extract("  average   intensity LAST spring ") == intent
+    assert calls == ["Average intensity last spring!"]
+
+    assert IntentCache(path=path).get("average intensity last spring") == intent
@@ -0,0 +1,42 @@
+import time
+
+from app.metrics import MetricsRegistry
+from app.profiler import SamplingProfiler
+
+
+def test_histogram_and_counter_render_in_text_format():
+    registry = MetricsRegistry()
+    latency = registry.histogram("latency_seconds", "Latency.", ("span",), buckets=(0.1, 1.0))
+    hits = registry.counter("hits_total", "Hits.", ("cache",))
+    registry.gauge("depth", "Depth.", ("pool",), lambda: {("thread",): 3})
+
+    latency.observe(0.05, span="load")
+    latency.observe(0.5, span="load")
+    latency.observe(5, span="load")
+    hits.inc(cache="response")
+    hits.inc(2, cache="response")
+
+    lines = registry.render().splitlines()
+    assert "# TYPE latency_seconds histogram" in lines
+    assert 'latency_seconds_bucket{span="load",le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{span="load",le="1"} 2' in lines
+    assert 'latency_seconds_bucket{span="load",le="+Inf"} 3' in lines
+    assert 'latency_seconds_count{span="load"} 3' in lines
+    assert 'hits_total{cache="response"} 3' in lines
+    assert 'depth{pool="thread"} 3' in lines
+
+
+def test_sampling_profiler_collects_stacks():
+    profiler = SamplingProfiler(interval=0.001)
+    profiler.start()
+
+    deadline = time.time() + 0.2
+    while time.time() < deadline:
+        sum(range(1000))
+    profiler.stop()
+
+    assert not profiler.running
+    assert profiler.samples > 0
+    assert any("test_sampling_profiler_collects_stacks" in entry["stack"] for entry in profiler.top())
+    profiler.reset()
+    assert profiler.top() == []
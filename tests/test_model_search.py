@@ -0,0 +1,68 @@
+import pytest
+
+from app import services
+from app.forecasting import ModelCache, ModelConfigStore, SARIMA_ORDER, SARIMA_SEASONAL_ORDER, model_key
+from app.model_search import SearchJobs, candidate_grid, rank, search_orders
+from app.store import get_series
+
+
+def test_candidate_grid_and_ranking():
+    grid = candidate_grid()
+    assert len(grid) == 36
+    assert ((1, 1, 1), (1, 1, 1, 12)) in grid
+
+    results = [
+        {"order": [0, 1, 0], "aic": 10.0, "mae": 5.0},
+        {"order": [1, 1, 1], "aic": 12.0, "mae": 3.0},
+        {"order": [2, 1, 2], "error": "did not converge"},
+    ]
+    assert [result["order"] for result in rank(results, "mae")] == [[1, 1, 1], [0, 1, 0]]
+    assert [result["order"] for result in rank(results, "aic")] == [[0, 1, 0], [1, 1, 1]]
+
+
+def test_search_persists_winner_and_seeds_params(tmp_path):
+    configs = ModelConfigStore(str(tmp_path))
+    cache = ModelCache(cache_dir=str(tmp_path))
+    series = get_series("caiso_carbon_intensity")
+    assert configs.orders(series.ts_id) == (SARIMA_ORDER, SARIMA_SEASONAL_ORDER)
+
+    grid = [((0, 1, 0), (0, 1, 0, 12)), ((0, 1, 1), (0, 1, 1, 12))]
+    report = search_orders(series, grid=grid, folds=1, horizon=6, workers=2, configs=configs, cache=cache)
+
+    assert len(report["candidates"]) == 2
+    assert all("seconds" in candidate for candidate in report["candidates"])
+    assert report["wall_seconds"] > 0
+    order, seasonal_order = configs.orders(series.ts_id)
+    assert [list(order), list(seasonal_order)] == [report["best"]["order"], report["best"]["seasonal_order"]]
+    assert cache.load_params(model_key(series, order, seasonal_order)) is not None
+
+
+def test_forecast_windows_use_the_searched_orders(tmp_path, monkeypatch):
+    configs = ModelConfigStore(str(tmp_path))
+    configs.save("caiso_carbon_intensity", {"order": [0, 1, 1], "seasonal_order": [0, 1, 1, 12]})
+    monkeypatch.setattr(services, "model_configs", configs)
+    requested = []
+
+    def get(series, order=SARIMA_ORDER, seasonal_order=SARIMA_SEASONAL_ORDER):
+        requested.append((tuple(order), tuple(seasonal_order)))
+        raise RuntimeError("not fitted in this test")
+
+    monkeypatch.setattr(services.model_trainer, "get", get)
+    with pytest.raises(RuntimeError):
+        services.get_best_windows("caiso_carbon_intensity", "2024-01-01T00:00:00Z", "2024-01-03T00:00:00Z",
+                                  4, source="forecast")
+    assert requested == [((0, 1, 1), (0, 1, 1, 12))]
+
+
+def test_status_falls_back_to_the_saved_search(tmp_path, monkeypatch):
+    # As seen by a worker that did not run the search, or after a restart.
+    configs = ModelConfigStore(str(tmp_path))
+    monkeypatch.setattr(services, "model_configs", configs)
+    monkeypatch.setattr(services, "search_jobs", SearchJobs())
+    with pytest.raises(LookupError):
+        services.get_model_search("caiso_carbon_intensity")
+
+    config = {"order": [0, 1, 1], "seasonal_order": [0, 1, 1, 12], "criterion": "mae", "version": "v1"}
+    configs.save("caiso_carbon_intensity", config)
+    assert services.get_model_search("caiso_carbon_intensity") == {
+        "ts_id": "caiso_carbon_intensity", "status": "done", "config": config}
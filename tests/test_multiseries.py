@@ -0,0 +1,64 @@
+import numpy as np
+
+from app.indexes import AggregateIndex
+from app.multiseries import AlignedFrame, evaluate
+from app.rollups import Rollups
+from app.store import Series
+
+START = 1577836800
+
+
+def make_series(ts_id, hours, offset, seed):
+    rng = np.random.default_rng(seed)
+    timestamps = START + 3600 * (offset + np.arange(hours, dtype=np.int64))
+    values = rng.integers(50, 500, hours).astype(np.float64)
+    return Series(ts_id, timestamps, values, "v1", AggregateIndex(values), Rollups(timestamps, values))
+
+
+def test_evaluate_matches_per_series_reductions():
+    regions = [make_series("a", 200, 0, 0), make_series("b", 150, 30, 1), make_series("c", 100, 500, 2)]
+    end = START + 3600 * 180
+    result = evaluate(regions, START, end, ["max", "min", "average", "variance"])
+
+    by_id = {region["ts_id"]: region for region in result["regions"]}
+    for series in regions[:2]:
+        lo, hi = series.range_indices(START, end)
+        window = np.array(series.values[lo:hi])
+        assert by_id[series.ts_id]["count"] == hi - lo
+        assert by_id[series.ts_id]["max"] == window.max()
+        assert by_id[series.ts_id]["min"] == window.min()
+        assert np.isclose(by_id[series.ts_id]["average"], window.mean())
+        assert np.isclose(by_id[series.ts_id]["variance"], window.var(ddof=1))
+    assert by_id["c"]["count"] == 0 and by_id["c"]["average"] is None
+
+    averages = {ts_id: by_id[ts_id]["average"] for ts_id in ("a", "b")}
+    assert result["rankings"]["average"] == sorted(averages, key=averages.get)
+
+
+def test_common_only_compares_shared_buckets():
+    regions = [make_series("a", 48, 0, 3), make_series("b", 48, 24, 4)]
+    frame = AlignedFrame(regions, "hour", START, START + 3600 * 100)
+    assert frame.count.shape == (2, 72)
+    frame.restrict_to_common()
+    assert frame.count.shape == (2, 24)
+
+    result = evaluate(regions, START, START + 3600 * 100, ["average"], common_only=True, top=1)
+    assert result["regions"][0]["count"] == 24
+    assert len(result["rankings"]["average"]) == 1
+
+
+def test_windows_cutting_through_buckets_count_only_their_points():
+    regions = [make_series("a", 24 * 70, 0, 5), make_series("b", 24 * 70, 7, 6)]
+    start, end = START + 3600 * 30 + 1800, START + 3600 * 24 * 40 + 600
+    for resolution in ("hour", "day", "month"):
+        result = evaluate(regions, start, end, ["max", "min", "average", "variance"], resolution)
+        for series, region in zip(regions, result["regions"]):
+            lo, hi = series.range_indices(start, end)
+            window = np.array(series.values[lo:hi])
+            assert region["count"] == hi - lo
+            assert region["max"] == window.max() and region["min"] == window.min()
+            assert np.isclose(region["average"], window.mean())
+            assert np.isclose(region["variance"], window.var(ddof=1))
+
+    inside = evaluate(regions, START + 3600 * 5, START + 3600 * 9, ["average"], "month")
+    assert inside["buckets"] == 1 and inside["regions"][0]["count"] == 4
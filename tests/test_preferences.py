@@ -0,0 +1,69 @@
+import threading
+
+from fastapi.testclient import TestClient
+
+from app import services
+from app.main import app
+from app.preferences import COMMIT_WRITES, PreferenceStore
+
+
+def test_put_and_get_survive_a_restart(tmp_path):
+    path = str(tmp_path / "preferences.sqlite3")
+    store = PreferenceStore(path)
+    assert store.put("alice", {"region": "caiso"}) == {"alice": {"region": "caiso"}}
+    assert store.get("alice") == {"region": "caiso"}
+    assert store.get("bob") is None
+    store.close()
+
+    reopened = PreferenceStore(path)
+    assert reopened.get_many(["bob", "alice"]) == {"alice": {"region": "caiso"}}
+    assert reopened.count() == 1
+
+
+def test_concurrent_writes_share_commits(tmp_path):
+    store = PreferenceStore(str(tmp_path / "preferences.sqlite3"), batch_window=0.05)
+    commits = COMMIT_WRITES.count()
+    threads = [threading.Thread(target=store.put, args=(f"customer{i}", {"i": str(i)})) for i in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert store.count() == 20
+    assert COMMIT_WRITES.count() - commits < 20
+    assert store.get("customer7") == {"i": "7"}
+
+
+def test_cache_sees_writes_from_other_workers(tmp_path):
+    path = str(tmp_path / "preferences.sqlite3")
+    first, second = PreferenceStore(path), PreferenceStore(path)
+    first.put("alice", {"region": "caiso"})
+    assert second.get("alice") == {"region": "caiso"}
+    assert second.get("bob") is None
+
+    first.put_many({"alice": {"region": "ercot"}, "bob": {"region": "pjm"}})
+    assert second.get_many(["alice", "bob"]) == {"alice": {"region": "ercot"}, "bob": {"region": "pjm"}}
+
+
+def test_cache_is_bounded(tmp_path):
+    store = PreferenceStore(str(tmp_path / "preferences.sqlite3"), cache_size=3)
+    store.put_many({f"customer{i}": {"i": str(i)} for i in range(10)})
+    assert len(store._cache) == 3
+    assert store.get("customer0") == {"i": "0"}
+
+
+def test_bulk_routes(tmp_path, monkeypatch):
+    monkeypatch.setattr(services, "preferences_store", PreferenceStore(str(tmp_path / "preferences.sqlite3")))
+    client = TestClient(app)
+    response = client.post("/preferences/bulk/", json={"items": [
+        {"customer_id": "alice", "preferences": {"region": "caiso"}},
+        {"customer_id": "bob", "preferences": {"region": "pjm"}},
+    ]})
+    assert response.status_code == 200
+    assert response.json()["count"] == 2
+
+    response = client.get("/preferences/", params=[("customer_id", "alice"), ("customer_id", "carol")])
+    assert response.status_code == 200
+    assert response.json() == {"data": {"alice": {"region": "caiso"}}, "missing": ["carol"]}
+
+    assert client.post("/preferences/bulk/", json={"items": []}).status_code == 400
+    assert client.get("/preferences/").status_code == 422
@@ -0,0 +1,39 @@
+from app import services
+from prompt.intent import IntentCache
+from prompt.prompt_processor import PromptEngine
+
+
+class FakeChain:
+    def __init__(self, response):
+        self.response = response
+        self.calls = []
+
+    def invoke(self, inputs):
+        self.calls.append(inputs)
+        return self.response
+
+
+def test_engine_reuses_chain_and_extracts_in_process():
+    engine = PromptEngine(cache=IntentCache(path=None))
+    chain = FakeChain("Start Date: 2020-05-01T00:00:00.000Z End Date: 2020-05-31T23:59:59.000Z Concept: average_carbon_intensity")
+    engine._chain = chain
+
+    start, end, concept, last_available = engine.process("How dirty was the grid in late spring of 2020?")
+    engine.process("Something else entirely")
+    assert (start, end, concept) == ("2020-05-01T00:00:00+00:00", "2020-05-31T23:59:59+00:00", "average_carbon_intensity")
+    assert last_available == "2023-01-04T07:00:00+00:00"
+    assert [call["prompt_text"] for call in chain.calls] == ["How dirty was the grid in late spring of 2020?", "Something else entirely"]
+
+
+def test_prompt_response_without_subprocess(monkeypatch):
+    engine = PromptEngine(cache=IntentCache(path=None))
+    engine._chain = FakeChain("Start Date: 2021-01-01T00:00:00.000Z End Date: 2021-01-31T23:59:59.000Z Concept: maximum_carbon_intensity")
+    monkeypatch.setattr(services, "prompt_engine", engine)
+    assert "will return 392 Tons CO2e/GWh" in services.get_prompt_response("most carbon in Jan 2021")
+
+
+def test_prompt_response_when_extraction_fails(monkeypatch):
+    engine = PromptEngine(cache=IntentCache(path=None))
+    engine._chain = FakeChain("I am not sure.")
+    monkeypatch.setattr(services, "prompt_engine", engine)
+    assert services.get_prompt_response("hello") == "Could not process the prompt."
@@ -0,0 +1,32 @@
+import numpy as np
+
+from app.rollups import Rollups
+
+
+def hourly(start, hours, seed):
+    rng = np.random.default_rng(seed)
+    timestamps = start + 3600 * np.arange(hours, dtype=np.int64)
+    return timestamps, rng.integers(50, 500, hours).astype(np.float64)
+
+
+def test_rollups_match_direct_grouping():
+    timestamps, values = hourly(1577836800, 24 * 70, 0)
+    rollups = Rollups(timestamps, values)
+    daily = rollups["day"]
+    assert len(daily) == 70
+    assert np.array_equal(daily["count"], np.full(70, 24))
+    assert np.allclose(daily["sum"], values.reshape(70, 24).sum(axis=1))
+    assert np.array_equal(daily["max"], values.reshape(70, 24).max(axis=1))
+    assert rollups["month"]["count"].tolist() == [31 * 24, 29 * 24, 10 * 24]
+    assert rollups["year"]["sum"][0] == values.sum()
+
+
+def test_rollups_update_incrementally():
+    timestamps, values = hourly(1577836800, 24 * 90, 1)
+    rollups = Rollups(timestamps[:1000], values[:1000])
+    rollups.update(timestamps[:1500], values[:1500], 1000)
+    rollups.update(timestamps, values, 1500)
+    fresh = Rollups(timestamps, values)
+    for resolution in ("hour", "day", "month", "year"):
+        for field in ("bucket", "count", "sum", "sumsq", "min", "max"):
+            assert np.array_equal(rollups[resolution][field], fresh[resolution][field])
@@ -103,6 +103,55 @@ def test_predict_advanced_least_carbon():
     assert data["month"] == expected_month
     assert data["predicted_value"] == expected_predicted_value
 
+def test_batch_stats():
+    response = client.post("/batch_stats/", json={
+        "windows": [
+            {"ts_id": "caiso_carbon_intensity", "start": "2019-12-01T00:00:00Z", "end": "2019-12-01T23:59:59Z"},
+            {"ts_id": "caiso_carbon_intensity", "start": "2019-12-01T00:00:00Z", "end": "2019-12-02T00:00:00Z"},
+            {"ts_id": "invalid_id", "start": "2019-12-01T00:00:00Z", "end": "2019-12-02T00:00:00Z"},
+        ],
+        "metrics": ["max", "min", "average", "variance"],
+    })
+    assert response.status_code == 200
+    first, second, missing = response.json()["results"]
+    assert first["min"] == 312
+    assert first["average"] == 380.7916666666667
+    assert first["variance"] == 1431.1286231884055
+    assert second["max"] == 416
+    assert "error" in missing
+
+def test_batch_stats_unknown_metric():
+    response = client.post("/batch_stats/", json={
+        "windows": [{"start": "2019-12-01T00:00:00Z", "end": "2019-12-02T00:00:00Z"}],
+        "metrics": ["median"],
+    })
+    assert response.status_code == 400
+
+def test_rollup_daily():
+    response = client.get("/rollup/", params={"ts_id": "caiso_carbon_intensity", "resolution": "day", "start": "2019-12-01T00:00:00Z", "end": "2019-12-03T00:00:00Z"})
+    assert response.status_code == 200
+    first, second = response.json()["buckets"]
+    assert first["period"] == "2019-12-01"
+    assert first["count"] == 24
+    assert first["average"] == 380.7916666666667
+    assert first["min"] == 312
+    assert abs(first["variance"] - 1431.1286231884055) < 1e-6
+
+def test_rollup_pages():
+    params = {"ts_id": "caiso_carbon_intensity", "resolution": "hour", "start": "2019-12-01T00:00:00Z", "end": "2019-12-03T00:00:00Z"}
+    first = client.get("/rollup/", params={**params, "limit": 30}).json()
+    assert first["total"] == 48 and len(first["buckets"]) == 30 and first["next_offset"] == 30
+    second = client.get("/rollup/", params={**params, "offset": 30, "limit": 30}).json()
+    assert len(second["buckets"]) == 18 and second["next_offset"] is None
+    assert second["buckets"][0]["period"] == "2019-12-02T06"
+
+    response = client.get("/rollup/", params={**params, "limit": 100000})
+    assert response.status_code == 400
+
+def test_rollup_unknown_resolution():
+    response = client.get("/rollup/", params={"ts_id": "caiso_carbon_intensity", "resolution": "week", "start": "2019-12-01T00:00:00Z", "end": "2019-12-03T00:00:00Z"})
+    assert response.status_code == 400
+
 def parse_html_response(html_content):
     soup = BeautifulSoup(html_content, 'html.parser')
     
@@ -184,6 +233,159 @@ def test_prompt_predict_least_carbon_may_2026():
     output = parse_html_response(content)
     assert output == {'value': 183}
 
+def test_multi_stats():
+    response = client.post("/multi_stats/", json={
+        "ts_ids": ["caiso_carbon_intensity", "missing_region"],
+        "start": "2020-05-01T00:00:00Z",
+        "end": "2020-06-01T00:00:00Z",
+        "metrics": ["average", "max"],
+    })
+    assert response.status_code == 200
+    data = response.json()
+    assert data["regions"][0]["ts_id"] == "caiso_carbon_intensity"
+    assert data["rankings"]["average"] == ["caiso_carbon_intensity"]
+    assert "missing_region" in data["errors"]
+
+    for top in (0, -1):
+        response = client.post("/multi_stats/", json={
+            "ts_ids": ["caiso_carbon_intensity"], "start": "2020-05-01T00:00:00Z",
+            "end": "2020-06-01T00:00:00Z", "top": top,
+        })
+        assert response.status_code == 400
+
+def test_prompt_unknown_series():
+    response = client.get("/process_prompt/", params={
+        "prompt": "What is the average carbon intensity for May 2020?", "ts_id": "nope"})
+    assert response.status_code == 400
+
+def test_best_window_historical():
+    response = client.get("/best_window/", params={
+        "ts_id": "caiso_carbon_intensity",
+        "start": "2020-06-01T00:00:00Z",
+        "end": "2020-07-01T00:00:00Z",
+        "hours": 4,
+        "k": 2,
+    })
+    assert response.status_code == 200
+    windows = response.json()["windows"]
+    assert len(windows) == 2
+    assert windows[0]["average"] <= windows[1]["average"]
+
+    response = client.get("/best_window/", params={
+        "ts_id": "caiso_carbon_intensity", "start": "2020-06-01T00:00:00Z",
+        "end": "2020-07-01T00:00:00Z", "hours": 4, "source": "guess",
+    })
+    assert response.status_code == 400
+
+    response = client.get("/best_window/", params={
+        "ts_id": "caiso_carbon_intensity", "start": "2020-06-01T00:00:00Z",
+        "end": "2020-07-01T00:00:00Z", "hours": 1, "k": 1000,
+    })
+    assert response.status_code == 400
+
+    for params in ({"hours": 0}, {"hours": 4, "k": 0}):
+        response = client.get("/best_window/", params={
+            "ts_id": "caiso_carbon_intensity", "start": "2020-06-01T00:00:00Z",
+            "end": "2020-07-01T00:00:00Z", **params,
+        })
+        assert response.status_code == 400
+
+def test_best_window_forecast_is_limited_to_the_near_future():
+    for end in ("2100-01-01T00:00:00Z", "2400-01-01T00:00:00Z"):
+        response = client.get("/best_window/", params={
+            "ts_id": "caiso_carbon_intensity", "start": "2099-01-01T00:00:00Z",
+            "end": end, "hours": 4, "source": "forecast",
+        })
+        assert response.status_code == 400
+        assert "months of the last month with data" in response.json()["detail"]
+
+def test_stats_etag_and_not_modified():
+    params = {"ts_id": "caiso_carbon_intensity", "start": "2020-05-01T00:00:00Z", "end": "2020-05-31T23:59:59Z"}
+    first = client.get("/average/", params=params)
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+    assert "max-age" in first.headers["cache-control"]
+
+    same = client.get("/average/", params={**params, "start": "2020-05-01T00:00:00.000Z"})
+    assert same.headers["etag"] == etag
+    assert same.json() == first.json()
+
+    response = client.get("/average/", params=params, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert client.get("/max/", params=params, headers={"If-None-Match": etag}).status_code == 200
+
+def test_metrics_endpoint():
+    client.get("/max/", params={"ts_id": "caiso_carbon_intensity", "start": "2020-05-01T00:00:00Z", "end": "2020-06-01T00:00:00Z"})
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert 'prediction_http_request_seconds_count{method="GET",route="/max/",status="200"}' in response.text
+    assert "prediction_cache_hit_ratio" in response.text
+    assert client.post("/profiler/", params={"enabled": True}).status_code == 400
+
+def test_health_and_ready():
+    assert client.get("/health").json() == {"status": "ok"}
+    with TestClient(app) as started:
+        from app.warmup import warmup
+        warmup.wait(5)
+        response = started.get("/ready")
+        assert response.status_code == 200
+        assert response.json()["ready"] is True
+
+def test_series_downsampled():
+    response = client.get("/series/", params={"ts_id": "caiso_carbon_intensity", "max_points": 200, "method": "minmax"})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["count"] > 28000
+    assert data["returned"] <= 200
+    assert len(data["datetime"]) == len(data["carbon_intensity"]) == data["returned"]
+    assert max(data["carbon_intensity"]) == client.get("/max/", params={
+        "ts_id": "caiso_carbon_intensity", "start": "2000-01-01T00:00:00Z", "end": "2100-01-01T00:00:00Z"}).json()["max"]
+
+    response = client.get("/series/", params={"ts_id": "caiso_carbon_intensity", "max_points": 2})
+    assert response.status_code == 400
+
+def test_export_csv_range():
+    response = client.get("/export/", params={
+        "ts_id": "caiso_carbon_intensity", "start": "2020-05-01T00:00:00Z", "end": "2020-05-01T03:00:00Z", "format": "csv"})
+    assert response.status_code == 200
+    assert response.headers["x-total-count"] == "3"
+    assert response.text.splitlines()[:2] == ["datetime,carbon_intensity", "2020-05-01T00:00:00.000Z,151"]
+
+    response = client.get("/export/", params={"ts_id": "caiso_carbon_intensity", "format": "xml"})
+    assert response.status_code == 400
+
+def test_model_search_rejects_bad_options():
+    for params in ({"criterion": "bogus"}, {"folds": 0}, {"horizon": -1}):
+        response = client.post("/model_search/", params={"ts_id": "caiso_carbon_intensity", **params})
+        assert response.status_code == 400
+
+def test_model_search_status_unknown():
+    response = client.get("/model_search/", params={"ts_id": "caiso_carbon_intensity"})
+    assert response.status_code == 404
+    response = client.get("/model_search/", params={"ts_id": "../caiso_carbon_intensity"})
+    assert response.status_code == 400
+
+def test_percentile_and_histogram():
+    params = {"ts_id": "caiso_carbon_intensity", "start": "2020-01-01T00:00:00Z", "end": "2021-01-01T00:00:00Z"}
+    response = client.get("/percentile/", params={**params, "q": "10,50,90"})
+    assert response.status_code == 200
+    data = response.json()
+    assert list(data["percentiles"]) == ["p10", "p50", "p90"]
+    assert data["percentiles"]["p10"] <= data["percentiles"]["p50"] <= data["percentiles"]["p90"]
+    assert data["rank_error"] < data["count"] / 400
+
+    response = client.get("/percentile/", params={**params, "q": "150"})
+    assert response.status_code == 400
+
+    response = client.get("/histogram/", params={**params, "bins": 5})
+    assert response.status_code == 200
+    data = response.json()
+    assert len(data["edges"]) == 6 and len(data["counts"]) == 5
+    assert abs(sum(data["counts"]) - data["count"]) <= 5
+
+    response = client.get("/histogram/", params={**params, "bins": 0})
+    assert response.status_code == 400
+
 if __name__ == "__main__":
     test_prompt_most_carbon_jan_to_may_2021()
     test_prompt_average_carbon_intensity_may_2020()
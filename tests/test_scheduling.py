@@ -0,0 +1,40 @@
+import numpy as np
+
+from app.scheduling import select_windows, window_averages
+
+
+def test_window_averages_match_brute_force_and_skip_gaps():
+    rng = np.random.default_rng(0)
+    keys = np.concatenate((np.arange(100, 150), np.arange(160, 200)))
+    values = rng.uniform(50, 500, len(keys))
+    starts, averages = window_averages(keys, values, 5)
+
+    expected = {}
+    for i in range(len(keys) - 4):
+        if keys[i + 4] - keys[i] == 4:
+            expected[i] = values[i:i + 5].mean()
+    assert starts.tolist() == sorted(expected)
+    assert np.allclose(averages, [expected[i] for i in starts.tolist()])
+
+
+def test_select_windows_returns_non_overlapping_lowest():
+    keys = np.arange(10)
+    values = np.array([5, 1, 1, 5, 5, 5, 2, 2, 5, 5], dtype=float)
+    starts, averages = window_averages(keys, values, 2)
+    chosen = select_windows(keys, starts, averages, 2, 3)
+    assert [key for key, _ in chosen[:2]] == [1, 6]
+    assert all(abs(a - b) >= 2 for (a, _), (b, _) in zip(chosen, chosen[1:]))
+
+
+def test_select_windows_matches_pairwise_check():
+    rng = np.random.default_rng(1)
+    keys = np.concatenate((np.arange(0, 3000), np.arange(3100, 6000)))
+    starts, averages = window_averages(keys, rng.uniform(50, 500, len(keys)), 3)
+    chosen = select_windows(keys, starts, averages, 3, 10 ** 6)
+
+    expected = []
+    for position in np.argsort(averages, kind="stable"):
+        key = int(keys[starts[position]])
+        if all(abs(key - other) >= 3 for other, _ in expected):
+            expected.append((key, float(averages[position])))
+    assert chosen == expected
@@ -0,0 +1,84 @@
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+
+from app.singleflight import AsyncSingleFlight, SingleFlight
+from app.store import SeriesRegistry
+
+
+def test_single_flight_runs_once_per_key():
+    flight = SingleFlight()
+    calls = []
+    barrier = threading.Barrier(8)
+
+    def slow(value):
+        calls.append(value)
+        time.sleep(0.2)
+        return value * 2
+
+    results = []
+
+    def worker():
+        barrier.wait()
+        results.append(flight.do("key", slow, 21))
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert calls == [21]
+    assert results == [42] * 8
+    assert flight.in_flight() == 0
+
+
+def test_single_flight_shares_exceptions_and_forgets_them():
+    flight = SingleFlight()
+
+    def fail():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        flight.do("key", fail)
+    assert flight.do("key", lambda: 1) == 1
+
+
+def test_async_single_flight_coalesces_concurrent_awaits():
+    flight = AsyncSingleFlight()
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def main():
+        return await asyncio.gather(*(flight.do("key", compute) for _ in range(10)))
+
+    assert asyncio.run(main()) == ["done"] * 10
+    assert len(calls) == 1
+
+
+def test_registry_loads_a_series_once_under_concurrency(tmp_path, monkeypatch):
+    with open(tmp_path / "ts.json", 'w') as f:
+        json.dump({"schema": {}, "data": [{"datetime": "2020-01-01T00:00:00.000Z", "carbon_intensity": 1}]}, f)
+    registry = SeriesRegistry(str(tmp_path), shared_dir="")
+    load = registry._load
+    calls = []
+
+    def counting_load(*args):
+        calls.append(args[0])
+        time.sleep(0.2)
+        return load(*args)
+
+    monkeypatch.setattr(registry, "_load", counting_load)
+    threads = [threading.Thread(target=registry.get, args=("ts",)) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert calls == ["ts"]
+    assert registry.is_loaded("ts")
@@ -0,0 +1,76 @@
+import numpy as np
+
+from app.sketches import SKETCH_BLOCK, QuantileSketches
+
+PERCENTILES = np.array([1, 10, 50, 90, 99])
+
+
+def values(count, seed=0):
+    return np.round(np.random.default_rng(seed).gamma(4, 60, count))
+
+
+def rank_errors(window, estimates):
+    # How far, in points, each estimate is from the rank it was asked for.
+    ordered = np.sort(window)
+    targets = PERCENTILES / 100 * (len(window) - 1)
+    below = np.searchsorted(ordered, estimates, side='left') - 1
+    above = np.searchsorted(ordered, estimates, side='right')
+    return np.maximum(0, np.maximum(below - targets, targets - above))
+
+
+def test_small_windows_are_exact():
+    data = values(3 * SKETCH_BLOCK)
+    sketches = QuantileSketches(data)
+    estimates, rank_error = sketches.quantiles(100, SKETCH_BLOCK + 50, PERCENTILES)
+    assert rank_error == 0
+    np.testing.assert_allclose(estimates, np.percentile(data[100:SKETCH_BLOCK + 50], PERCENTILES))
+
+
+def test_long_windows_stay_within_the_rank_error():
+    data = values(2000000, 1)
+    sketches = QuantileSketches(data)
+    assert len(sketches.levels) == 2
+    for lo, hi in ((0, len(data)), (12345, 1987654), (777, 3 * SKETCH_BLOCK + 999)):
+        estimates, rank_error = sketches.quantiles(lo, hi, PERCENTILES)
+        assert 0 < rank_error < (hi - lo) / 400
+        assert np.all(rank_errors(data[lo:hi], estimates) <= rank_error)
+
+
+def test_random_windows_stay_within_the_rank_error():
+    # Rounded values have many ties, where the summaries are least precise.
+    rng = np.random.default_rng(4)
+    q = np.linspace(0, 100, 1001)
+    for data in (values(300000, 5), rng.normal(size=300000)):
+        sketches = QuantileSketches(data)
+        for _ in range(100):
+            lo = int(rng.integers(0, len(data) - 1))
+            hi = int(rng.integers(lo + 1, min(len(data), lo + 20 * SKETCH_BLOCK) + 1))
+            estimates, rank_error = sketches.quantiles(lo, hi, q)
+            ordered = np.sort(data[lo:hi])
+            targets = q / 100 * (hi - lo - 1)
+            below = np.searchsorted(ordered, estimates, side='left') - 1
+            above = np.searchsorted(ordered, estimates, side='right')
+            assert np.all(np.maximum(below - targets, targets - above) <= rank_error)
+
+
+def test_histogram_counts_every_point():
+    data = values(100000, 2)
+    counts, edges, rank_error = QuantileSketches(data).histogram(0, len(data), 10, data.min(), data.max())
+    exact, _ = np.histogram(data, bins=edges)
+    assert abs(counts.sum() - len(data)) <= 10
+    assert np.all(np.abs(counts - exact) <= 2 * rank_error)
+
+
+def test_update_matches_a_fresh_build():
+    data = values(5 * SKETCH_BLOCK + 10, 3)
+    sketches = QuantileSketches(data[:2 * SKETCH_BLOCK + 5])
+    sketches.update(data, 2 * SKETCH_BLOCK + 5)
+    fresh = QuantileSketches(data)
+    assert len(sketches.levels) == len(fresh.levels)
+    for level, summaries in enumerate(sketches.levels):
+        np.testing.assert_array_equal(summaries.view, fresh.levels[level].view)
+
+    restored = QuantileSketches.from_arrays(data, fresh.arrays())
+    np.testing.assert_array_equal(restored.quantiles(0, len(data), PERCENTILES)[0],
+                                  fresh.quantiles(0, len(data), PERCENTILES)[0])
+    assert QuantileSketches.from_arrays(data, {}) is None
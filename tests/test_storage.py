@@ -0,0 +1,48 @@
+import json
+
+import numpy as np
+
+from app import storage
+from app.store import SeriesRegistry
+
+
+def write_series(path, records):
+    with open(path, 'w') as f:
+        json.dump({"schema": {"fields": []}, "data": records}, f)
+
+
+RECORDS = [
+    {"datetime": "2020-01-01T02:00:00.000Z", "carbon_intensity": 30},
+    {"datetime": "2020-01-01T00:00:00.000Z", "carbon_intensity": 10},
+    {"datetime": "2020-01-01T01:00:00.000Z", "carbon_intensity": 20.5},
+]
+
+
+def test_convert_round_trips_every_format(tmp_path):
+    write_series(tmp_path / "ts.json", RECORDS)
+    expected = SeriesRegistry(str(tmp_path)).get("ts")
+
+    for target in ("ndjson", "columnar"):
+        path = storage.convert(str(tmp_path), "ts", target)
+        fmt = storage.FORMATS[target]
+        timestamps, values = fmt.read(path)
+        assert np.array_equal(timestamps, expected.timestamps)
+        assert np.array_equal(values, expected.values)
+
+
+def test_registry_prefers_columnar_memory_map(tmp_path):
+    write_series(tmp_path / "ts.json", RECORDS)
+    storage.convert(str(tmp_path), "ts", "columnar")
+    series = SeriesRegistry(str(tmp_path)).get("ts")
+    assert isinstance(series.values, np.memmap)
+    assert series.version.startswith("columnar-")
+    assert storage.read_schema(str(tmp_path), "ts") == {"fields": []}
+
+
+def test_ndjson_reads_in_chunks(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "NDJSON_CHUNK_SIZE", 2)
+    with open(tmp_path / "ts.ndjson", 'w') as f:
+        for record in RECORDS:
+            f.write(json.dumps(record) + "\n")
+    series = SeriesRegistry(str(tmp_path)).get("ts")
+    assert series.values.tolist() == [10.0, 20.5, 30.0]
@@ -0,0 +1,74 @@
+import json
+import os
+
+import numpy as np
+
+from app.store import SeriesRegistry
+
+
+def write_series(path, records):
+    with open(path, 'w') as f:
+        json.dump({"schema": {}, "data": records}, f)
+
+
+def test_registry_loads_sorted_columns(tmp_path):
+    write_series(tmp_path / "ts.json", [
+        {"datetime": "2020-01-01T01:00:00.000Z", "carbon_intensity": 20},
+        {"datetime": "2020-01-01T00:00:00.000Z", "carbon_intensity": 10},
+    ])
+    registry = SeriesRegistry(str(tmp_path))
+    series = registry.get("ts")
+    assert series.timestamps.dtype == np.int64
+    assert series.values.dtype == np.float64
+    assert series.values.tolist() == [10.0, 20.0]
+    assert series.timestamps.tolist() == [1577836800, 1577840400]
+
+
+def test_registry_reloads_only_when_file_changes(tmp_path):
+    path = tmp_path / "ts.json"
+    write_series(path, [{"datetime": "2020-01-01T00:00:00.000Z", "carbon_intensity": 10}])
+    registry = SeriesRegistry(str(tmp_path))
+    first = registry.get("ts")
+    assert registry.get("ts") is first
+
+    write_series(path, [
+        {"datetime": "2020-01-01T00:00:00.000Z", "carbon_intensity": 10},
+        {"datetime": "2020-01-01T01:00:00.000Z", "carbon_intensity": 30},
+    ])
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    second = registry.get("ts")
+    assert second is not first
+    assert len(second) == 2
+    assert second.version != first.version
+
+
+def test_slice_is_half_open_view(tmp_path):
+    write_series(tmp_path / "ts.json", [
+        {"datetime": f"2020-01-01T0{h}:00:00.000Z", "carbon_intensity": h} for h in range(6)
+    ])
+    series = SeriesRegistry(str(tmp_path)).get("ts")
+    start = 1577836800 + 3600
+    timestamps, values = series.slice(start, start + 3 * 3600)
+    assert values.tolist() == [1.0, 2.0, 3.0]
+    assert values.base is not None
+    assert series.slice(start + 1, start + 2)[1].size == 0
+
+
+def test_workers_share_mapped_columns_and_index(tmp_path):
+    write_series(tmp_path / "ts.json", [
+        {"datetime": f"2020-01-01T0{h}:00:00.000Z", "carbon_intensity": h * 10} for h in range(8)
+    ])
+    first = SeriesRegistry(str(tmp_path), shared_dir=str(tmp_path / ".shared")).get("ts")
+    second = SeriesRegistry(str(tmp_path), shared_dir=str(tmp_path / ".shared")).get("ts")
+    assert os.path.isdir(tmp_path / ".shared" / f"ts@{first.version}")
+    assert isinstance(second.values, np.memmap)
+    assert second.index.max(1, 7) == 60.0
+    assert second.index.mean(0, 8) == first.index.mean(0, 8)
+
+
+def test_shared_cache_can_be_disabled(tmp_path):
+    write_series(tmp_path / "ts.json", [{"datetime": "2020-01-01T00:00:00.000Z", "carbon_intensity": 10}])
+    series = SeriesRegistry(str(tmp_path), shared_dir="").get("ts")
+    assert not isinstance(series.values, np.memmap)
+    assert not os.path.exists(tmp_path / ".shared")
@@ -0,0 +1,67 @@
+from concurrent.futures import Future
+from types import SimpleNamespace
+
+import numpy as np
+
+from app import training
+from app.forecasting import ModelCache
+from app.store import Series, get_series
+from app.training import ModelTrainer
+
+
+def test_trainer_serves_last_good_model_while_refitting(tmp_path):
+    trainer = ModelTrainer(ModelCache(cache_dir=str(tmp_path)))
+    try:
+        series = get_series("caiso_carbon_intensity")
+        first = trainer.get(series)
+        assert first.version == series.version
+        assert trainer.get(series) is first
+
+        appended = Series(series.ts_id, series.timestamps, series.values + 1.0, "appended")
+        stale = trainer.get(appended)
+        assert stale is first
+
+        refit = trainer.schedule(appended).result(timeout=120)
+        assert refit.version == "appended"
+        assert trainer.get(appended) is refit
+    finally:
+        trainer.shutdown()
+
+
+def test_rapid_ingests_coalesce_to_one_queued_refit_per_family(monkeypatch):
+    trainer = ModelTrainer(ModelCache(cache_dir=None))
+    fits = []
+
+    def submit(fn, monthly_data, order, seasonal_order, start_params):
+        fits.append((order, Future()))
+        return fits[-1][1]
+
+    monkeypatch.setattr(trainer, "_pool", lambda: SimpleNamespace(submit=submit))
+    monkeypatch.setattr(training, "build_sarima", lambda data, order, seasonal_order: SimpleNamespace(
+        filter=lambda params: SimpleNamespace(params=params)))
+
+    def finish_running():
+        for _, fit in list(fits):
+            if not fit.done():
+                fit.set_result(np.zeros(3))
+
+    base = get_series("caiso_carbon_intensity")
+    versions = [Series(base.ts_id, base.timestamps, base.values, f"v{i}") for i in range(21)]
+    families = [((1, 1, 1), (1, 1, 1, 12)), ((0, 1, 1), (0, 1, 1, 12))]
+    for order, seasonal_order in families:
+        trainer.schedule(versions[0], order, seasonal_order)
+    finish_running()
+    fits.clear()
+
+    # Twenty ingests while the first refits run queue one more per family.
+    for series in versions[1:]:
+        trainer.refresh(series)
+    assert len(fits) == 2 and trainer.pending() == 4
+    finish_running()
+    finish_running()
+
+    for order, _ in families:
+        assert sum(1 for fitted, _ in fits if fitted == order) == 2
+    assert trainer.pending() == 0
+    for order, seasonal_order in families:
+        assert trainer.get(versions[-1], order, seasonal_order).version == "v20"
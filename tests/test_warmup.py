@@ -0,0 +1,28 @@
+import json
+import subprocess
+import sys
+
+from app.store import SeriesRegistry
+from app.warmup import Warmup
+
+
+def test_app_import_does_not_load_modeling_stack():
+    code = "import sys, app.main; print(sorted(m for m in ('pandas', 'statsmodels', 'requests') if m in sys.modules))"
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    assert output.strip() == "[]"
+
+
+def test_warmup_preloads_series_before_ready(tmp_path):
+    with open(tmp_path / "ts.json", 'w') as f:
+        json.dump({"schema": {}, "data": [{"datetime": "2020-01-01T00:00:00.000Z", "carbon_intensity": 1}]}, f)
+    registry = SeriesRegistry(str(tmp_path), shared_dir="")
+    warmup = Warmup("ts, missing", modeling=False, series_registry=registry)
+    assert not warmup.ready
+
+    warmup.start()
+    assert warmup.wait(5)
+    status = warmup.status()
+    assert status["ready"] and status["series"] == ["ts"]
+    assert "missing" in status["errors"]
+    assert registry.is_loaded("ts")
+    assert Warmup("*", modeling=False, series_registry=registry).series_ids() == ["ts"]